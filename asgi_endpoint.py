@@ -0,0 +1,290 @@
+"""
+ASGI variant of endpoint.py for I/O heavy traffic: the PDF is downloaded with a pooled async
+HTTP client and the CPU bound stages (text parsing, crops, OCR) run in a process pool, their
+S3 uploads then run in threads, so thousands of requests can wait on the network without
+holding a worker thread or a pool process.
+
+    uvicorn asgi_endpoint:app --host 0.0.0.0 --port 8000
+
+ASGI_PROCESS_WORKERS sets the size of the process pool (default 2, every worker loads its own
+OCR model). Downloads follow the timeouts, size cap, retries and PDF cache of
+src/pdf/pdfFetcher.py (PDF_CONNECT_TIMEOUT, PDF_READ_TIMEOUT, PDF_MAX_BYTES, PDF_FETCH_RETRIES).
+The tasks share the admission limits of endpoint.py (see src/admissionControl.py), here waiting
+requests hold no thread.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+import httpx
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from src.admissionControl import AdmissionRejected, get_admission_controller
+from src.deviceManager import configure_devices, get_device_manager
+from src.extractionJob import ExtractionJob, EXTRACTION_FIELDS, run_stage, upload_highlighted_report
+from src.pdf.extractionCache import ExtractionCache
+from src.pdf.pdfFetcher import get_pdf_fetcher
+from src.reportCache import ReportScoringCache, score_report_batch
+from src.upload.s3 import call_deferring_uploads, replace_urls, run_deferred_upload
+
+extraction_cache = ExtractionCache()
+report_cache = ReportScoringCache()
+admission = get_admission_controller()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.http = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+        follow_redirects=True
+    )
+    workers = int(os.getenv("ASGI_PROCESS_WORKERS", "2"))
+    app.state.pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        # Every pool process runs one stage at a time and gets its share of the CPUs
+        initializer=configure_devices,
+        initargs=(workers, 1)
+    )
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+        app.state.pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def download_pdf(http, pdf_url):
+    """
+    Stream the report to disk with the limits and the PDF cache of the shared PDFFetcher, the
+    stages then read it from there.
+    :return: (path, temporary); a temporary copy is removed by the caller, a cached one is kept.
+    """
+    fetcher = get_pdf_fetcher()
+    return await fetcher.fetch_path_async(http, pdf_url), fetcher.cache is None
+
+
+async def run_in_pool(pool, function, *args):
+    """
+    Run function(*args) in the process pool with its S3 uploads deferred, then send them from
+    threads, so the CPU workers never wait on the network.
+    :return: The result, with the URLs of failed uploads replaced by None.
+    """
+    result, uploads = await asyncio.get_running_loop().run_in_executor(pool, call_deferring_uploads, function, *args)
+    urls = await asyncio.gather(*(asyncio.to_thread(run_deferred_upload, upload) for upload in uploads))
+    return replace_urls(result, {upload["file_url"]: url for upload, url in zip(uploads, urls)
+                                 if url != upload["file_url"]})
+
+
+def device_settings():
+    return get_device_manager().settings()
+
+
+async def extraction_events(job, pool, remove_pdf=True):
+    """
+    Async counterpart of ExtractionJob.events: same events, stages run in the process pool.
+    With remove_pdf the downloaded copy of the report (job.pdf_path) is removed once the job ends.
+    """
+    loop = asyncio.get_running_loop()
+    pending = set()
+    try:
+        try:
+            (extracted_values, job.report_extractor), seconds = await loop.run_in_executor(pool, run_stage, job, "text")
+        except Exception as e:
+            yield {"event": "error", "stage": "text", "error": str(e)}
+            return
+        yield job.text_event(extracted_values, seconds)
+
+        stages = job.image_stages()
+        tasks = {asyncio.ensure_future(run_in_pool(pool, run_stage, job, stage)): (stage, event)
+                 for stage, (event, _) in stages.items()}
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stage, event = tasks[task]
+                try:
+                    values, seconds = task.result()
+                except Exception as e:
+                    yield {"event": "error", "stage": stage, "error": str(e)}
+                    return
+                for stage_event in job.stage_events(stage, event, values, seconds):
+                    yield stage_event
+    finally:
+        for task in pending:
+            task.cancel()
+        if remove_pdf and os.path.exists(job.pdf_path):
+            os.remove(job.pdf_path)
+
+    yield job.summary_event()
+
+
+async def extract_pdf(request, data):
+    unique_id = str(uuid.uuid4())
+    if 'pdf_url' not in data:
+        return JSONResponse({"error": "Invalid request. 'pdf_url' is required."}, status_code=400)
+
+    fields = data.get('fields') or EXTRACTION_FIELDS
+    unknown_fields = [field for field in fields if field not in EXTRACTION_FIELDS]
+    if unknown_fields:
+        return JSONResponse({"error": f"Unknown fields {unknown_fields}. Valid fields are {EXTRACTION_FIELDS}."},
+                            status_code=400)
+
+    pdf_url = data['pdf_url']
+    images = data.get('images', True)
+    start_time = time.time()
+    try:
+        pdf_path, temporary = await download_pdf(request.app.state.http, pdf_url)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+    job = ExtractionJob(pdf_url, unique_id, fields=fields, images=images, highlight=data.get('highlight_pdf', images),
+                        pdf_path=pdf_path)
+    job.start_time = start_time
+
+    async def events():
+        async for event in extraction_events(job, request.app.state.pool, remove_pdf=temporary):
+            if event["event"] == "extracted_values":
+                extraction_cache.put(unique_id, pdf_url, job.report_extractor.value_locations)
+            yield event
+
+    if data.get('stream'):
+        async def lines():
+            async for event in events():
+                yield json.dumps(event) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async for event in events():
+        if event["event"] == "error":
+            return JSONResponse({"error": event["error"]}, status_code=500)
+    return JSONResponse(dict(job.response(), execution_time=event["execution_time"]))
+
+
+async def highlight_pdf(request, data):
+    extraction_id = data.get('extraction_id')
+    cached = extraction_cache.get(extraction_id) if extraction_id else None
+
+    if cached is not None:
+        pdf_url, value_locations = cached['pdf_url'], cached['value_locations']
+    elif data.get('pdf_url') and data.get('value_locations') is not None:
+        pdf_url, value_locations = data['pdf_url'], data['value_locations']
+    else:
+        return JSONResponse({"error": "Unknown 'extraction_id'. Provide 'pdf_url' and 'value_locations' instead."},
+                            status_code=400)
+
+    start_time = time.time()
+    unique_id = extraction_id or str(uuid.uuid4())
+    pdf_path, temporary = None, False
+    try:
+        pdf_path, temporary = await download_pdf(request.app.state.http, pdf_url)
+        url = await run_in_pool(request.app.state.pool, upload_highlighted_report, pdf_url, unique_id,
+                                value_locations, pdf_path)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        if temporary and pdf_path and os.path.exists(pdf_path):
+            os.remove(pdf_path)
+
+    execution_time = time.time() - start_time
+    return JSONResponse({"status": "success", "url": url, "execution_time": f"{execution_time:.2f} seconds"})
+
+
+async def fetch_report(request, data):
+    report = data['report']
+    aortic = await run_in_threadpool(report_cache.myval_size, report)
+    results_table = await run_in_threadpool(report_cache.results_table, report)
+    return JSONResponse({"results": results_table, "myvalsize": aortic})
+
+
+async def fetch_report_batch(request, data):
+    reports = data.get('reports')
+    if not isinstance(reports, list):
+        return JSONResponse({"error": "Invalid request. 'reports' must be a list of reports."}, status_code=400)
+
+    start_time = time.time()
+    results = await run_in_threadpool(score_report_batch, reports)
+    execution_time = time.time() - start_time
+    return JSONResponse({"results": results, "execution_time": f"{execution_time:.2f} seconds"})
+
+
+async def check_hardware(request, data):
+    # Settings of the pool workers, where the OCR and image stages run
+    settings = await asyncio.get_running_loop().run_in_executor(request.app.state.pool, device_settings)
+    return JSONResponse(settings)
+
+
+TASKS = {
+    "extract_pdf": extract_pdf,
+    "highlight_pdf": highlight_pdf,
+    "fetch_report": fetch_report,
+    "fetch_report_batch": fetch_report_batch,
+    "check-hardware": check_hardware,
+}
+
+
+async def ping(request):
+    return JSONResponse({"status": "Healthy"})
+
+
+async def metrics(request):
+    return JSONResponse({"admission": admission.stats()})
+
+
+class AdmittedResponse:
+    def __init__(self, response, permit):
+        """
+        ASGI wrapper releasing the admission permit of a task once its response was sent, or could
+        not be because the client went away. A streamed body that never started is closed too, so
+        the extraction events clean up the downloaded report.
+        """
+        self.response = response
+        self.permit = permit
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.response(scope, receive, send)
+        finally:
+            self.permit.release()
+            body_iterator = getattr(self.response, "body_iterator", None)
+            if hasattr(body_iterator, "aclose"):
+                await body_iterator.aclose()
+
+
+async def handle_request(request):
+    """
+    Same task based API as the /invocations route of endpoint.py.
+    """
+    data = await request.json()
+    if not isinstance(data, dict) or "task" not in data:
+        return JSONResponse({"error": "Missing 'task' parameter"}, status_code=400)
+    handler = TASKS.get(data["task"])
+    if handler is None:
+        return JSONResponse({"error": "Invalid task type"}, status_code=400)
+    try:
+        permit = await admission.acquire_async(data["task"])
+    except AdmissionRejected as e:
+        return JSONResponse({"error": e.reason, "retry_after": e.retry_after}, status_code=e.status,
+                            headers={"Retry-After": str(e.retry_after)})
+    try:
+        response = await handler(request, data)
+    except BaseException:
+        permit.release()
+        raise
+    # Streamed extractions keep their units until the last event is sent
+    return AdmittedResponse(response, permit)
+
+
+app = Starlette(
+    routes=[
+        Route("/ping", ping, methods=["GET"]),
+        Route("/invocations", handle_request, methods=["POST"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+    lifespan=lifespan
+)
@@ -1,24 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, make_response
+import json
 import time
 import os
-from src.pdf.valueExtraction import PDFExtractor # for extracting the values from the pdf 
-from src.logics import ConditionEvaluator # for evaluating the the condition for generating the report
-from src.image.ICD import PDFHighlighterAndCropper # crop the image label ICD and crop and highlight the area below it # not used in below code 
-from src.image.valueFromImage import YellowShadeOCR 
-from src.pdf.femoral import femoralExtractor
-from src.image.fineTuneImage import ImageProcessor
-from src.upload.s3 import S3Uploader
+from src.pdf.extractionCache import ExtractionCache # keeps value coordinates for on-demand highlighting
+from src.extractionJob import ExtractionJob, EXTRACTION_FIELDS, upload_highlighted_report # extract_pdf stages, streamed or collected
 import uuid
-from src.image.femoral import Femoral
-from src.myvalsizing import AorticStenosisValues
-import torch
-from concurrent.futures import ThreadPoolExecutor
+from src.reportCache import ReportScoringCache, score_report_batch # memoised / batched report scoring
+from src.deviceManager import get_device_manager # torch / OpenCV thread and GPU settings
+from src.admissionControl import AdmissionRejected, get_admission_controller # weighted concurrency limit of the tasks
 import multiprocessing
 
 # os.environ["CUDA_VISIBLE_DEVICES"] = "1"  
 
 
 app = Flask(__name__)
+extraction_cache = ExtractionCache()
+report_cache = ReportScoringCache()
+device_manager = get_device_manager()
+admission = get_admission_controller(threads=device_manager.threads)
 
 
 @app.route('/ping', methods=['GET'])
@@ -26,6 +25,14 @@ def ping():
     return {"status": "Healthy"}
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Admission queue depth and counters, see AdmissionController.stats.
+    """
+    return jsonify({"admission": admission.stats()})
+
+
 @app.route('/invocations', methods=['POST'])
 def handle_request():
     """
@@ -39,33 +46,39 @@ def handle_request():
         return jsonify({"error": "Missing 'task' parameter"}), 400
 
     task = data["task"]
-
-    if task == "extract_pdf":
-        return extract_pdf()
-    elif task == "fetch_report":
-        return fetch_report()
-    elif task == "check-hardware":
-        return check_hardware()
-    else:
+    handler = TASKS.get(task)
+    if handler is None:
         return jsonify({"error": "Invalid task type"}), 400
-    
-def check_hardware():
-    gpu_available = torch.cuda.is_available()
-    gpu_count = torch.cuda.device_count() if gpu_available else 0
-    gpu_name = torch.cuda.get_device_name(0) if gpu_available else "No GPU"
 
-    return {
-        "GPU Available": gpu_available,
-        "GPU Count": gpu_count,
-        "GPU Name": gpu_name,
-        "Processor": "GPU" if gpu_available else "CPU"
-    }
+    # Heavy tasks beyond the capacity wait in a bounded queue, or are shed with a Retry-After
+    try:
+        permit = admission.acquire(task)
+    except AdmissionRejected as e:
+        return jsonify({"error": e.reason, "retry_after": e.retry_after}), e.status, {"Retry-After": str(e.retry_after)}
+    try:
+        response = make_response(handler())
+    except Exception:
+        permit.release()
+        raise
+    # Streamed extractions keep their units until the last event is sent
+    response.call_on_close(permit.release)
+    return response
+
+
+def check_hardware():
+    return device_manager.settings()
 
 
 def extract_pdf():
     """
     API endpoint to extract values from a PDF URL.
-    Expects a JSON payload with 'pdf_url'.
+    Expects a JSON payload with 'pdf_url'. Pass 'highlight_pdf': false to skip building and
+    uploading the highlighted report, it can be requested later with the 'highlight_pdf' task.
+    Optional 'fields' (see EXTRACTION_FIELDS) limits the stages that run, and 'images': false
+    skips every image crop that is not needed for a value, and every S3 upload.
+    With 'stream': true the response is NDJSON, one event per line as each stage finishes
+    (see ExtractionJob.events): the text values first, then the ICD, calcium, femoral and
+    highlighted report results, then a summary with the stage timings.
     """
     unique_id = str(uuid.uuid4())
 
@@ -73,99 +86,55 @@ def extract_pdf():
     if not data or 'pdf_url' not in data:
         return jsonify({"error": "Invalid request. 'pdf_url' is required."}), 400
 
+    fields = data.get('fields') or EXTRACTION_FIELDS
+    unknown_fields = [field for field in fields if field not in EXTRACTION_FIELDS]
+    if unknown_fields:
+        return jsonify({"error": f"Unknown fields {unknown_fields}. Valid fields are {EXTRACTION_FIELDS}."}), 400
+
     pdf_url = data['pdf_url']
-    start_time = time.time()
+    images = data.get('images', True)
+    job = ExtractionJob(pdf_url, unique_id, fields=fields, images=images, highlight=data.get('highlight_pdf', images))
 
-    try:
-        report_extractor = PDFExtractor(pdf_url=pdf_url, unique_id=unique_id)
-        output_pdf_path = unique_id + '.pdf'
-        extracted_values = report_extractor.run_extraction(output_pdf_path=output_pdf_path)
-
-        icd_values = {}
-        femoral_values = {}
-
-        def process_icd(image_suffix, regex_patterns, s3_folder):
-            
-            output_image_path = f"{unique_id}_{image_suffix}.png"
-            temp_image_path = f"{unique_id}_temp_{image_suffix}.png"
-            highlighted_pdf_path = f"{unique_id}_highlighted_{image_suffix}.pdf"
-
-            gg = PDFHighlighterAndCropper(pdf_url)
-            gg.process(
-                temp_image_path=temp_image_path,
-                regex_patterns=regex_patterns,
-                highlighted_pdf_path=highlighted_pdf_path,
-                output_image_path=output_image_path
-            )
-            
-            value = YellowShadeOCR().run(
-                output_image_path,
-                f"{unique_id}_yellow_shade_{image_suffix}.png"
-            )
-
-            ImageProcessor().crop_center_contour(
-                image_path=output_image_path,
-                output_path=output_image_path
-            )
-
-            file_url = S3Uploader(
-                s3_folder=f'TAVIVision/{s3_folder}',
-                file_path=output_image_path
-            ).file_url
-            
-            if value != -1:
-                return {f'{image_suffix}Img': file_url, image_suffix: value}
-            else:
-                return {f'{image_suffix}Img': file_url, image_suffix: "Image Not Found"}
-            
-            
-
-        if extracted_values.get("Aortic Valve Anatomy Type") is not None:
-            if 'bicuspid' in extracted_values["Aortic Valve Anatomy Type"].lower():
-
-                icd_tasks = [
-                    ('icd4mm', [r'ICD @4mm', r'Inter commisural distance @4mm', r'ICD @ 4mm',r'ICD\s*4\s*mm',r"(?i)(?<![A-Za-z])((?:ICD|Inter[\s-]?commiss?ural[\s-]?distance)){e<=1}\s*[:@-]?\s*4(?:[.,]\d+)?\s*mm(?![A-Za-z])"], 'icd4mm'),
-                    ('icd6mm', [r'ICD @6mm', r'Inter commisural distance @6mm', r'ICD @ 6mm',r'ICD\s*6\s*mm',r"(?i)(?<![A-Za-z])((?:ICD|Inter[\s-]?commiss?ural[\s-]?distance)){e<=1}\s*[:@-]?\s*6(?:[.,]\d+)?\s*mm(?![A-Za-z])"], 'icd6mm'),
-                    ('icd8mm', [r'ICD @8mm', r'Inter commisural distance @8mm', r'ICD @ 8mm',r'ICD\s*8\s*mm',r"(?i)(?<![A-Za-z])((?:ICD|Inter[\s-]?commiss?ural[\s-]?distance)){e<=1}\s*[:@-]?\s*8(?:[.,]\d+)?\s*mm(?![A-Za-z])"], 'icd8mm'),
-                    ('stj_annulus_heights',[r'(?i)stj[\s-]*annulus[\s-]*height[s]?',r'(?i)sov[\s&-]*stj[\s-]*height[s]?',r'(?i)coronary[\s-]*height[s]?'],"stj_annulus_heights")
-                ]
-
-                with ThreadPoolExecutor(max_workers=4) as executor:
-                    futures = [executor.submit(process_icd, *task) for task in icd_tasks]
-
-                    for future in futures:
-                        result = future.result()
-                        if result:
-                            icd_values.update(result)
-            else:
-                icd_tasks = [('stj_annulus_heights',[r'(?i)stj[\s-]*annulus[\s-]*height[s]?',r'(?i)sov[\s&-]*stj[\s-]*height[s]?',r'(?i)coronary[\s-]*height[s]?'],"stj_annulus_heights")]
-                with ThreadPoolExecutor(max_workers=4) as executor:
-                    futures = [executor.submit(process_icd, *task) for task in icd_tasks]
-
-                    for future in futures:
-                        result = future.result()
-                        if result:
-                            icd_values.update(result)
-
-
-        icd_values['aorticValveCalcificationImage'] = extracted_values.get('aorticValveCalcificationImage')
-        extracted_values.pop('aorticValveCalcificationImage', None)
-        femoral_values = femoralExtractor(pdf_url=pdf_url).run_extraction()
-        femoral_values['femoral_url'] = Femoral(
-            pdf_url=pdf_url,
-            highlighted_pdf_path=f'{unique_id}_femoral_highlighted_pdf.pdf',
-            output_image_path=f'{unique_id}_femoral_output_image.png',
-            temp_image_path = f'{unique_id}_femoral_temp_image.png'
-        ).image_url
-        
+    def events():
+        for event in job.events():
+            if event["event"] == "extracted_values":
+                extraction_cache.put(unique_id, pdf_url, job.report_extractor.value_locations)
+            yield event
 
+    if data.get('stream'):
+        return Response((json.dumps(event) + "\n" for event in events()), mimetype="application/x-ndjson")
+
+    for event in events():
+        if event["event"] == "error":
+            return jsonify({"error": event["error"]}), 500
+    return jsonify(dict(job.response(), execution_time=event["execution_time"]))
+
+
+def highlight_pdf():
+    """
+    Build and upload the highlighted report for an earlier extraction on demand.
+    Expects 'extraction_id' from an extract_pdf response, or 'pdf_url' together with
+    the 'value_locations' returned by extract_pdf.
+    """
+    data = request.json
+    extraction_id = data.get('extraction_id')
+    cached = extraction_cache.get(extraction_id) if extraction_id else None
+
+    if cached is not None:
+        pdf_url, value_locations = cached['pdf_url'], cached['value_locations']
+    elif data.get('pdf_url') and data.get('value_locations') is not None:
+        pdf_url, value_locations = data['pdf_url'], data['value_locations']
+    else:
+        return jsonify({"error": "Unknown 'extraction_id'. Provide 'pdf_url' and 'value_locations' instead."}), 400
+
+    start_time = time.time()
+    try:
+        url = upload_highlighted_report(pdf_url, extraction_id or str(uuid.uuid4()), value_locations)
         execution_time = time.time() - start_time
 
         return jsonify({
             "status": "success",
-            "extracted_values": extracted_values,
-            "icd_values": icd_values,
-            "femoral_values": femoral_values,
+            "url": url,
             "execution_time": f"{execution_time:.2f} seconds"
         })
 
@@ -176,10 +145,8 @@ def extract_pdf():
 def fetch_report():
     data = request.json['report']
     # print(data)
-    evaluator = ConditionEvaluator(data)
-    print(evaluator)
-    aortic=AorticStenosisValues(data).calculate_all()
-    results_table = evaluator.generate_results_table()
+    aortic = report_cache.myval_size(data)
+    results_table = report_cache.results_table(data)
 
     # Convert DataFrame to a list of dictionaries
     # results_json = results_table.to_dict(orient='records')
@@ -187,9 +154,33 @@ def fetch_report():
                     "myvalsize": aortic})
 
 
+def fetch_report_batch():
+    """
+    Score many reports in one request. Expects 'reports', a list of report dictionaries, and
+    returns one entry per report in the same order. Errors are isolated per report, e.g. an
+    annulus area MyVal does not cover only fails that report.
+    """
+    reports = request.json.get('reports')
+    if not isinstance(reports, list):
+        return jsonify({"error": "Invalid request. 'reports' must be a list of reports."}), 400
+
+    start_time = time.time()
+    results = score_report_batch(reports)
+
+    execution_time = time.time() - start_time
+    return jsonify({"results": results, "execution_time": f"{execution_time:.2f} seconds"})
+
+
+TASKS = {
+    "extract_pdf": extract_pdf,
+    "highlight_pdf": highlight_pdf,
+    "fetch_report": fetch_report,
+    "fetch_report_batch": fetch_report_batch,
+    "check-hardware": check_hardware,
+}
+
+
 if __name__ == '__main__':
     # logging.basicConfig(level=logging.DEBUG)
     multiprocessing.set_start_method('spawn', force=True)
     # app.run(host='0.0.0.0', port=8000, debug=True, threaded=True)
-
-
@@ -0,0 +1,281 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", "4"))
+ADMISSION_RESERVE = int(os.getenv("ADMISSION_RESERVE", "1"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "1"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+# Capacity units a running task holds. Tasks heavier than 1 unit render pages and run OCR, the
+# others only score reports. Unknown tasks are rejected with a 400 before admission.
+TASK_WEIGHTS = {
+    "extract_pdf": 3,
+    "highlight_pdf": 2,
+    "fetch_report": 1,
+    "fetch_report_batch": 1,
+    "check-hardware": 0,
+}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status, reason, retry_after):
+        """
+        :param status: 429 when the wait queue is full, 503 when the wait timed out.
+        :param retry_after: Suggested seconds before retrying, sent as the Retry-After header.
+        """
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Permit:
+    def __init__(self, controller, task, weight):
+        self.controller = controller
+        self.task = task
+        self.weight = weight
+        self.start_time = time.time()
+        self._released = False
+
+    def release(self):
+        """
+        Return the units of the task, safe to call more than once.
+        """
+        if not self._released:
+            self._released = True
+            self.controller.release(self)
+
+
+class _Waiter:
+    def __init__(self, task, weight, wake):
+        self.task = task
+        self.weight = weight
+        self.wake = wake
+        self.queued_at = time.time()
+        self.permit = None
+
+
+class AdmissionController:
+    def __init__(self, capacity=ADMISSION_CAPACITY, reserve=ADMISSION_RESERVE, max_queue=ADMISSION_MAX_QUEUE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT, weights=None, threads=None):
+        """
+        Weighted concurrency limit of the /invocations tasks. A task runs once its weight fits in the
+        free capacity units, otherwise it waits in a bounded FIFO queue of its class:
+          - heavy tasks (weight above 1) never use the last `reserve` units, so report scoring
+            always has room and never waits behind extractions,
+          - while a heavy task is queued, light tasks only use the reserve, so the units held by
+            report scoring drain and the queued extraction is not starved by steady light traffic,
+          - a task arriving at a full queue is rejected at once (429), one that waited queue_timeout
+            seconds is rejected too (503), both with a Retry-After estimated from recent run times.
+        Freed units are handed to the queued tasks directly, in arrival order.
+        Under gunicorn every running and every waiting task holds a server thread: up to `capacity`
+        light tasks run at once and each class queues up to max_queue, so capacity + 2 * max_queue
+        must stay below the thread count, leaving a thread for /ping, /metrics and the rejections.
+        :param capacity: Capacity units in flight, see TASK_WEIGHTS.
+        :param reserve: Units only light tasks may use.
+        :param max_queue: Waiting tasks per class (heavy / light), 0 rejects instead of waiting.
+        :param queue_timeout: Seconds a task may wait for its units.
+        :param weights: Task name -> units, defaults to TASK_WEIGHTS.
+        :param threads: Server threads of the process, None when waiting holds no thread (asyncio).
+        :raises ValueError: When the running and queued tasks could hold every thread.
+        """
+        if threads is not None and capacity + 2 * max_queue >= threads:
+            raise ValueError(f"Admission capacity {capacity} and {max_queue} queued tasks per class can hold all "
+                             f"{threads} server threads, lower ADMISSION_CAPACITY / ADMISSION_MAX_QUEUE or raise "
+                             f"GUNICORN_THREADS.")
+        self.capacity = capacity
+        self.reserve = min(reserve, capacity - 1)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.weights = weights or TASK_WEIGHTS
+        self.in_use = 0
+        self.heavy_in_use = 0
+        self.running = {}
+        self.queues = {"heavy": deque(), "light": deque()}
+        self.admitted = 0
+        self.rejected = {429: 0, 503: 0}
+        self.run_seconds = {}  # task -> moving average of the run time
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def weight(self, task):
+        # A task heavier than the units it may use would never be admitted
+        return min(self.weights.get(task, 1), self.capacity - self.reserve)
+
+    @staticmethod
+    def task_class(weight):
+        return "heavy" if weight > 1 else "light"
+
+    def _fits(self, weight):
+        if self.in_use + weight > self.capacity:
+            return False
+        if weight > 1:
+            return self.heavy_in_use + weight <= self.capacity - self.reserve
+        if self.queues["heavy"]:
+            return self.in_use - self.heavy_in_use + weight <= self.reserve
+        return True
+
+    def _grant(self, task, weight):
+        self.in_use += weight
+        if weight > 1:
+            self.heavy_in_use += weight
+        self.running[task] = self.running.get(task, 0) + 1
+        self.admitted += 1
+        return Permit(self, task, weight)
+
+    def _retry_after(self, task, weight):
+        """
+        Seconds until the queue ahead of a new task has likely drained.
+        """
+        task_class = self.task_class(weight)
+        running = sum(count for name, count in self.running.items() if self.task_class(self.weight(name)) == task_class)
+        seconds = self.run_seconds.get(task, 5.0) * (len(self.queues[task_class]) + 1) / max(1, running)
+        return max(1, math.ceil(seconds))
+
+    def _try_acquire(self, task, wake):
+        """
+        Admit the task or queue a waiter for it.
+        :return: (permit, None) when admitted, (None, waiter) when queued.
+        """
+        weight = self.weight(task)
+        with self._lock:
+            queue = self.queues[self.task_class(weight)]
+            if weight == 0 or (not queue and self._fits(weight)):
+                return self._grant(task, weight), None
+            if len(queue) >= self.max_queue:
+                self.rejected[429] += 1
+                raise AdmissionRejected(429, f"Too many '{task}' requests waiting, retry later.",
+                                        self._retry_after(task, weight))
+            waiter = _Waiter(task, weight, wake)
+            queue.append(waiter)
+            return None, waiter
+
+    def _withdraw(self, waiter):
+        """
+        Take a waiter out of its queue, unless it was admitted meanwhile.
+        :return: Its permit when it was admitted, None otherwise.
+        """
+        woken = []
+        with self._lock:
+            permit = waiter.permit
+            if permit is None:
+                self.queues[self.task_class(waiter.weight)].remove(waiter)
+                # Light tasks held back for this heavy one may fit now
+                woken = self._dispatch()
+        for other in woken:
+            other.wake()
+        return permit
+
+    def _timed_out(self, waiter):
+        permit = self._withdraw(waiter)
+        if permit is not None:
+            return permit
+        with self._lock:
+            self.rejected[503] += 1
+            retry_after = self._retry_after(waiter.task, waiter.weight)
+        raise AdmissionRejected(503, f"Server busy, '{waiter.task}' waited {self.queue_timeout:.0f} seconds.",
+                                retry_after)
+
+    def acquire(self, task):
+        """
+        Block the calling thread until the task is admitted.
+        :return: Permit to release once the response is sent.
+        :raises AdmissionRejected: When the queue is full or the wait timed out.
+        """
+        event = threading.Event()
+        permit, waiter = self._try_acquire(task, event.set)
+        if permit is not None:
+            return permit
+        if event.wait(self.queue_timeout):
+            return waiter.permit
+        return self._timed_out(waiter)
+
+    async def acquire_async(self, task):
+        """
+        asyncio counterpart of acquire, waits without holding a thread.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        permit, waiter = self._try_acquire(task, wake)
+        if permit is not None:
+            return permit
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+            return waiter.permit
+        except asyncio.TimeoutError:
+            return self._timed_out(waiter)
+        except asyncio.CancelledError:
+            # Client went away while waiting: give the units back if they were granted meanwhile
+            permit = self._withdraw(waiter)
+            if permit is not None:
+                permit.release()
+            raise
+
+    def _dispatch(self):
+        """
+        Hand the free units to the queue heads that fit, caller holds the lock.
+        :return: The admitted waiters, to wake once the lock is released.
+        """
+        woken = []
+        # Heavy tasks first, light ones are held to the reserve while a heavy task waits
+        for queue in (self.queues["heavy"], self.queues["light"]):
+            while queue and self._fits(queue[0].weight):
+                waiter = queue.popleft()
+                waiter.permit = self._grant(waiter.task, waiter.weight)
+                self.wait_seconds += time.time() - waiter.queued_at
+                woken.append(waiter)
+        return woken
+
+    def release(self, permit):
+        with self._lock:
+            self.in_use -= permit.weight
+            if permit.weight > 1:
+                self.heavy_in_use -= permit.weight
+            self.running[permit.task] -= 1
+            seconds = time.time() - permit.start_time
+            average = self.run_seconds.get(permit.task)
+            self.run_seconds[permit.task] = seconds if average is None else 0.8 * average + 0.2 * seconds
+            woken = self._dispatch()
+        for waiter in woken:
+            waiter.wake()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "reserve": self.reserve,
+                "in_use": self.in_use,
+                "heavy_in_use": self.heavy_in_use,
+                "running": {task: count for task, count in self.running.items() if count},
+                "queued": {name: len(queue) for name, queue in self.queues.items()},
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected[429],
+                "rejected_timeout": self.rejected[503],
+                "wait_seconds_total": round(self.wait_seconds, 3),
+                "run_seconds_average": {task: round(seconds, 3) for task, seconds in self.run_seconds.items()},
+            }
+
+
+_admission_controller = None
+_admission_controller_lock = threading.Lock()
+
+
+def get_admission_controller(threads=None):
+    """
+    Return the process wide AdmissionController.
+    :param threads: Server threads per worker when waiting tasks hold one, see AdmissionController.
+    """
+    global _admission_controller
+    with _admission_controller_lock:
+        if _admission_controller is None:
+            _admission_controller = AdmissionController(threads=threads)
+        return _admission_controller
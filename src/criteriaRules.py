@@ -0,0 +1,210 @@
+import numpy as np
+
+# Report criteria as data. Every numeric rule compares one report field against a threshold:
+#   threshold: ("const", value) | ("field", name) | ("scale", name, factor) | ("min", name, name)
+#   favourable: comparator the value must satisfy against the threshold (">=", "<=" or "<")
+#   percent: how the distance to the threshold is reported, "relative" (% of the threshold),
+#            "times10" ((value - threshold) * 10) or "div10" ((value - threshold) / 10)
+#   favourable_percent: False when only the attention side reports a percentage
+#   label: unit appended to the threshold, label_round: rounding of the threshold in the label
+#   not_eligible_zero: "int" when values truncating to 0 are not eligible, "exact" for exactly 0.0
+# The valve anatomy rule is categorical: attention when the text contains attention_contains.
+CRITERIA_RULES = [
+    {"criteria": "stjDiameter", "threshold": ("field", "annulusDiameter"), "label": " mm"},
+    *[{"criteria": criteria, "threshold": ("scale", "annulusDiameter", 1.2), "label": " mm", "label_round": 2,
+       "not_eligible_zero": "int"}
+      for criteria in ["sovRightDiameter", "sovLeftDiameter", "sovNonDiameter", "sovDiameter"]],
+    {"criteria": "sovHeight", "threshold": ("min", "rcaHeight", "lcaHeight"), "label": "mm", "label_round": 2},
+    *[{"criteria": criteria, "threshold": ("field", "annulusDiameter"), "label": " mm", "label_round": 2}
+      for criteria in ["icd4mm", "icd6mm", "icd8mm"]],
+    {"criteria": "rcaHeight", "threshold": ("const", 10), "percent": "times10", "label": " mm"},
+    {"criteria": "lcaHeight", "threshold": ("const", 10), "percent": "times10", "label": " mm"},
+    {"criteria": "lvotDiameter", "threshold": ("field", "annulusDiameter"), "label": " mm"},
+    {"criteria": "ascAortaDiameter", "threshold": ("const", 40), "favourable": "<", "favourable_percent": False,
+     "label": " mm"},
+    {"criteria": "aorticValveAnatomyType", "attention_contains": "bicuspid", "label": "Tricuspid"},
+    {"criteria": "calciumScore", "threshold": ("const", 1000), "favourable": "<=", "percent": "div10", "label": " mm³"},
+    *[{"criteria": criteria, "threshold": ("const", 4.0), "label": " mm", "label_round": 2, "not_eligible_zero": "exact"}
+      for criteria in ["vtcL", "vtcR"]],
+    *[{"criteria": criteria, "threshold": ("const", 6), "label": " mm"}
+      for criteria in ["ciaLeftDiameter", "ciaRightDiameter", "eiaLeftDiameter", "eiaRightDiameter",
+                       "faLeftDiameter", "faRightDiameter"]],
+]
+
+RULE_DEFAULTS = {"favourable": ">=", "percent": "relative", "favourable_percent": True, "label_round": None,
+                 "not_eligible_zero": None}
+
+
+class CompiledRule:
+    def __init__(self, rule):
+        """
+        One criteria rule with its defaults filled in.
+        :param rule: Entry of CRITERIA_RULES.
+        """
+        rule = dict(RULE_DEFAULTS, **rule)
+        self.criteria = rule["criteria"]
+        self.categorical = "attention_contains" in rule
+        self.attention_contains = rule.get("attention_contains")
+        self.threshold = rule.get("threshold")
+        self.favourable = rule["favourable"]
+        self.percent = rule["percent"]
+        self.favourable_percent = rule["favourable_percent"]
+        self.label = rule["label"]
+        self.label_round = rule["label_round"]
+        self.not_eligible_zero = rule["not_eligible_zero"]
+        # Report fields the rule reads, used to re-evaluate only the rules affected by a change
+        self.dependencies = [self.criteria] + ([] if self.categorical else
+                                               [name for name in self.threshold[1:] if isinstance(name, str)])
+
+    def threshold_value(self, values):
+        kind = self.threshold[0]
+        if kind == "const":
+            return self.threshold[1]
+        if kind == "field":
+            return values.get(self.threshold[1])
+        if kind == "scale":
+            base = values.get(self.threshold[1])
+            return None if base is None else base * self.threshold[2]
+        if kind == "min":
+            first, second = values.get(self.threshold[1]), values.get(self.threshold[2])
+            return None if first is None or second is None else min(first, second)
+        raise ValueError(f"Unknown threshold expression: {self.threshold}")
+
+    def threshold_label(self, threshold):
+        if self.label_round is not None:
+            threshold = round(threshold, self.label_round)
+        return str(threshold) + self.label
+
+    def distance(self, difference, threshold):
+        if self.percent == "relative":
+            return (difference / threshold) * 100
+        if self.percent == "times10":
+            return difference * 10
+        return difference / 10
+
+    def evaluate(self, values, raw_values):
+        """
+        Evaluate the rule for one report.
+        :param values: Report fields converted to float (None when missing).
+        :param raw_values: The report as received, read by categorical rules.
+        :return: [status, favourable %, attention %, threshold label]
+        """
+        if self.categorical:
+            value = raw_values.get(self.criteria)
+            if value is None:
+                return ["Not Eligible", None, None, None]
+            if self.attention_contains in str(value).lower():
+                return ["Attention Required", None, None, self.label]
+            return ["Favourable", None, None, self.label]
+
+        value = values.get(self.criteria)
+        if value is None:
+            return ["Not Eligible", None, None, None]
+        if (self.not_eligible_zero == "int" and int(value) == 0) or (self.not_eligible_zero == "exact" and value == 0.0):
+            return ["Not Eligible", None, None, None]
+        threshold = self.threshold_value(values)
+        if threshold is None:
+            return ["Not Eligible", None, None, None]
+
+        if self.favourable == ">=":
+            favourable = value >= threshold
+            margin, shortfall = value - threshold, threshold - value
+        else:
+            favourable = not value > threshold if self.favourable == "<=" else value < threshold
+            margin, shortfall = threshold - value, value - threshold
+        label = self.threshold_label(threshold)
+        if favourable:
+            return ["Favourable", self.distance(margin, threshold) if self.favourable_percent else None, None, label]
+        return ["Attention Required", None, self.distance(shortfall, threshold), label]
+
+
+class CompiledRuleSet:
+    def __init__(self, rules=None):
+        """
+        Compiles the criteria rules into a scalar evaluation loop and a NumPy kernel that evaluates
+        all numeric rules of all reports in one pass over a (rules x reports) matrix.
+        :param rules: Rule definitions, defaults to CRITERIA_RULES.
+        """
+        self.rules = [CompiledRule(rule) for rule in (rules or CRITERIA_RULES)]
+        self.numeric_rules = [rule for rule in self.rules if not rule.categorical]
+        fields = []
+        for rule in self.numeric_rules:
+            fields.extend(name for name in rule.dependencies if name not in fields)
+        self.fields = fields
+
+        # Per rule parameters of the kernel, as (rules x 1) columns broadcast over the reports
+        def column(values, dtype=None):
+            return np.array(values, dtype=dtype).reshape(-1, 1)
+
+        self.greater_equal = column([rule.favourable == ">=" for rule in self.numeric_rules], bool)
+        self.less_equal = column([rule.favourable == "<=" for rule in self.numeric_rules], bool)
+        self.relative = column([rule.percent == "relative" for rule in self.numeric_rules], bool)
+        self.times10 = column([rule.percent == "times10" for rule in self.numeric_rules], bool)
+        self.favourable_percent = column([rule.favourable_percent for rule in self.numeric_rules], bool)
+        self.zero_int = column([rule.not_eligible_zero == "int" for rule in self.numeric_rules], bool)
+        self.zero_exact = column([rule.not_eligible_zero == "exact" for rule in self.numeric_rules], bool)
+
+    def dependents(self, fields):
+        """
+        Return the criteria of the rules that read any of the given fields.
+        """
+        fields = set(fields)
+        return [rule.criteria for rule in self.rules if fields.intersection(rule.dependencies)]
+
+    def evaluate(self, values, raw_values, criteria=None):
+        """
+        Evaluate the rules for one report, all of them or only the listed criteria.
+        """
+        return {rule.criteria: rule.evaluate(values, raw_values) for rule in self.rules
+                if criteria is None or rule.criteria in criteria}
+
+    def threshold_column(self, rule, columns, size):
+        kind = rule.threshold[0]
+        if kind == "const":
+            return np.full(size, float(rule.threshold[1]))
+        if kind == "field":
+            return columns[rule.threshold[1]]
+        if kind == "scale":
+            return columns[rule.threshold[1]] * rule.threshold[2]
+        return np.minimum(columns[rule.threshold[1]], columns[rule.threshold[2]])
+
+    def evaluate_columns(self, columns, size):
+        """
+        NumPy kernel over all reports.
+        :param columns: Field name -> float array with NaN for missing values.
+        :return: (criteria -> (eligible, favourable, favourable %, attention %, threshold labels),
+                  mask of the reports where an eligible rule has a zero threshold)
+        """
+        if not self.numeric_rules:
+            return {}, np.zeros(size, dtype=bool)
+        values = np.stack([columns[rule.criteria] for rule in self.numeric_rules])
+        thresholds = np.stack([self.threshold_column(rule, columns, size) for rule in self.numeric_rules])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            eligible = ~np.isnan(values) & ~np.isnan(thresholds)
+            eligible &= ~(self.zero_int & (np.trunc(values) == 0)) & ~(self.zero_exact & (values == 0.0))
+            favourable = np.where(self.greater_equal, values >= thresholds,
+                                  np.where(self.less_equal, ~(values > thresholds), values < thresholds))
+            margin = np.where(self.greater_equal, values - thresholds, thresholds - values)
+            shortfall = np.where(self.greater_equal, thresholds - values, values - thresholds)
+
+            def distance(difference):
+                return np.where(self.relative, (difference / thresholds) * 100,
+                                np.where(self.times10, difference * 10, difference / 10))
+
+            favourable_pct = np.where(eligible & favourable & self.favourable_percent, distance(margin), np.nan)
+            attention_pct = np.where(eligible & ~favourable, distance(shortfall), np.nan)
+        # The scalar path raises ZeroDivisionError when a relative rule meets a zero threshold
+        division_by_zero = (eligible & self.relative & (thresholds == 0)).any(axis=0)
+
+        results = {}
+        for row, rule in enumerate(self.numeric_rules):
+            if rule.threshold[0] == "const":
+                labels = [rule.threshold_label(rule.threshold[1])] * size
+            else:
+                labels = [rule.threshold_label(t) for t in thresholds[row].tolist()]
+            results[rule.criteria] = (eligible[row], favourable[row], favourable_pct[row], attention_pct[row], labels)
+        return results, division_by_zero
+
+
+compiled_rules = CompiledRuleSet()
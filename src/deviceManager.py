@@ -0,0 +1,108 @@
+import os
+import threading
+import cv2
+
+
+def available_cpus():
+    """
+    CPUs this process may use: its affinity mask, capped by the cgroup CPU quota of the container.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+class DeviceManager:
+    def __init__(self, workers=None, threads=None):
+        """
+        Detects the hardware once and sizes the thread pools of torch and OpenCV for the serving
+        topology, so concurrent requests do not each spread over every core.
+          - OCR runs one model call at a time per process (see ocrBackend), so torch gets the
+            CPUs of one worker process.
+          - OpenCV calls run in every request thread at once, so each gets its share of them.
+        OCR_DEVICE (auto, cpu or cuda), TORCH_NUM_THREADS and OPENCV_NUM_THREADS override the choices.
+        :param workers: Server worker processes, defaults to GUNICORN_WORKERS or 1.
+        :param threads: Request threads per worker, defaults to GUNICORN_THREADS or 8.
+        """
+        self.workers = workers or int(os.getenv("GUNICORN_WORKERS", "1"))
+        self.threads = threads or int(os.getenv("GUNICORN_THREADS", "8"))
+        self.cpus = available_cpus()
+        self.torch_version = None
+        self.gpu_count = 0
+        self.gpu_name = "No GPU"
+        try:
+            import torch
+            self.torch_version = torch.__version__
+            if torch.cuda.is_available():
+                self.gpu_count = torch.cuda.device_count()
+                self.gpu_name = torch.cuda.get_device_name(0)
+        except ImportError:
+            torch = None
+        self._torch = torch
+
+        device = os.getenv("OCR_DEVICE", "auto").lower()
+        self.use_gpu = self.gpu_count > 0 if device == "auto" else device == "cuda"
+        if self.use_gpu and not self.gpu_count:
+            print("OCR_DEVICE=cuda but no GPU is available, OCR runs on the CPU.")
+            self.use_gpu = False
+
+        self.torch_threads = int(os.getenv("TORCH_NUM_THREADS", "0")) or max(1, self.cpus // self.workers)
+        self.opencv_threads = int(os.getenv("OPENCV_NUM_THREADS", "0")) or max(1, self.cpus // (self.workers * self.threads))
+        self.configure()
+
+    def configure(self):
+        cv2.setNumThreads(self.opencv_threads)
+        if self._torch is not None:
+            self._torch.set_num_threads(self.torch_threads)
+            try:
+                self._torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass  # only allowed before torch started parallel work
+
+    def settings(self):
+        return {
+            "GPU Available": self.gpu_count > 0,
+            "GPU Count": self.gpu_count,
+            "GPU Name": self.gpu_name,
+            "Processor": "GPU" if self.use_gpu else "CPU",
+            "CPUs": self.cpus,
+            "Workers": self.workers,
+            "Threads Per Worker": self.threads,
+            "Torch Version": self.torch_version,
+            "Torch Threads": self.torch_threads if self._torch is not None else None,
+            "OpenCV Threads": self.opencv_threads,
+        }
+
+
+_device_manager = None
+_device_manager_lock = threading.Lock()
+
+
+def get_device_manager():
+    """
+    Return the process wide DeviceManager, configuring torch and OpenCV on first use.
+    """
+    global _device_manager
+    with _device_manager_lock:
+        if _device_manager is None:
+            _device_manager = DeviceManager()
+        return _device_manager
+
+
+def configure_devices(workers=None, threads=None):
+    """
+    Configure the process for an explicit topology, e.g. as a process pool initializer.
+    """
+    global _device_manager
+    with _device_manager_lock:
+        _device_manager = DeviceManager(workers=workers, threads=threads)
+        return _device_manager
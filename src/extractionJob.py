@@ -0,0 +1,317 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.pdf.valueExtraction import PDFExtractor
+from src.pdf.femoral import femoralExtractor
+from src.image.ICD import PDFHighlighterAndCropper
+from src.image.cropEngine import CropEngine
+from src.image.valueFromImage import YellowShadeOCR
+from src.image.fineTuneImage import ImageProcessor
+from src.image.femoral import Femoral
+from src.upload.s3 import S3Uploader
+
+# Groups of outputs a caller can ask for with the 'fields' parameter of extract_pdf.
+# Text value groups map to the PDFExtractor keys they keep in 'extracted_values'.
+TEXT_FIELD_GROUPS = {
+    "annulus": ["Annulus Diameter", "Annulus Area", "Annulus Perimeter", "Annulus Perimeter Derived Diameter"],
+    "aortic_root": ["STJ Diameter", "LVOT Diameter", "Asc Aorta Diameter", "SOV Height",
+                    "SOV Left Diameter", "SOV Right Diameter", "SOV Non Diameter"],
+    "coronary_heights": ["RCA Height", "LCA Height"],
+    "anatomy": ["Aortic Valve Anatomy Type"],
+    "calcium": ["Calcium Score", "Calcium Score Source"],
+}
+EXTRACTION_FIELDS = list(TEXT_FIELD_GROUPS) + ["icd", "stj_annulus_heights", "femoral_values", "femoral_image"]
+
+ICD_TASKS = [
+    ('icd4mm', [r'ICD @4mm', r'Inter commisural distance @4mm', r'ICD @ 4mm',r'ICD\s*4\s*mm',r"(?i)(?<![A-Za-z])((?:ICD|Inter[\s-]?commiss?ural[\s-]?distance)){e<=1}\s*[:@-]?\s*4(?:[.,]\d+)?\s*mm(?![A-Za-z])"], 'icd4mm'),
+    ('icd6mm', [r'ICD @6mm', r'Inter commisural distance @6mm', r'ICD @ 6mm',r'ICD\s*6\s*mm',r"(?i)(?<![A-Za-z])((?:ICD|Inter[\s-]?commiss?ural[\s-]?distance)){e<=1}\s*[:@-]?\s*6(?:[.,]\d+)?\s*mm(?![A-Za-z])"], 'icd6mm'),
+    ('icd8mm', [r'ICD @8mm', r'Inter commisural distance @8mm', r'ICD @ 8mm',r'ICD\s*8\s*mm',r"(?i)(?<![A-Za-z])((?:ICD|Inter[\s-]?commiss?ural[\s-]?distance)){e<=1}\s*[:@-]?\s*8(?:[.,]\d+)?\s*mm(?![A-Za-z])"], 'icd8mm'),
+]
+STJ_TASK = ('stj_annulus_heights',[r'(?i)stj[\s-]*annulus[\s-]*height[s]?',r'(?i)sov[\s&-]*stj[\s-]*height[s]?',r'(?i)coronary[\s-]*height[s]?'],"stj_annulus_heights")
+
+
+def process_icd(pdf_url, unique_id, images, image_suffix, regex_patterns, s3_folder, pdf_path=None):
+    """
+    Crop one yellow ICD / STJ value image from the report, read its value and upload the crop.
+    """
+    values, error = process_icd_batch(pdf_url, unique_id, images, [(image_suffix, regex_patterns, s3_folder)],
+                                      pdf_path=pdf_path)[image_suffix]
+    if error is not None:
+        raise ValueError(error)
+    return values
+
+
+def process_icd_task(unique_id, images, gg, crop, image_suffix, s3_folder):
+    """
+    Read the value of one cropped ICD / STJ image and upload the crop.
+    """
+    output_image_path = f"{unique_id}_{image_suffix}.png"
+    gg.vector_value = None
+    gg.use_crop(crop)
+    value = gg.vector_value
+    if value is None:
+        value = YellowShadeOCR().run(output_image_path)
+    value = value if value != -1 else "Image Not Found"
+
+    if not images:
+        if os.path.exists(output_image_path):
+            os.remove(output_image_path)
+        return {image_suffix: value}
+
+    ImageProcessor().crop_center_contour(
+        image_path=output_image_path,
+        output_path=output_image_path
+    )
+
+    file_url = S3Uploader(
+        s3_folder=f'TAVIVision/{s3_folder}',
+        file_path=output_image_path
+    ).file_url
+    return {f'{image_suffix}Img': file_url, image_suffix: value}
+
+
+def process_icd_batch(pdf_url, unique_id, images, tasks, pdf_path=None):
+    """
+    Crop several ICD / STJ value images in one CropEngine batch (one open document, one render
+    of each page), then read every value and upload its crop. A failing task does not affect
+    the others.
+    :param tasks: (image_suffix, regex_patterns, s3_folder) entries of ICD_TASKS / STJ_TASK.
+    :return: image_suffix -> (values, None), or (None, error message) when the task failed.
+    """
+    try:
+        gg = PDFHighlighterAndCropper(pdf_url=None if pdf_path else pdf_url, pdf_path=pdf_path)
+        specs = [gg.crop_spec(regex_patterns, f"{unique_id}_{image_suffix}.png", section=image_suffix)
+                 for image_suffix, regex_patterns, _ in tasks]
+        crops = CropEngine(gg.pdf_path).run(specs)
+    except Exception as e:
+        # Without the report or its renders none of the crops can be made
+        return {image_suffix: (None, str(e)) for image_suffix, _, _ in tasks}
+
+    results = {}
+    for image_suffix, _, s3_folder in tasks:
+        try:
+            results[image_suffix] = (process_icd_task(unique_id, images, gg, crops[image_suffix], image_suffix,
+                                                      s3_folder), None)
+        except Exception as e:
+            print(f"Failed to process {image_suffix}: {e}")
+            results[image_suffix] = (None, str(e))
+    return results
+
+
+def upload_highlighted_report(pdf_url, unique_id, value_locations, pdf_path=None):
+    """
+    Build and upload the highlighted report from value locations recorded by an earlier extraction.
+    """
+    report_extractor = PDFExtractor(pdf_url=None if pdf_path else pdf_url, pdf_path=pdf_path, unique_id=unique_id)
+    report_extractor.value_locations = value_locations
+    return report_extractor.upload_highlighted_pdf(output_pdf_path=unique_id + '.pdf')
+
+
+def run_stage(job, stage):
+    """
+    Run one stage of a pickled ExtractionJob, the entry point for process pools.
+    :return: (stage result, seconds). The text stage result is (values, PDFExtractor) since the
+             worker's copy of the job is discarded; other results go to ExtractionJob.apply.
+    """
+    start_time = time.time()
+    if stage == "text":
+        result = (job.extract_text_values(), job.report_extractor)
+    else:
+        result = job.image_stages()[stage][1]()
+    return result, round(time.time() - start_time, 3)
+
+
+class ExtractionJob:
+    def __init__(self, pdf_url, unique_id, fields=None, images=True, highlight=True, max_workers=4, pdf_path=None):
+        """
+        The stages of the extract_pdf task. events() runs them and yields one event per finished
+        stage, so a caller can stream the text values first and the image results as they arrive.
+        Stages return their results and apply() merges them into the job, so they can also run
+        in other processes (see run_stage).
+        :param pdf_url: URL of the report.
+        :param unique_id: Extraction id, also used to name the temporary files.
+        :param fields: Outputs to produce, see EXTRACTION_FIELDS. Defaults to all of them.
+        :param images: Produce and upload the image crops that are not needed for a value.
+        :param highlight: Build and upload the highlighted report.
+        :param max_workers: Threads running the image stages.
+        :param pdf_path: Already downloaded copy of the report; every stage reads it instead of pdf_url.
+        """
+        self.pdf_url = pdf_url
+        self.pdf_path = pdf_path
+        self.unique_id = unique_id
+        self.fields = fields or EXTRACTION_FIELDS
+        self.images = images
+        self.highlight = highlight
+        self.max_workers = max_workers
+        self.report_extractor = PDFExtractor(pdf_url=None if pdf_path else pdf_url, pdf_path=pdf_path, unique_id=unique_id)
+        self.icd_values = {}
+        self.femoral_values = {}
+        self.errors = {}
+        self.timings = {}
+        self.start_time = time.time()
+
+    @property
+    def source(self):
+        # Keyword arguments of the image croppers: the local copy when there is one, the URL otherwise
+        return {"pdf_path": self.pdf_path} if self.pdf_path else {"pdf_url": self.pdf_url}
+
+    def extract_text_values(self):
+        self.report_extractor.extract_text(self.report_extractor.fetch_pdf_content())
+        self.report_extractor.extract_values(self.report_extractor.extracted_text, calcium=False)
+        self.report_extractor.locate_values()
+        return self.extracted_values()
+
+    def extract_calcium(self):
+        values = self.report_extractor.values
+        result = {"Calcium Score": self.report_extractor.extract_calcium(upload_image=self.images),
+                  "Calcium Score Source": values.get("Calcium Score Source")}
+        image_url = values.pop('aorticValveCalcificationImage', None)
+        if self.images:
+            result['aorticValveCalcificationImage'] = image_url
+        return result
+
+    def upload_highlighted_pdf(self):
+        return {"url": self.report_extractor.upload_highlighted_pdf(output_pdf_path=self.unique_id + '.pdf')}
+
+    def extract_femoral_values(self):
+        return femoralExtractor(**self.source).run_extraction()
+
+    def extract_femoral_image(self):
+        return {'femoral_url': Femoral(
+            output_image_path=f'{self.unique_id}_femoral_output_image.png',
+            temp_image_path=f'{self.unique_id}_femoral_temp_image.png',
+            **self.source
+        ).image_url}
+
+    def extract_icd(self, tasks):
+        return process_icd_batch(self.pdf_url, self.unique_id, self.images, tasks, pdf_path=self.pdf_path)
+
+    def image_stages(self):
+        """
+        Return stage name -> (event name, callable) of the stages that run after the text values.
+        """
+        stages = {}
+        anatomy_type = self.report_extractor.values.get("Aortic Valve Anatomy Type")
+        icd_tasks = []
+        if "icd" in self.fields and anatomy_type is not None and 'bicuspid' in anatomy_type.lower():
+            icd_tasks.extend(ICD_TASKS)
+        if "stj_annulus_heights" in self.fields and anatomy_type is not None:
+            icd_tasks.append(STJ_TASK)
+        if icd_tasks:
+            # One batch: the ICD values usually share a page, which is then rendered once.
+            # It yields one event per value, see stage_events
+            stages["icd"] = ("icd_values", lambda: self.extract_icd(icd_tasks))
+
+        if "calcium" in self.fields:
+            stages["calcium"] = ("calcium", self.extract_calcium)
+        if "femoral_values" in self.fields:
+            stages["femoral_values"] = ("femoral_values", self.extract_femoral_values)
+        if "femoral_image" in self.fields and self.images:
+            stages["femoral_image"] = ("femoral_values", self.extract_femoral_image)
+        if self.highlight:
+            stages["highlighted_pdf"] = ("highlighted_pdf", self.upload_highlighted_pdf)
+        return stages
+
+    def apply(self, stage, event, values, seconds):
+        """
+        Merge the result of a finished stage into the job and return its event.
+        """
+        self.timings[stage] = seconds
+        if event == "icd_values":
+            self.icd_values.update(values)
+        elif event == "calcium":
+            self.report_extractor.values.update({key: values[key] for key in TEXT_FIELD_GROUPS["calcium"]})
+            if 'aorticValveCalcificationImage' in values:
+                self.icd_values['aorticValveCalcificationImage'] = values['aorticValveCalcificationImage']
+        elif event == "femoral_values":
+            self.femoral_values.update(values)
+        elif event == "highlighted_pdf":
+            self.report_extractor.values["url"] = values["url"]
+        return {"event": event, "stage": stage, "values": values, "elapsed": round(time.time() - self.start_time, 3)}
+
+    def stage_events(self, stage, event, values, seconds):
+        """
+        Merge the result of a finished stage into the job and return its events: one per stage,
+        except the ICD batch which yields one 'icd_values' event per value, or a 'task_error'
+        event for a value that failed while the others still arrive.
+        """
+        if stage != "icd":
+            return [self.apply(stage, event, values, seconds)]
+        self.timings[stage] = seconds
+        events = []
+        for image_suffix, (task_values, error) in values.items():
+            if error is None:
+                self.icd_values.update(task_values)
+                events.append({"event": event, "stage": image_suffix, "values": task_values,
+                               "elapsed": round(time.time() - self.start_time, 3)})
+            else:
+                self.errors[image_suffix] = error
+                events.append({"event": "task_error", "stage": image_suffix, "error": error,
+                               "elapsed": round(time.time() - self.start_time, 3)})
+        return events
+
+    def text_event(self, extracted_values, seconds):
+        self.timings["text"] = seconds
+        return {"event": "extracted_values", "extraction_id": self.unique_id,
+                "value_locations": self.report_extractor.value_locations, "extracted_values": extracted_values,
+                "elapsed": round(time.time() - self.start_time, 3)}
+
+    def summary_event(self):
+        execution_time = time.time() - self.start_time
+        return {"event": "summary", "status": "success", "extraction_id": self.unique_id, "timings": self.timings,
+                "errors": self.errors, "execution_time": f"{execution_time:.2f} seconds"}
+
+    def events(self):
+        """
+        Run the extraction and yield its events, each a JSON serialisable dict with an 'event' name:
+        'extracted_values' (text layer values and their locations), then one 'icd_values', 'calcium',
+        'femoral_values' or 'highlighted_pdf' event per stage as it finishes (one 'icd_values' event
+        per ICD / STJ value), and a final 'summary' with the stage timings. A failing stage yields an
+        'error' event and the job stops; a failing ICD / STJ value only yields a 'task_error' event.
+        """
+        self.start_time = time.time()
+        try:
+            (extracted_values, _), seconds = run_stage(self, "text")
+        except Exception as e:
+            yield {"event": "error", "stage": "text", "error": str(e)}
+            return
+        yield self.text_event(extracted_values, seconds)
+
+        stages = self.image_stages()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(run_stage, self, stage): (stage, event) for stage, (event, _) in stages.items()}
+            for future in as_completed(futures):
+                stage, event = futures[future]
+                try:
+                    values, seconds = future.result()
+                except Exception as e:
+                    for pending in futures:
+                        pending.cancel()
+                    yield {"event": "error", "stage": stage, "error": str(e)}
+                    return
+                yield from self.stage_events(stage, event, values, seconds)
+
+        yield self.summary_event()
+
+    def extracted_values(self):
+        values = {key: value for key, value in self.report_extractor.values.items() if key != 'aorticValveCalcificationImage'}
+        if self.fields is not EXTRACTION_FIELDS:
+            keep = {"url"}.union(*(TEXT_FIELD_GROUPS[field] for field in self.fields if field in TEXT_FIELD_GROUPS))
+            values = {key: value for key, value in values.items() if key in keep}
+        return values
+
+    def response(self):
+        """
+        The non streaming extract_pdf response, once events() has been consumed.
+        """
+        response = {
+            "status": "success",
+            "extraction_id": self.unique_id,
+            "value_locations": self.report_extractor.value_locations,
+            "extracted_values": self.extracted_values(),
+            "icd_values": self.icd_values,
+            "femoral_values": self.femoral_values,
+        }
+        if self.errors:
+            response["errors"] = self.errors
+        return response
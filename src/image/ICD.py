@@ -1,12 +1,8 @@
 import fitz  # PyMuPDF
-from pdf2image import convert_from_path
 import regex as re
-import cv2
-import numpy as np
-import requests
-import tempfile
-import os
-from io import BytesIO
+from ..pdf.pdfFetcher import get_pdf_fetcher
+from .cropEngine import CropEngine, CropSpec
+import colorsys
 
 class PDFHighlighterAndCropper:
     def __init__(self, pdf_url= None, pdf_path = None):
@@ -14,112 +10,89 @@ class PDFHighlighterAndCropper:
         self.pdf_path1 = pdf_path
         self.crop_height = 800
         self.x_padding = 400
+        self.crop_box = None
+        self.vector_value = None
         self.pdf_path = self.fetch_pdf()
         
     def fetch_pdf(self):
         
         if self.pdf_url:
             print(f"Fetching PDF from URL: {self.pdf_url}")
-            response = requests.get(self.pdf_url)
-            if response.status_code == 200:
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-                temp_file.write(response.content)
-                temp_file.close()
-                return temp_file.name
-            else:
-                raise ValueError(f"Failed to fetch PDF from URL: {self.pdf_url}, Status Code: {response.status_code}")
+            return get_pdf_fetcher().fetch_path(self.pdf_url)
         elif self.pdf_path1:
             return self.pdf_path1
         else:
             raise ValueError("Either 'pdf_path' or 'pdf_url' must be provided.")
 
-    def highlight_text_with_regex(self, pdf_path, regex_patterns,highlighted_pdf_path):
-        doc = fitz.open(pdf_path)
-        regex_list = [re.compile(pattern, re.IGNORECASE) for pattern in regex_patterns]
+    @staticmethod
+    def is_yellow(color):
+        """
+        Check a PDF colour (RGB floats 0-1) against the HSV yellow range used by YellowShadeOCR.
+        """
+        if not color or len(color) != 3:
+            return False
+        h, s, v = colorsys.rgb_to_hsv(*color)
+        return 20 / 180 <= h <= 40 / 180 and s >= 50 / 255 and v >= 50 / 255
 
-        for page_num in range(1, len(doc)):
+    def read_yellow_vector_value(self, page_num, crop_box, dpi=200):
+        """
+        Look for the yellow shaded value inside the crop region in the PDF itself, before any raster OCR:
+        text spans drawn in yellow, or text drawn on top of a yellow filled vector shape.
+        :param crop_box: Crop region in pixels of the page rendered at dpi.
+        :return: The value as a string rounded to 1 decimal, or None when it is only present as an image.
+        """
+        scale = 72 / dpi
+        clip = fitz.Rect(*[coordinate * scale for coordinate in crop_box])
+        doc = fitz.open(self.pdf_path)
+        try:
             page = doc[page_num]
-            text = page.get_text("text")
-            
-            matches_found = False
+            yellow_fills = [drawing["rect"] for drawing in page.get_drawings()
+                            if self.is_yellow(drawing.get("fill")) and drawing["rect"].intersects(clip)]
 
-            for regex in regex_list:
-                matches = [(m.start(), m.end()) for m in regex.finditer(text)]
+            spans = []
+            for block in page.get_text("dict", clip=clip)["blocks"]:
+                for line in block.get("lines", []):
+                    for span in line["spans"]:
+                        rect = fitz.Rect(span["bbox"])
+                        if self.is_yellow(fitz.sRGB_to_pdf(span["color"])) or any(rect.intersects(fill) for fill in yellow_fills):
+                            spans.append((round(rect.y0), rect.x0, span["text"]))
+        finally:
+            doc.close()
 
-                if matches:
-                    matches_found = True
-                    for start, end in matches:
-                        match_text = text[start:end]
-                        search_instances = page.search_for(match_text)
-                        for rect in search_instances:
-                            highlight = page.add_highlight_annot(rect)
-                            highlight.set_colors(stroke=(0, 1, 0))  # Green highlight
-                            highlight.update()
+        text = " ".join(span_text for _, _, span_text in sorted(spans))
+        match = re.search(r"\d+(?:[.,]\d+)?", text)
+        if match is None:
+            return None
+        return str(round(float(match.group().replace(",", ".")), 1))
 
-            if matches_found:
-                doc.save(highlighted_pdf_path)
-                print(f"Highlighted PDF saved at: {highlighted_pdf_path}")
-                return page_num
-
-        print(f"No matches for regex patterns {regex_patterns} found in the PDF.")
-        return None
-    
-    def detect_highlight_and_crop(self, image_path,output_image_path):
+    def crop_spec(self, regex_patterns, output_image_path, section=None):
         """
-        Detect the highlighted text region in the image and crop the area below it.
-        :param image_path: Path to the input image.
-        :return: Paths to the cropped image and marked image.
+        CropSpec of one value image below the anchor matching regex_patterns.
+        :param section: Name of the crop and its layout profile section, defaults to the first pattern.
         """
-        image = cv2.imread(image_path)
-        if image is None:
-            raise FileNotFoundError(f"Image not found at {image_path}")
-
-        hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        lower_hsv = np.array([35, 50, 50])
-        upper_hsv = np.array([85, 255, 255])
-        mask = cv2.inRange(hsv_image, lower_hsv, upper_hsv)
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        if not contours:
-            raise ValueError("No highlighted region found in the image.")
+        return CropSpec(section or regex_patterns[0], regex_patterns, output_image_path, first_page=1,
+                        crop_height=self.crop_height, x_padding=self.x_padding)
 
-        largest_contour = max(contours, key=cv2.contourArea)
-        x, y, w, h = cv2.boundingRect(largest_contour)
-
-        center_x = x + w // 2
-        center_y = y + h // 2
-        cv2.circle(image, (center_x, center_y), radius=10, color=(255, 0, 0), thickness=-1)
-
-        crop_x_start = max(0, x - self.x_padding)
-        crop_x_end = min(image.shape[1], x + w + self.x_padding)
-        crop_y_start = y + h
-        crop_y_end = min(image.shape[0], crop_y_start + self.crop_height)
-        cropped_image = image[crop_y_start:crop_y_end, crop_x_start:crop_x_end]
-
-        marked_output_path = "marked_" + output_image_path
-        cv2.imwrite(marked_output_path, image)
-        print(f"Marked image saved at: {marked_output_path}")
-
-        cv2.imwrite(output_image_path, cropped_image)
-        print(f"Cropped image saved at: {output_image_path}")
-        if os.path.exists(marked_output_path):
-                # print(file_path)
-                os.remove(marked_output_path)
-        return output_image_path
-
-    def process(self,temp_image_path,regex_patterns,highlighted_pdf_path,output_image_path):
+    def process(self,temp_image_path,regex_patterns,output_image_path,highlighted_pdf_path=None, section=None):
         """
         Orchestrates the entire process of highlighting, cropping, and saving results.
+        The page is rendered in memory, temp_image_path is no longer written and only kept for callers.
+        """
+        spec = self.crop_spec(regex_patterns, output_image_path, section=section)
+        result = CropEngine(self.pdf_path, highlighted_pdf_path=highlighted_pdf_path).run([spec])[spec.name]
+        return self.use_crop(result)
+
+    def use_crop(self, result):
+        """
+        Keep the crop box of a CropEngine result and read the value drawn as vector text in it, if any.
+        :return: Path to the cropped image, or None when the anchor was not found.
         """
-        page_num = self.highlight_text_with_regex(self.pdf_path,regex_patterns,highlighted_pdf_path)
-        if page_num is not None :
-            images = convert_from_path(highlighted_pdf_path, first_page=page_num + 1, last_page=page_num + 1)
-            images[0].save(temp_image_path)
-            output = self.detect_highlight_and_crop(temp_image_path,output_image_path)
-            os.remove(highlighted_pdf_path)
-            os.remove(temp_image_path)
-            # print(output)
-            return output
+        if result is None:
+            return None
+        self.crop_box = result["crop_box"]
+        # Values drawn as vector text can be read directly, raster OCR is only the fallback
+        self.vector_value = self.read_yellow_vector_value(result["page"], self.crop_box)
+        return result["path"]
         
         
         
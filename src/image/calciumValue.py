@@ -1,20 +1,16 @@
-import pymupdf as fitz  # PyMuPDF
-from pdf2image import convert_from_path
 import re
-import cv2
 import numpy as np
 import requests
-import tempfile
-from io import BytesIO
-import easyocr
 from PIL import ImageEnhance, ImageFilter, Image
-from .fineTuneImage import ImageProcessor
-import os
+from .cropEngine import CropEngine, CropSpec
+from .ocrBackend import get_ocr_backend
+from ..pdf.pdfFetcher import get_pdf_fetcher
 
 
 class desired_image:
     def __init__(self, pdf_url=None, pdf_path=None, regex_patterns=None, crop_height=800, x_padding=300,
-                 highlighted_pdf_path='highlighted_pdf.pdf', output_image_path='output_image.png', temp_image_path='temp_page_image.png'):
+                 highlighted_pdf_path=None, output_image_path='output_image.png', temp_image_path='temp_page_image.png', run_ocr=True,
+                 ocr_backend=None, section="calcium"):
         """
         Initialize the class with the required parameters and start processing.
         :param pdf_url: URL of the PDF.
@@ -22,9 +18,13 @@ class desired_image:
         :param regex_patterns: List of regex patterns to highlight.
         :param crop_height: Height of the crop area below the highlighted text.
         :param x_padding: Padding to add on either side of the cropped region.
-        :param highlighted_pdf_path: Path to save the highlighted PDF.
+        :param highlighted_pdf_path: Optional path to also save the highlighted PDF, it is otherwise kept in memory.
         :param output_image_path: Path to save the cropped image.
-        :param temp_image_path: Path to save the temporary image for processing.
+        :param temp_image_path: Unused, the page is rendered in memory; kept for callers.
+        :param run_ocr: Run OCR on the crop; disable when only the cropped image is needed.
+        :param ocr_backend: OCR backend name (see ocrBackend.OCR_BACKENDS), defaults to CALCIUM_OCR_BACKEND or 'easyocr'.
+                            Numeral only backends ('template') are refused, the 'Total' label must be read.
+        :param section: Layout profile section of the searched heading, see layoutProfile.
         """
         self.pdf_url = pdf_url
         self.pdf_path = pdf_path
@@ -36,6 +36,9 @@ class desired_image:
         self.temp_image_path = temp_image_path
         self.extracted_text = ""
         self.calcium_score = None
+        self.run_ocr = run_ocr
+        self.ocr_backend = ocr_backend
+        self.section = section
 
         # Automatically process the PDF when the object is created
         self.cropped_output = self.process()
@@ -48,98 +51,46 @@ class desired_image:
         """
         if self.pdf_url:
             print(f"Fetching PDF from URL: {self.pdf_url}")
-            response = requests.get(self.pdf_url)
-            if response.status_code == 200:
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-                temp_file.write(response.content)
-                temp_file.close()
-                print(f"PDF downloaded and saved temporarily at: {temp_file.name}")
-                return temp_file.name
-            else:
-                print(f"Failed to fetch PDF from URL: {self.pdf_url}, Status Code: {response.status_code}")
+            try:
+                pdf_path = get_pdf_fetcher().fetch_path(self.pdf_url)
+            except (ValueError, requests.exceptions.RequestException) as e:
+                print(e)
                 return None
+            print(f"PDF downloaded and saved temporarily at: {pdf_path}")
+            return pdf_path
         elif self.pdf_path:
             return self.pdf_path
         else:
             print("Either 'pdf_path' or 'pdf_url' must be provided.")
             return None
 
-    def highlight_text_with_regex(self, pdf_path):
+    @staticmethod
+    def parse_calcium_score(extracted_text):
         """
-        Highlight the target text in the PDF using regex patterns.
-        :param pdf_path: Path to the PDF file.
-        :return: Page number with the highlighted text.
+        Find the calcium 'Total' value in OCR text.
         """
-        doc = fitz.open(pdf_path)
-        regex_list = [re.compile(pattern, re.IGNORECASE) for pattern in self.regex_patterns]
-
-        for page_num in range(2, len(doc)):
-            page = doc[page_num]
-            text = page.get_text("text")
-            matches_found = False
-
-            for regex in regex_list:
-                matches = [(m.start(), m.end()) for m in regex.finditer(text)]
-
-                if matches:
-                    matches_found = True
-                    for start, end in matches:
-                        match_text = text[start:end]
-                        search_instances = page.search_for(match_text)
-                        for rect in search_instances:
-                            highlight = page.add_highlight_annot(rect)
-                            highlight.set_colors(stroke=(0, 1, 0))  # Green highlight
-                            highlight.update()
-
-            if matches_found:
-                doc.save(self.highlighted_pdf_path)
-                print(f"Highlighted PDF saved at: {self.highlighted_pdf_path}")
-                return page_num
-
-        # print(f"No matches for regex patterns {self.regex_patterns} found in the PDF.")
+        calcium_score_matches = re.findall(r"Total\s*:\s*([\d.]+)|Total\s*([\d.]+)|Total\s+\w*\s*\s*([\d.]+)|Total\s*Calcium\s*:\s*([\d.]+)", extracted_text)
+        if calcium_score_matches:
+            return next(filter(None, calcium_score_matches[0]), None)
         return None
 
-
-    def detect_highlight_and_crop(self, image_path):
+    @staticmethod
+    def read_text(image_path, backend):
         """
-        Detect the highlighted text region in the image and crop the area below it.
-        :param image_path: Path to the input image.
-        :return: Path to the cropped image.
+        OCR text of a calcium crop: contrast, median filter and sharpening, then the OCR backend.
         """
-        image = cv2.imread(image_path)
-        if image is None:
-            print(f"Image not found at {image_path}")
-            return None
-
-        hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        lower_hsv = np.array([35, 50, 50])
-        upper_hsv = np.array([85, 255, 255])
-        mask = cv2.inRange(hsv_image, lower_hsv, upper_hsv)
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        if not contours:
-            # print("No highlighted region found in the image.")
-            return None
-
-        largest_contour = max(contours, key=cv2.contourArea)
-        x, y, w, h = cv2.boundingRect(largest_contour)
-
-        crop_x_start = max(0, x - self.x_padding)
-        crop_x_end = min(image.shape[1], x + w + self.x_padding)
-        crop_y_start = y + h
-        crop_y_end = min(image.shape[0], crop_y_start + self.crop_height)
-        cropped_image = image[crop_y_start:crop_y_end, crop_x_start:crop_x_end]
-
-        cv2.imwrite(self.output_image_path, cropped_image)
-        # print(f"Cropped image saved at: {self.output_image_path}")
-        ImageProcessor().crop_center_contour(image_path=self.output_image_path, output_path=self.output_image_path)
-
-        return self.output_image_path
-
+        image = Image.open(image_path)
+        enhancer = ImageEnhance.Contrast(image)
+        image = enhancer.enhance(2.5)
+        image = image.convert("L").filter(ImageFilter.MedianFilter(size=3))
+        image = image.filter(ImageFilter.SHARPEN)
+        image_np = np.array(image)
+        text = [result[1] for result in backend.readtext(image_np)]
+        return "".join(text)
 
     def extract_text_with_easyocr(self, image_path):
         """
-        Extract text from the given image file using EasyOCR.
+        Extract text from the given image file using the OCR backend (EasyOCR by default).
         :param image_path: Path to the local image file.
         :return: Extracted text.
         """
@@ -147,22 +98,16 @@ class desired_image:
             print("No image path provided for text extraction.")
             return ""
 
-        reader = easyocr.Reader(['en'])
+        # The 'Total' label has to be read, numeral only backends are refused
+        backend = get_ocr_backend(self.ocr_backend, default_env="CALCIUM_OCR_BACKEND", words=True)
         try:
-            image = Image.open(image_path)
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(2.5)
-            image = image.convert("L").filter(ImageFilter.MedianFilter(size=3))
-            image = image.filter(ImageFilter.SHARPEN)
-            image_np = np.array(image)
-            text = reader.readtext(image_np, detail=0)
-            extracted_text = "".join(text)
+            extracted_text = self.read_text(image_path, backend)
             # print(extracted_text)
 
             # Extract Calcium Score from text
-            calcium_score_matches = re.findall(r"Total\s*:\s*([\d.]+)|Total\s*([\d.]+)|Total\s+\w*\s*\s*([\d.]+)|Total\s*Calcium\s*:\s*([\d.]+)", extracted_text)
-            if calcium_score_matches:
-                self.calcium_score = next(filter(None, calcium_score_matches[0]), None)
+            calcium_score = self.parse_calcium_score(extracted_text)
+            if calcium_score is not None:
+                self.calcium_score = calcium_score
                 
             return extracted_text
         except Exception as e:
@@ -179,21 +124,15 @@ class desired_image:
             print("PDF could not be fetched. Stopping the process.")
             return None
 
-        page_num = self.highlight_text_with_regex(pdf_path)
-        if page_num is None:
-            print("No matches found in the PDF. Stopping the process.")
-            return None
-
-        images = convert_from_path(self.highlighted_pdf_path, first_page=page_num + 1, last_page=page_num + 1)
-        images[0].save(self.temp_image_path)
-        cropped_image_path = self.detect_highlight_and_crop(self.temp_image_path)
-        if(self.highlighted_pdf_path):
-            os.remove(self.highlighted_pdf_path)
-        if(self.temp_image_path):
-            os.remove(self.temp_image_path)
+        spec = CropSpec(self.section, self.regex_patterns, self.output_image_path, first_page=2,
+                        crop_height=self.crop_height, x_padding=self.x_padding, crop_center=True)
+        result = CropEngine(pdf_path, highlighted_pdf_path=self.highlighted_pdf_path).run([spec])[spec.name]
+        cropped_image_path = result["path"] if result is not None else None
         if not cropped_image_path:
             print("Cropped image not available. Stopping the process.")
             return None
+        if not self.run_ocr:
+            return cropped_image_path
 
         # Extract text from the uploaded image
         extracted_text = self.extract_text_with_easyocr(cropped_image_path)
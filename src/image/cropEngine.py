@@ -0,0 +1,176 @@
+import math
+import cv2
+import fitz
+import regex as re
+from .fineTuneImage import ImageProcessor
+from .imageOps import GREEN_HSV, largest_component_bbox
+from ..deviceManager import get_device_manager
+from ..pdf.layoutProfile import get_layout_profiles
+from ..pdf.renderCache import get_render_cache, pixmap_to_bgr
+from ..pdf.templatePlan import get_template_plans, render_clip
+
+
+class CropSpec:
+    def __init__(self, name, regex_patterns, output_image_path, first_page=1, crop_height=800, x_padding=400,
+                 x_padding_left=None, x_padding_right=None, full_width=False, crop_center=False, section=None):
+        """
+        One image to crop below a highlighted anchor text.
+        :param name: Key of the crop in the CropEngine.run results.
+        :param regex_patterns: Anchor patterns ('regex' module syntax), the first page matching one of them is used.
+        :param output_image_path: Path to save the cropped image.
+        :param first_page: First page (zero based) searched for the anchor.
+        :param crop_height: Height in pixels of the crop below the anchor.
+        :param x_padding: Pixels added on either side of the anchor.
+        :param x_padding_left: Left padding, defaults to x_padding.
+        :param x_padding_right: Right padding, defaults to x_padding.
+        :param full_width: Crop the page width minus the paddings instead of around the anchor.
+        :param crop_center: Trim the crop to its largest contour (ImageProcessor.crop_center_contour).
+        :param section: Layout profile / template plan section, defaults to name.
+        """
+        self.name = name
+        self.regex_patterns = regex_patterns or []
+        self.output_image_path = output_image_path
+        self.first_page = first_page
+        self.crop_height = crop_height
+        self.x_padding_left = x_padding if x_padding_left is None else x_padding_left
+        self.x_padding_right = x_padding if x_padding_right is None else x_padding_right
+        self.full_width = full_width
+        self.crop_center = crop_center
+        self.section = section or name
+
+    def crop_box(self, bbox, image_shape):
+        """
+        Crop region (x0, y0, x1, y1) in pixels below the highlight bbox (x, y, w, h).
+        """
+        x, y, w, h = bbox
+        height, width = image_shape[:2]
+        if self.full_width:
+            x_start, x_end = max(0, self.x_padding_left), min(width, width - self.x_padding_right)
+        else:
+            x_start, x_end = max(0, x - self.x_padding_left), min(width, x + w + self.x_padding_right)
+        y_start = y + h
+        return x_start, y_start, x_end, min(height, y_start + self.crop_height)
+
+
+class CropEngine:
+    def __init__(self, pdf_path, dpi=200, highlighted_pdf_path=None):
+        """
+        Runs a batch of CropSpecs against one open document. The anchors of all specs are searched
+        and highlighted first, then every page holding an anchor is rendered once and all crops of
+        that page are cut from the same render. Renders come from the shared RenderCache, so other
+        batches on the same report reuse them too; they are made without annotations and only the
+        small window around an anchor is rendered with its highlight. Known templates skip the
+        search and render the planned clip directly (see templatePlan).
+        :param pdf_path: Local path of the PDF.
+        :param dpi: Render resolution, 200 matches the pdf2image default used before.
+        :param highlighted_pdf_path: Optional path to also save the highlighted PDF.
+        """
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self.highlighted_pdf_path = highlighted_pdf_path
+        get_device_manager()  # OpenCV thread count of this process
+
+    @staticmethod
+    def find_anchor(doc, spec, regex_list):
+        """
+        Highlight the anchor matches on the first matching page, in layout profile order.
+        :return: (page number, highlighted rects), or (None, []) when no page matches.
+        """
+        profiles = get_layout_profiles()
+        for page_num in profiles.page_order(doc, spec.section, first_page=spec.first_page):
+            page = doc[page_num]
+            text = page.get_text("text")
+            rects = []
+            matches_found = False
+            for regex in regex_list:
+                for match in regex.finditer(text):
+                    matches_found = True
+                    for rect in page.search_for(text[match.start():match.end()]):
+                        highlight = page.add_highlight_annot(rect)
+                        highlight.set_colors(stroke=(0, 1, 0))  # Green highlight
+                        highlight.update()
+                        rects.append(rect)
+            if matches_found:
+                profiles.record(doc, spec.section, page_num)
+                return page_num, rects
+        print(f"No matches for regex patterns {spec.regex_patterns} found in the PDF.")
+        return None, []
+
+    def render_page(self, doc, page_num):
+        return get_render_cache().render(self.pdf_path, page_num, self.dpi, doc=doc)
+
+    def highlight_bbox(self, page, image_shape, rects):
+        """
+        Pixel bbox (x, y, w, h) of the largest green highlight drawn for rects. Only a window
+        around each rect is rendered (with its highlight) and masked, so highlights of other
+        specs on the page are ignored.
+        """
+        scale = self.dpi / 72
+        best = None
+        for rect in rects:
+            margin = rect.height * scale / 2
+            x0 = max(0, math.floor(rect.x0 * scale - margin))
+            y0 = max(0, math.floor(rect.y0 * scale) - 4)
+            x1 = min(image_shape[1], math.ceil(rect.x1 * scale + margin))
+            y1 = min(image_shape[0], math.ceil(rect.y1 * scale) + 4)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            window = pixmap_to_bgr(page.get_pixmap(dpi=self.dpi, clip=fitz.Rect(x0 / scale, y0 / scale, x1 / scale, y1 / scale)))
+            bbox = largest_component_bbox(cv2.inRange(cv2.cvtColor(window, cv2.COLOR_BGR2HSV), *GREEN_HSV))
+            if bbox is not None and (best is None or bbox[2] * bbox[3] > best[2] * best[3]):
+                best = (x0 + bbox[0], y0 + bbox[1], bbox[2], bbox[3])
+        return best
+
+    def run(self, specs):
+        """
+        Crop every spec and save it to its output_image_path.
+        :return: spec name -> {"page", "crop_box", "path"}, or None when the anchor or its highlight
+                 was not found.
+        """
+        plans = get_template_plans()
+        results = {}
+        anchors = {}
+        doc = fitz.open(self.pdf_path)
+        try:
+            for spec in specs:
+                regex_list = [re.compile(pattern, re.IGNORECASE) for pattern in spec.regex_patterns]
+                plan = None if self.highlighted_pdf_path else plans.match(self.pdf_path, spec.section, regex_list)
+                if plan is not None:
+                    # Known template: render the planned crop, no anchor search or highlight detection
+                    render_clip(self.pdf_path, plan["page"], plan["crop_box"], plan["dpi"], spec.output_image_path)
+                    results[spec.name] = {"page": plan["page"], "crop_box": tuple(plan["crop_box"]),
+                                          "path": spec.output_image_path}
+                    continue
+                page_num, rects = self.find_anchor(doc, spec, regex_list)
+                results[spec.name] = None
+                if page_num is not None:
+                    anchors[spec.name] = (page_num, rects)
+
+            if anchors and self.highlighted_pdf_path:
+                doc.save(self.highlighted_pdf_path)
+                print(f"Highlighted PDF saved at: {self.highlighted_pdf_path}")
+
+            pages = {}
+            for spec in specs:
+                if spec.name not in anchors:
+                    continue
+                page_num, rects = anchors[spec.name]
+                if page_num not in pages:
+                    pages[page_num] = self.render_page(doc, page_num)
+                image = pages[page_num]
+                bbox = self.highlight_bbox(doc[page_num], image.shape, rects)
+                if bbox is None:
+                    print(f"No highlighted region found for {spec.name}.")
+                    continue
+                x0, y0, x1, y1 = crop_box = spec.crop_box(bbox, image.shape)
+                cv2.imwrite(spec.output_image_path, image[y0:y1, x0:x1])
+                print(f"Cropped image saved at: {spec.output_image_path}")
+                plans.learn(self.pdf_path, spec.section, page_num, rects[0], crop_box, dpi=self.dpi)
+                results[spec.name] = {"page": page_num, "crop_box": crop_box, "path": spec.output_image_path}
+        finally:
+            doc.close()
+
+        for spec in specs:
+            if spec.crop_center and results[spec.name] is not None:
+                ImageProcessor().crop_center_contour(image_path=spec.output_image_path, output_path=spec.output_image_path)
+        return results
@@ -1,5 +1,6 @@
 import cv2
 import numpy as np
+from .imageOps import largest_edge_bbox
 
 class ImageProcessor:
     def __init__(self):
@@ -21,36 +22,12 @@ class ImageProcessor:
                 print(f"Image not found at {image_path}. Skipping cropping step.")
                 return None  # Skip this step and continue the next process
 
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-            # Use edge detection to detect the central region
-            edges = cv2.Canny(gray, 50, 150)
-
-            # Find contours in the edges
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            if not contours:
+            # Largest bounding box of the external contours of the Canny edges
+            bbox = largest_edge_bbox(image)
+            if bbox is None:
                 print("No contours found in the image. Skipping cropping step.")
                 return None
-
-            largestContour = None
-            maxArea = float("-inf")
-            for contour in contours:
-                # Calculate the bounding box of the contour
-                x, y, w, h = cv2.boundingRect(contour)
-                
-                # Calculate the contour area
-                area = w * h
-                if area > maxArea:
-                    maxArea = area
-                    largestContour = contour
-
-            if largestContour is None:
-                print("No valid contour found. Skipping cropping step.")
-                return None
-
-            # Get the bounding box of the largest contour
-            x, y, w, h = cv2.boundingRect(largestContour)
+            x, y, w, h = bbox
 
             # Crop the region
             cropped_image = image[y:y+h, x:x+w]
@@ -0,0 +1,322 @@
+import os
+import threading
+import cv2
+import fitz
+import numpy as np
+from ..deviceManager import get_device_manager
+from .ocrExport import OCR_ONNX_DIR, model_path
+
+
+class OCRBackend:
+    """
+    Interface of the OCR engines used for the short numeric targets (ICD values, calcium total).
+    readtext follows easyocr.Reader.readtext: a list of (bbox, text, confidence).
+    """
+    name = None
+    reads_words = True  # False for engines limited to numerals, they cannot find labels like 'Total'
+
+    def readtext(self, image):
+        raise NotImplementedError
+
+    def recognize(self, image, boxes):
+        """
+        Recognise text only inside the given boxes ([x_min, x_max, y_min, y_max]), skipping text
+        detection. Engines without a recognition-only mode read each crop on its own.
+        """
+        image = self.load_image(image)
+        results = []
+        for x_min, x_max, y_min, y_max in boxes:
+            for bbox, text, confidence in self.readtext(image[y_min:y_max, x_min:x_max]):
+                results.append(([[x + x_min, y + y_min] for x, y in bbox], text, confidence))
+        return results
+
+    @staticmethod
+    def load_image(image):
+        """
+        Accept an image path or an already loaded BGR/grayscale array.
+        """
+        if isinstance(image, str):
+            loaded = cv2.imread(image)
+            if loaded is None:
+                raise FileNotFoundError(f"Image not found at {image}")
+            return loaded
+        return image
+
+
+class EasyOCRBackend(OCRBackend):
+    name = "easyocr"
+
+    def __init__(self, gpu=None):
+        """
+        EasyOCR (CRAFT detector + CRNN recogniser). The reader is loaded once and shared,
+        instead of loading the models again for every crop.
+        :param gpu: Run on the GPU, defaults to the DeviceManager choice (OCR_DEVICE).
+        """
+        self.gpu = get_device_manager().use_gpu if gpu is None else gpu
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def reader(self):
+        if self._reader is None:
+            with self._lock:
+                if self._reader is None:
+                    import easyocr
+                    self._reader = easyocr.Reader(['en'], gpu=self.gpu)
+        return self._reader
+
+    def readtext(self, image):
+        reader = self.reader()
+        with self._lock:
+            return reader.readtext(image)
+
+    def recognize(self, image, boxes):
+        reader = self.reader()
+        with self._lock:
+            return reader.recognize(self.load_image(image), horizontal_list=boxes, free_list=[])
+
+
+class OnnxModule:
+    def __init__(self, path, threads):
+        """
+        Stands in for an EasyOCR torch model: runs its ONNX export (see ocrExport) with onnxruntime
+        and returns torch tensors, so EasyOCR's own pre and post processing stay unchanged.
+        :param path: ONNX file of the model.
+        :param threads: onnxruntime intra-op threads.
+        """
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def __call__(self, image, *args):
+        import torch
+        feed = {"image": image.cpu().numpy()}
+        if "text" in self.input_names:
+            feed["text"] = args[0].cpu().numpy()
+        outputs = [torch.from_numpy(output) for output in self.session.run(None, feed)]
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+
+class OnnxEasyOCRBackend(EasyOCRBackend):
+    name = "easyocr-onnx"
+    quantized = False
+
+    def __init__(self, model_dir=None):
+        """
+        EasyOCR with its detector and recogniser running as ONNX models on the CPU, exported by
+        'python -m src.image.ocrExport'. Compare its readings with the 'easyocr' backend on a
+        corpus (test/ocr_benchmark.py --reference easyocr) before switching a target to it.
+        :param model_dir: Folder of the exported models, defaults to OCR_ONNX_DIR.
+        """
+        super().__init__(gpu=False)
+        self.model_dir = model_dir or OCR_ONNX_DIR
+
+    def reader(self):
+        if self._reader is None:
+            with self._lock:
+                if self._reader is None:
+                    import easyocr
+                    paths = {model: model_path(self.model_dir, model, self.quantized) for model in ("detector", "recognizer")}
+                    missing = [path for path in paths.values() if not os.path.exists(path)]
+                    if missing:
+                        raise FileNotFoundError(f"ONNX OCR models {missing} not found, run 'python -m src.image.ocrExport'")
+                    # The torch models are replaced (and freed), the reader keeps the pre / post processing
+                    reader = easyocr.Reader(['en'], gpu=False)
+                    threads = get_device_manager().torch_threads
+                    reader.detector = OnnxModule(paths["detector"], threads)
+                    reader.recognizer = OnnxModule(paths["recognizer"], threads)
+                    self._reader = reader
+        return self._reader
+
+
+class OnnxInt8EasyOCRBackend(OnnxEasyOCRBackend):
+    """
+    OnnxEasyOCRBackend with the 8-bit (uint8 weight) quantised ONNX models.
+    """
+    name = "easyocr-onnx-int8"
+    quantized = True
+
+
+class TemplateDigitBackend(OCRBackend):
+    name = "template"
+    reads_words = False
+    glyph_size = (16, 24)  # (width, height) every glyph is normalised to
+
+    def __init__(self, template_dir=None, charset="0123456789.:"):
+        """
+        Compact numeral recogniser: connected components of the binarised image are matched
+        against glyph templates of the report font with normalised correlation.
+        :param template_dir: Folder of glyph images named after their character ('0.png' ... '9.png',
+                             'dot.png', 'colon.png'), defaults to OCR_TEMPLATE_DIR. Missing glyphs
+                             are rendered in Helvetica, the report font.
+        :param charset: Characters the recogniser can return.
+        """
+        self.template_dir = template_dir or os.getenv("OCR_TEMPLATE_DIR")
+        self.charset = charset
+        self.templates = self.load_templates()
+
+    def normalise_glyph(self, binary):
+        """
+        Crop a binary glyph (foreground > 0) to its bounding box and scale it to glyph_size.
+        """
+        ys, xs = np.nonzero(binary)
+        if len(xs) == 0:
+            return np.zeros(self.glyph_size[::-1], dtype=np.float32)
+        glyph = binary[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+        glyph = cv2.resize(glyph.astype(np.float32), self.glyph_size, interpolation=cv2.INTER_AREA)
+        glyph -= glyph.mean()
+        norm = np.linalg.norm(glyph)
+        return glyph / norm if norm else glyph
+
+    @staticmethod
+    def render_glyph(char, fontsize=40):
+        """
+        Render a glyph in Helvetica, the font PyMuPDF reports are written in, as a binary image.
+        """
+        doc = fitz.open()
+        page = doc.new_page(width=fontsize * 1.5, height=fontsize * 1.5)
+        page.insert_text((fontsize * 0.25, fontsize * 1.1), char, fontsize=fontsize, fontname="helv")
+        pixmap = page.get_pixmap(colorspace=fitz.csGRAY)
+        doc.close()
+        gray = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        return binary
+
+    def load_templates(self):
+        file_names = {".": "dot", ":": "colon"}
+        templates = {}
+        for char in self.charset:
+            path = os.path.join(self.template_dir, f"{file_names.get(char, char)}.png") if self.template_dir else None
+            if path and os.path.exists(path):
+                glyph = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+                _, binary = cv2.threshold(glyph, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+            else:
+                binary = self.render_glyph(char)
+            templates[char] = self.normalise_glyph(binary)
+        # Punctuation is recognised from its size, only the character glyphs are correlated
+        self.template_chars = [char for char in templates if char not in ".:"]
+        self.template_matrix = np.stack([templates[char].ravel() for char in self.template_chars])
+        return templates
+
+    def binarise(self, image):
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # Text is the minority class, the mean brightness is misled by a masked (black) surround
+        if np.count_nonzero(binary) > binary.size / 2:
+            binary = cv2.bitwise_not(binary)
+        return binary
+
+    def recognise_line(self, binary, boxes):
+        """
+        Recognise a single line of glyph boxes (x, y, w, h) ordered left to right.
+        """
+        line_height = max(h for _, _, _, h in boxes)
+        widths = sorted(w for _, _, w, h in boxes if h > line_height * 0.5) or [line_height // 2]
+        median_width = widths[len(widths) // 2]
+        text, scores, previous_end, previous_dot = "", [], None, None
+
+        for x, y, w, h in boxes:
+            if h < line_height * 0.35 and w < median_width * 0.7:
+                if previous_dot is not None and x < previous_dot[0] + previous_dot[2] and text.endswith("."):
+                    # Second dot straight above / below the first one: a colon
+                    text = text[:-1] + (":" if ":" in self.charset else ".")
+                    continue
+                previous_dot = (x, y, w, h)
+                text += "." if "." in self.charset else ""
+                scores.append(1.0)
+                previous_end = x + w
+                continue
+            # The widest glyph sets the word gap, a narrow '1' would split numbers
+            if previous_end is not None and x - previous_end > widths[-1] * 0.6:
+                text += " "
+            previous_end = x + w
+            glyph = self.normalise_glyph(binary[y:y + h, x:x + w])
+            correlations = self.template_matrix @ glyph.ravel()
+            best = int(np.argmax(correlations))
+            text += self.template_chars[best]
+            scores.append(float(correlations[best]))
+        return text, (float(np.mean(scores)) if scores else 0.0)
+
+    @staticmethod
+    def is_glyph(box, area, shape):
+        """
+        Keep the components that can be a character: a frame or background edge touching the crop
+        border (e.g. the black surround of a yellow label) or a rule line would be read as a '1'.
+        """
+        x, y, w, h = box
+        height, width = shape
+        if area < 4:
+            return False
+        touches_border = x == 0 or y == 0 or x + w == width or y + h == height
+        if touches_border and (w >= width * 0.8 or h >= height * 0.8):
+            return False
+        if w > h * 2.5 or h > w * 8:
+            # Rules and underlines, a '1' is narrow but never 8 times taller than wide
+            return False
+        return area >= w * h * 0.1
+
+    def readtext(self, image):
+        binary = self.binarise(self.load_image(image))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        boxes = [tuple(int(v) for v in stats[i, :4]) for i in range(1, count)
+                 if self.is_glyph(stats[i, :4], stats[i, cv2.CC_STAT_AREA], binary.shape)]
+        if not boxes:
+            return []
+
+        # Group glyphs into lines by vertical overlap, so dots sitting on the baseline stay on their
+        # line, then read each line left to right
+        lines = []
+        for box in sorted(boxes, key=lambda b: (-b[3], b[1])):
+            top, bottom = box[1], box[1] + box[3]
+            for line in lines:
+                if min(bottom, line["bottom"]) - max(top, line["top"]) >= box[3] * 0.5:
+                    line["boxes"].append(box)
+                    break
+            else:
+                lines.append({"top": top, "bottom": bottom, "boxes": [box]})
+        lines.sort(key=lambda line: line["top"])
+
+        results = []
+        for line in lines:
+            line_boxes = sorted(line["boxes"])
+            text, confidence = self.recognise_line(binary, line_boxes)
+            x0 = min(b[0] for b in line_boxes)
+            y0 = min(b[1] for b in line_boxes)
+            x1 = max(b[0] + b[2] for b in line_boxes)
+            y1 = max(b[1] + b[3] for b in line_boxes)
+            results.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text, confidence))
+        return results
+
+
+OCR_BACKENDS = {
+    EasyOCRBackend.name: EasyOCRBackend,
+    OnnxEasyOCRBackend.name: OnnxEasyOCRBackend,
+    OnnxInt8EasyOCRBackend.name: OnnxInt8EasyOCRBackend,
+    TemplateDigitBackend.name: TemplateDigitBackend,
+}
+_backend_instances = {}
+_backend_lock = threading.Lock()
+
+
+def get_ocr_backend(name=None, default_env=None, words=False):
+    """
+    Return the shared OCR backend instance registered under name.
+    :param name: Backend name, see OCR_BACKENDS. When None the default_env variable is read, then 'easyocr'.
+    :param default_env: Environment variable that selects the backend for a target, e.g. ICD_OCR_BACKEND.
+    :param words: The target needs words as well as numerals, numeral only backends are refused.
+    """
+    name = name or (os.getenv(default_env) if default_env else None) or EasyOCRBackend.name
+    if name not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR backend '{name}'. Available backends: {list(OCR_BACKENDS)}")
+    if words and not OCR_BACKENDS[name].reads_words:
+        raise ValueError(f"OCR backend '{name}' only reads numerals and cannot be used for this target "
+                         f"({default_env or 'words required'}).")
+    with _backend_lock:
+        if name not in _backend_instances:
+            _backend_instances[name] = OCR_BACKENDS[name]()
+        return _backend_instances[name]
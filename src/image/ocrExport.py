@@ -0,0 +1,79 @@
+"""
+Build step of the ONNX OCR backends: exports the EasyOCR detector (CRAFT) and recogniser (CRNN)
+to ONNX and writes 8-bit dynamically quantised copies next to them.
+
+    python -m src.image.ocrExport [output_dir]
+
+The output folder defaults to OCR_ONNX_DIR. The files are read by the 'easyocr-onnx' and
+'easyocr-onnx-int8' backends of ocrBackend.
+"""
+import inspect
+import os
+import sys
+
+OCR_ONNX_DIR = os.getenv("OCR_ONNX_DIR", "/cardiovision/data/ocr_onnx")
+ONNX_MODELS = {"detector": "detector.onnx", "recognizer": "recognizer.onnx"}
+
+
+def model_path(output_dir, model, quantized=False):
+    file_name = ONNX_MODELS[model]
+    return os.path.join(output_dir, file_name.replace(".onnx", ".int8.onnx") if quantized else file_name)
+
+
+def last_axis_mean():
+    import torch
+
+    class LastAxisMean(torch.nn.Module):
+        def forward(self, x):
+            return x.mean(dim=3, keepdim=True)
+
+    return LastAxisMean()
+
+
+def export_models(output_dir=OCR_ONNX_DIR, opset=17):
+    """
+    Export the fp32 EasyOCR models to ONNX, then quantise their weights to uint8.
+    :return: The written file paths.
+    """
+    import easyocr
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(output_dir, exist_ok=True)
+    # quantize=False: export the fp32 weights, EasyOCR quantises its CPU models in torch otherwise
+    reader = easyocr.Reader(['en'], gpu=False, quantize=False)
+    detector, recognizer = reader.detector.eval(), reader.recognizer.eval()
+    if isinstance(getattr(recognizer, "AdaptiveAvgPool", None), torch.nn.AdaptiveAvgPool2d):
+        # AdaptiveAvgPool2d((None, 1)) cannot be exported with a dynamic width, it is a mean over the last axis
+        recognizer.AdaptiveAvgPool = last_axis_mean()
+
+    # TorchScript exporter (dynamic_axes), newer torch defaults to the dynamo one
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            detector, torch.randn(1, 3, 640, 640), model_path(output_dir, "detector"), opset_version=opset, **options,
+            input_names=["image"], output_names=["score", "feature"],
+            dynamic_axes={"image": {0: "batch", 2: "height", 3: "width"}, "score": {0: "batch", 1: "height", 2: "width"},
+                          "feature": {0: "batch", 2: "height", 3: "width"}}
+        )
+        # The recogniser reads grayscale crops resized to a height of 64 pixels, text is unused by CTC models
+        torch.onnx.export(
+            recognizer, (torch.randn(1, 1, 64, 256), torch.zeros(1, 1, dtype=torch.long)),
+            model_path(output_dir, "recognizer"), opset_version=opset, **options,
+            input_names=["image", "text"], output_names=["logits"],
+            dynamic_axes={"image": {0: "batch", 3: "width"}, "logits": {0: "batch", 1: "steps"}}
+        )
+
+    paths = []
+    for model in ONNX_MODELS:
+        # uint8 weights: older onnxruntime CPU builds only implement ConvInteger, most of CRAFT and
+        # of the CRNN feature extractor, for uint8
+        quantize_dynamic(model_path(output_dir, model), model_path(output_dir, model, quantized=True),
+                         weight_type=QuantType.QUInt8)
+        paths += [model_path(output_dir, model), model_path(output_dir, model, quantized=True)]
+    return paths
+
+
+if __name__ == "__main__":
+    for path in export_models(sys.argv[1] if len(sys.argv) > 1 else OCR_ONNX_DIR):
+        print(f"Written {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
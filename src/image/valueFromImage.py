@@ -1,18 +1,16 @@
 import cv2
 import numpy as np
-import easyocr
 import re
-import os
+from .ocrBackend import get_ocr_backend
 
 class YellowShadeOCR:
-    def __init__(self):
+    def __init__(self, backend=None):
         """
         Initializes the class and runs the yellow shade detection and OCR automatically.
-        :param input_image_path: Path to the input image.
-        :param processed_image_path: Path to save the yellow-shaded processed image.
+        :param backend: OCR backend name (see ocrBackend.OCR_BACKENDS), defaults to ICD_OCR_BACKEND or 'easyocr'.
         """
 
-        pass
+        self.backend = get_ocr_backend(backend, default_env="ICD_OCR_BACKEND")
 
         # Automatically process the image and extract the numeric value
         
@@ -30,16 +28,11 @@ class YellowShadeOCR:
             hsv_colors.append(tuple(hsv_color))
         return hsv_colors
     
-    def pick_yellow_shades(self,input_image_path,processed_image_path):
+    def yellow_mask(self, image):
         """
-        Detect and isolate all shades of yellow in an image and smoothen edges.
+        Build the smoothed mask of all shades of yellow in a BGR image.
+        :return: The mask and the image with everything but the yellow shades blacked out.
         """
-        # Load the image
-        image = cv2.imread(input_image_path)
-        if image is None:
-            print(f"Image not found at {input_image_path}")
-            return None
-
         # Convert the image to HSV
         hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
 
@@ -60,31 +53,61 @@ class YellowShadeOCR:
 
         # Apply the mask to the original image
         yellow_only = cv2.bitwise_and(image, image, mask=mask)
+        return mask, yellow_only
+
+    def pick_yellow_shades(self,input_image_path,processed_image_path):
+        """
+        Detect and isolate all shades of yellow in an image and smoothen edges.
+        """
+        # Load the image
+        image = cv2.imread(input_image_path)
+        if image is None:
+            print(f"Image not found at {input_image_path}")
+            return None
+
+        _, yellow_only = self.yellow_mask(image)
 
         # Save the output image
         cv2.imwrite(processed_image_path, yellow_only)
         print(f"Image with yellow shades saved and smoothed at: {processed_image_path}")
         return 1
-        
-        
-    def apply_easyocr_extract_numeric(self,processed_image_path):
+
+    def yellow_text_boxes(self, mask, merge_width=15, padding=4, min_area=30):
         """
-        Apply EasyOCR to extract text from an image and concatenate all numeric values.
-        :return: Concatenated numeric values as a single string.
+        Turn the connected components of the yellow mask into tight text ROIs for recognition.
+        Glyphs are merged horizontally first so each value becomes one box.
+        :return: Boxes as [x_min, x_max, y_min, y_max], top to bottom then left to right.
+        """
+        binary = (mask > 0).astype(np.uint8)
+        if not binary.any():
+            return []
+
+        merged = cv2.dilate(binary, cv2.getStructuringElement(cv2.MORPH_RECT, (merge_width, 3)))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(merged, connectivity=8)
+        height, width = mask.shape[:2]
+        boxes = []
+        for x, y, w, h, area in stats[1:count]:
+            if area < min_area:
+                continue
+            boxes.append([
+                int(max(0, x - padding)), int(min(width, x + w + padding)),
+                int(max(0, y - padding)), int(min(height, y + h + padding))
+            ])
+        return sorted(boxes, key=lambda box: (box[2], box[0]))
+
+    def extract_numeric(self, results):
+        """
+        Concatenate all numeric values of the OCR results into a single value.
+        :return: The value as a string, or -1 when no digit was read.
         """
-        # Initialize the EasyOCR Reader
-        reader = easyocr.Reader(['en'], gpu=True)
-
-        # Perform OCR on the image
-        # print(f"Running EasyOCR on {self.processed_image_path}...")
-        results = reader.readtext(processed_image_path)
-
         # Extract and combine text
         extracted_text = " ".join([result[1] for result in results])
 
         # Retain only numeric values using regex and concatenate them
         numeric_values = "".join(re.findall(r'\d+', extracted_text))  # Concatenate all numeric characters
         # print(numeric_values)
+        if not numeric_values:
+            return -1
         numeric_values = int(numeric_values)
 
         # Reduce numeric value if greater than 99
@@ -95,21 +118,37 @@ class YellowShadeOCR:
         # print(numeric_values)
         numeric_value = str(numeric_values)
         return numeric_value
+        
+    def apply_easyocr_extract_numeric(self,processed_image_path):
+        """
+        Apply the OCR backend (EasyOCR by default) to extract text from an image and concatenate all numeric values.
+        :return: Concatenated numeric values as a single string, or -1 when no digit was read.
+        """
+        # Perform OCR on the image
+        # print(f"Running EasyOCR on {self.processed_image_path}...")
+        results = self.backend.readtext(processed_image_path)
+        return self.extract_numeric(results)
     
-    def run(self,input_image_path,processed_image_path):
-        """
-        Runs the entire process: yellow shade detection and OCR.
-        """
-        y = self.pick_yellow_shades(input_image_path=input_image_path,processed_image_path=processed_image_path)
-        if(y == 1):
-            print(y)
-            if processed_image_path is not None:
-                x = self.apply_easyocr_extract_numeric(processed_image_path=processed_image_path)
-                if(processed_image_path):
-                    os.remove(processed_image_path)
-                return x
-        else:
+    def run(self,input_image_path,processed_image_path=None):
+        """
+        Runs the entire process: yellow shade detection and OCR. The mask is kept in memory and only
+        the yellow text regions are sent to recognition, the text detector is skipped.
+        :param processed_image_path: Optional path to also save the yellow-shaded image for debugging.
+        """
+        image = cv2.imread(input_image_path)
+        if image is None:
+            print(f"Image not found at {input_image_path}")
+            return -1
+
+        mask, yellow_only = self.yellow_mask(image)
+        if processed_image_path:
+            cv2.imwrite(processed_image_path, yellow_only)
+
+        boxes = self.yellow_text_boxes(mask)
+        if not boxes:
+            # Nothing yellow in the crop, no OCR at all
             return -1
+        return self.extract_numeric(self.backend.recognize(yellow_only, boxes))
     
 # # Usage Example
 # if __name__ == "__main__":
@@ -1,4 +1,6 @@
 import pandas as pd
+import numpy as np
+from src.criteriaRules import compiled_rules
 # import re
 
 class ConditionEvaluator:
@@ -10,31 +12,7 @@ class ConditionEvaluator:
             input_data (dict): A dictionary containing the input values.
         """
         self.input_data = input_data
-        self.STJ = self._safe_float(input_data.get("stjDiameter"))
-        self.Annulus_dia = self._safe_float(input_data.get("annulusDiameter"))
-        self.LVOT = self._safe_float(input_data.get("lvotDiameter"))
-        self.Asc_Aorta = self._safe_float(input_data.get("ascAortaDiameter"))
-        self.RCA = self._safe_float(input_data.get("rcaHeight"))
-        self.LCA = self._safe_float(input_data.get("lcaHeight"))
-        self.SOV_Height = self._safe_float(input_data.get("sovHeight"))
-        self.SOV_left = self._safe_float(input_data.get("sovLeftDiameter"))
-        self.SOV_right = self._safe_float(input_data.get("sovRightDiameter"))
-        self.SOV_non = self._safe_float(input_data.get("sovNonDiameter"))
-        self.SOV_Dia = self._safe_float(input_data.get("sovDiameter"))
-        self.Valve_anatomy = input_data.get("aorticValveAnatomyType")  # Default to 'Unknown'
-        self.Calcium = self._safe_float(input_data.get("calciumScore"))
-        self.ICD4mm = self._safe_float(input_data.get("icd4mm"))
-        self.ICD6mm = self._safe_float(input_data.get("icd6mm"))
-        self.ICD8mm = self._safe_float(input_data.get("icd8mm"))
-        self.VTCR = self._safe_float(input_data.get("vtcR"))
-        self.VTCL = self._safe_float(input_data.get("vtcL"))
-        self.ciaLeftDia = self._safe_float(input_data.get("ciaLeftDiameter"))
-        self.ciaRightDia = self._safe_float(input_data.get("ciaRightDiameter"))
-        self.eiaLeftDia = self._safe_float(input_data.get("eiaLeftDiameter"))
-        self.eiaRightDia = self._safe_float(input_data.get("eiaRightDiameter"))
-        self.faLeftDiameter = self._safe_float(input_data.get("faLeftDiameter"))
-        self.faRightDiameter = self._safe_float(input_data.get("faRightDiameter"))
-        
+        self.values = {field: self._safe_float(input_data.get(field)) for field in compiled_rules.fields}
 
     def _safe_float(self, value, default=0.0):
         """
@@ -65,141 +43,22 @@ class ConditionEvaluator:
         else:
             return 'Not Found'
 
-    def evaluate_STJ(self):
-        if self.STJ is None or self.Annulus_dia is None:
-            return ["Not Eligible", None, None, None]
-        if self.STJ >= self.Annulus_dia:
-            return ["Favourable", ((self.STJ - self.Annulus_dia) / self.Annulus_dia) * 100, None, str(self.Annulus_dia)+' mm']
-        else:
-            return ["Attention Required", None, ((self.Annulus_dia - self.STJ) / self.Annulus_dia) * 100, str(self.Annulus_dia)+' mm']
-
-    def evaluate_SOV(self, SOV_value):
-        # print("a", SOV_value)
-        if SOV_value == "None" or SOV_value is None or int(SOV_value) == 0 or self.Annulus_dia is None:
-            return ["Not Eligible", None, None, None]
-        threshold = self.Annulus_dia * 1.2
-        if SOV_value >= threshold:
-            return ["Favourable", ((SOV_value - threshold) / threshold) * 100, None, str(round(threshold,2))+' mm']
-        else:
-            return ["Attention Required", None, ((threshold - SOV_value ) / threshold) * 100, str(round(threshold,2))+' mm']
-
-    def evaluate_RCA(self):
-        if self.RCA is None:
-            return ["Not Eligible", None, None, None]
-        if self.RCA >= 10:
-            return ["Favourable", (self.RCA - 10) * 10, None, '10 mm']
-        else:
-            return ["Attention Required", None, (10 - self.RCA) * 10, '10 mm']
-
-    def evaluate_LCA(self):
-        if self.LCA is None:
-            return ["Not Eligible", None, None, None]
-        if self.LCA >= 10:
-            return ["Favourable", (self.LCA - 10) * 10, None, '10 mm']
-        else:
-            return ["Attention Required", None, (10 - self.LCA) * 10, '10 mm']
+    def evaluate_all(self):
+        """
+        Evaluate every criteria rule of src/criteriaRules.py for the report.
 
-    def evaluate_LVOT(self):
-        if self.LVOT is None or self.Annulus_dia is None:
-            return ["Not Eligible", None, None, None]
-        if self.LVOT >= self.Annulus_dia:
-            return ["Favourable", ((self.LVOT - self.Annulus_dia) / self.Annulus_dia) * 100, None, str(self.Annulus_dia)+' mm']
-        else:
-            return ["Attention Required", None, ((self.Annulus_dia - self.LVOT) / self.Annulus_dia) * 100, str(self.Annulus_dia)+' mm']
-
-    def evaluate_Valve_anatomy(self):
-        if self.Valve_anatomy is None:
-            return ["Not Eligible", None, None, None]
-        valve_type = self.extract_valve_type(self.Valve_anatomy)
-        if valve_type == "bicuspid":
-            return ["Attention Required", None, None, "Tricuspid"]
-        else:
-            return ["Favourable", None, None, "Tricuspid"]
+        Returns:
+            dict: criteria -> [status, favourable %, attention %, threshold label]
+        """
+        return compiled_rules.evaluate(self.values, self.input_data)
 
-    def evaluate_Calcium(self):
-        if self.Calcium is None:
-            return ["Not Eligible", None, None, None]
-        if self.Calcium > 1000:
-            return ["Attention Required", None, (self.Calcium - 1000) / 10, '1000 mm³']
-        else:
-            return ["Favourable", (1000 - self.Calcium) / 10, None, '1000 mm³']
-        
-    def evaluate_ICD(self, ICD):
-        if ICD is None or self.Annulus_dia is None:
-            return ["Not Eligible", None, None, None]
-        threshold = self.Annulus_dia
-        # print(threshold)
-        if ICD >= threshold:
-            return ["Favourable", ((ICD - threshold) / threshold) * 100, None, str(round(threshold,2))+' mm']
-        else:
-            return ["Attention Required", None, ((threshold - ICD) / threshold) * 100, str(round(threshold,2))+' mm']
-    
-    def evaluate_Asc_Aorta(self):
-        if self.Asc_Aorta is None:
-            return ["Not Eligible", None, None, None]
-        threshold = 40
-        if self.Asc_Aorta < threshold:
-            return ["Favourable", None, None, "40 mm"]
-        else:
-            return ["Attention Required", None, ((self.Asc_Aorta - threshold) / threshold) * 100, "40 mm"]
-
-    def evaluate_VTC(self, vtc):
-        if vtc == None or vtc == 0.0:
-            return ["Not Eligible", None, None, None]
-        threshold = 4.0
-        # print(threshold)
-        if vtc >= threshold:
-            return ["Favourable", ((vtc - threshold) / threshold) * 100, None, str(round(threshold,2))+' mm']
-        else:
-            return ["Attention Required", None, ((threshold - vtc) / threshold) * 100, str(round(threshold,2))+' mm']
-        
-    def evaluate_femoral(self, value):
-        if value == None:
-            return ["Not Eligible", None, None, None]
-        if value >= 6:
-            return ["Favourable", ((value - 6) / 6)*100, None, '6 mm']
-        else:
-            return ["Attention Required", None, ((6 - value) / 6)*100, '6 mm']
-        
-    def evaluate_sovHeight(self, value):
-        if value == None or self.RCA == None or self.LCA == None:
-            return ["Not Eligible", None, None, None]
-        min_value = min(self.RCA,self.LCA) 
-        if value >= min_value:
-            return ["Favourable", ((value - min_value) / min_value)*100, None, str(round(min_value,2))+'mm']
-        else:
-            return ["Attention Required", None, ((min_value - value) / min_value)*100, str(round(min_value,2))+'mm']
-            
-        
-    def evaluate_all(self):
-        return {
-            "stjDiameter": self.evaluate_STJ(),
-            "sovRightDiameter": self.evaluate_SOV(self.SOV_right),
-            "sovLeftDiameter": self.evaluate_SOV(self.SOV_left),
-            "sovNonDiameter": self.evaluate_SOV(self.SOV_non),
-            "sovDiameter": self.evaluate_SOV(self.SOV_Dia),
-            "sovHeight": self.evaluate_sovHeight(self.SOV_Height),
-            "icd4mm": self.evaluate_ICD(self.ICD4mm),
-            "icd6mm": self.evaluate_ICD(self.ICD6mm),
-            "icd8mm": self.evaluate_ICD(self.ICD8mm),
-            "rcaHeight": self.evaluate_RCA(),
-            "lcaHeight": self.evaluate_LCA(),
-            "lvotDiameter": self.evaluate_LVOT(),
-            "ascAortaDiameter": self.evaluate_Asc_Aorta(),
-            "aorticValveAnatomyType": self.evaluate_Valve_anatomy(),
-            "calciumScore": self.evaluate_Calcium(),
-            "vtcL": self.evaluate_VTC(self.VTCL),
-            "vtcR": self.evaluate_VTC(self.VTCR),
-            "ciaLeftDiameter": self.evaluate_femoral(self.ciaLeftDia),
-            "ciaRightDiameter": self.evaluate_femoral(self.ciaRightDia),
-            "eiaLeftDiameter": self.evaluate_femoral(self.eiaLeftDia),
-            "eiaRightDiameter": self.evaluate_femoral(self.eiaRightDia),
-            "faLeftDiameter": self.evaluate_femoral(self.faLeftDiameter),
-            "faRightDiameter": self.evaluate_femoral(self.faRightDiameter)
-        }
-
-    def generate_results_table(self):
-        evaluations = self.evaluate_all()
+    def generate_results_table(self, evaluations=None):
+        """
+        Parameters:
+            evaluations (dict): Precomputed evaluate_all() result, e.g. from ReportScoringCache.
+        """
+        if evaluations is None:
+            evaluations = self.evaluate_all()
         data = []
 
         for criteria, result in evaluations.items():
@@ -216,6 +75,122 @@ class ConditionEvaluator:
         return data
         # return pd.DataFrame(data)
 
+class BatchConditionEvaluator:
+    """
+    Vectorised version of ConditionEvaluator for scoring many reports at once, e.g. a cohort
+    dashboard. Every rule is computed with NumPy masks over whole columns; the rows produced by
+    generate_results_tables are identical to ConditionEvaluator(report).generate_results_table().
+    """
+    NUMERIC_FIELDS = compiled_rules.fields
+
+    def __init__(self, reports):
+        """
+        Parameters:
+            reports: A columnar table of reports (dict of arrays/lists, pandas DataFrame or
+                     pyarrow Table), or a list of report dictionaries.
+        """
+        self.columns = self._to_columns(reports)
+        self.size = len(next(iter(self.columns.values()))) if self.columns else 0
+        self.values = {field: self._float_column(self.columns.get(field)) for field in self.NUMERIC_FIELDS}
+
+    @staticmethod
+    def _to_columns(reports):
+        if hasattr(reports, "to_pydict"):  # pyarrow.Table
+            return reports.to_pydict()
+        if hasattr(reports, "to_dict") and hasattr(reports, "columns"):  # pandas.DataFrame
+            return reports.to_dict(orient="list")
+        if isinstance(reports, dict):
+            return {key: list(column) for key, column in reports.items()}
+        keys = []
+        for report in reports:
+            keys.extend(key for key in report if key not in keys)
+        return {key: [report.get(key) for report in reports] for key in keys}
+
+    @staticmethod
+    def _safe_float(value):
+        # Same conversion as ConditionEvaluator._safe_float, with NaN standing for None
+        try:
+            if value == '' or value is None:
+                return np.nan
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def _float_column(self, column):
+        if column is None:
+            return np.full(self.size, np.nan)
+        try:
+            array = np.asarray(column)
+        except ValueError:
+            # Ragged column, e.g. one report with a list-valued field: convert value by value
+            array = None
+        if array is not None and array.ndim == 1 and array.dtype.kind in "fiu":
+            return array.astype(float)
+        return np.array([self._safe_float(value) for value in column], dtype=float)
+
+    @staticmethod
+    def _result(eligible, favourable, favourable_pct, attention_pct, threshold):
+        """
+        Combine the masks of one rule into (status, favourable %, attention %, threshold) columns.
+        Percentages are NaN where the scalar rule returns None.
+        """
+        status = np.where(eligible, np.where(favourable, "Favourable", "Attention Required"), "Not Eligible")
+        favourable_pct = np.where(eligible & favourable, favourable_pct, np.nan)
+        attention_pct = np.where(eligible & ~favourable, attention_pct, np.nan)
+        threshold = [label if ok else None for label, ok in zip(threshold, eligible.tolist())]
+        return status, favourable_pct, attention_pct, threshold
+
+    def evaluate_all(self):
+        """
+        Evaluate every rule over all reports with the compiled rule kernel.
+
+        Returns:
+            dict: criteria -> (status array, favourable % array, attention % array, threshold labels).
+            Reports with a zero threshold, where the scalar evaluator raises ZeroDivisionError,
+            are flagged in self.division_by_zero.
+        """
+        numeric, self.division_by_zero = compiled_rules.evaluate_columns(self.values, self.size)
+        results = {}
+        for rule in compiled_rules.rules:
+            if not rule.categorical:
+                results[rule.criteria] = self._result(*numeric[rule.criteria])
+                continue
+            # Missing cells of pandas / Arrow frames arrive as NaN rather than None
+            raw_values = [None if isinstance(value, float) and np.isnan(value) else value
+                          for value in self.columns.get(rule.criteria, [None] * self.size)]
+            eligible = np.array([value is not None for value in raw_values], dtype=bool)
+            attention = np.array([value is not None and rule.attention_contains in str(value).lower()
+                                  for value in raw_values], dtype=bool)
+            nan = np.full(self.size, np.nan)
+            results[rule.criteria] = self._result(eligible, ~attention, nan, nan, [rule.label] * self.size)
+        return results
+
+    def generate_results_tables(self):
+        """
+        Returns:
+            list: One results table per report, in input order, each identical to
+                  ConditionEvaluator(report).generate_results_table().
+        """
+        evaluations = self.evaluate_all()
+        tables = [[] for _ in range(self.size)]
+
+        for criteria, (status, favourable_pct, attention_pct, threshold) in evaluations.items():
+            raw_values = self.columns.get(criteria, [None] * self.size)
+            favourable_pct = [None if np.isnan(pct) else pct for pct in favourable_pct.tolist()]
+            attention_pct = [None if np.isnan(pct) else pct for pct in attention_pct.tolist()]
+            for i, table in enumerate(tables):
+                table.append({
+                    "Criteria": criteria,
+                    "Value": raw_values[i],
+                    "Favourable or Attention Required": str(status[i]),
+                    "Favourable %": favourable_pct[i] if favourable_pct[i] is not None else '',
+                    "Attention Required %": attention_pct[i] if attention_pct[i] is not None else '',
+                    "Threshold Value": threshold[i]
+                })
+
+        return tables
+
+
 # Example Usage
 if __name__ == "__main__":
     input_values = {"annulusDiameter":"23.2",
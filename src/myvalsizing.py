@@ -1,4 +1,40 @@
 import math
+import re
+from bisect import bisect_right
+import numpy as np
+
+MYVAL_SIZES = [20, 21.5, 23, 24.5, 26, 27.5, 29, 30.5, 32, 33.5, 35]
+MYVAL_AREAS = [
+    314.159, 363.05, 415.476, 471.435, 530.929, 593.957, 660.52,
+    730.617, 804.248, 881.413, 962.113
+]
+MYVAL_HEIGHTS = {
+    20: 17.35, 21.5: 18.35, 23: 17.85, 24.5: 18.75, 26: 18.85,
+    27.5: 19.25, 29: 20.35, 30.5: 20.9, 32: 21.14, 33.5: 21.5, 35: 21.85
+}
+ICD_DESCRIPTION = "ICD value is smaller than the annulus diameter so MyVal size is calculated based on the ICD value"
+
+
+def oversize_midpoint(oversize_value):
+    min_oversize, max_oversize = [float(x) for x in oversize_value.replace("%","").split("-")]
+    return (min_oversize + max_oversize) / 2
+
+
+def sizing_breakpoints(references, midpoint):
+    """
+    Annulus areas (or minimum ICDs) at which the MyVal size closest to the target oversizing
+    moves up one step: halfway between two consecutive sizes, scaled back by the target.
+    """
+    scale = 1 + midpoint / 100
+    return np.array([(low + high) / 2 / scale for low, high in zip(references, references[1:])])
+
+
+# Breakpoints of every oversizing band (tricuspid by calcium score, bicuspid), sized by area or by ICD
+SIZING_BREAKPOINTS = {
+    midpoint: {"area": sizing_breakpoints(MYVAL_AREAS, midpoint), "icd": sizing_breakpoints(MYVAL_SIZES, midpoint)}
+    for midpoint in (12.5, 7.5, 2.5)
+}
+
 
 class AorticStenosisValues:
     def __init__(self, input_data):
@@ -22,7 +58,6 @@ class AorticStenosisValues:
         # Validate anatomy type
         if "bicuspid" in self.anatomy:
             self.anatomy_type = "bicuspid"
-            import re
             match = re.search(r"type\s*([0-2][a-c]?)", self.anatomy, re.I)
             self.bicuspid_type = f"Type {match.group(1)}" if match else None
         elif "tricuspid" in self.anatomy:
@@ -71,117 +106,68 @@ class AorticStenosisValues:
 
         return oversize_value, severity_range
 
-    def calculate_annulus_table_and_myval_size(self, oversize_value):
-        myval_sizes = [20, 21.5, 23, 24.5, 26, 27.5, 29, 30.5, 32, 33.5, 35]
-        myval_areas = [
-            314.159, 363.05, 415.476, 471.435, 530.929, 593.957, 660.52,
-            730.617, 804.248, 881.413, 962.113
-        ]
-
-        oversizing_data = []
-        for size, area in zip(myval_sizes, myval_areas):
-            description = ""
-            if self.anatomy_type == "bicuspid":
-                valid_icds = [v for v in [self.icd4mm, self.icd6mm, self.icd8mm] if v > 0]
-                if not valid_icds:
-                    oversizing = (area - self.annulus_area) / self.annulus_area * 100
-                    oversizing_data.append({
-                        "size": size, "area": area,
-                        "oversizing": round(oversizing, 2),
-                        "diameter": size, "description": description
-                    })
-                    continue
-
-                min_icd = min(valid_icds)
-                if min_icd < self.annulus_diameter:
-                    oversizing = (size - min_icd) / min_icd * 100
-                    description = "ICD value is smaller than the annulus diameter so MyVal size is calculated based on the ICD value"
-                    oversizing_data.append({
-                        "size": size, "area": area,
-                        "oversizing": round(oversizing, 2),
-                        "diameter": size, "description": description
-                    })
-                else:
-                    oversizing = (area - self.annulus_area) / self.annulus_area * 100
-                    oversizing_data.append({
-                        "size": size, "area": area,
-                        "oversizing": round(oversizing, 2),
-                        "diameter": size, "description": description
-                    })
-            else:  # tricuspid
-                oversizing = (area - self.annulus_area) / self.annulus_area * 100
-                oversizing_data.append({
-                    "size": size, "area": area,
-                    "oversizing": round(oversizing, 2),
-                    "diameter": size, "description": description
-                })
-
-        # --- select closest Myval size based on midpoint ---
-        min_oversize, max_oversize = [float(x) for x in oversize_value.replace("%","").split("-")]
-        midpoint = (min_oversize + max_oversize) / 2
-
-        finite_data = [d for d in oversizing_data if math.isfinite(d["oversizing"])]
-
-        def pick_closest(data):
-            best = None
-            for curr in data:
-                if not best:
-                    best = curr
-                    continue
-                d_curr = abs(curr["oversizing"] - midpoint)
-                d_best = abs(best["oversizing"] - midpoint)
-                if d_curr != d_best:
-                    best = curr if d_curr < d_best else best
-                elif abs(curr["oversizing"]) != abs(best["oversizing"]):
-                    best = curr if abs(curr["oversizing"]) < abs(best["oversizing"]) else best
-                else:
-                    best = curr if curr["size"] < best["size"] else best
-            return best
-
-        closest = pick_closest(finite_data) if finite_data else None
-        if closest and closest["oversizing"] < -2.5:
-            positive_only = [d for d in finite_data if d["oversizing"] >= 0]
-            if positive_only:
-                closest = pick_closest(positive_only)
-
-        warning = None if finite_data else "Note: No valid MyVal size available."
-
-        # Filter table to 2 rows before and after closest
-        if closest:
-            index = finite_data.index(closest)
-            filtered_table = finite_data[max(0, index-2):index+3]
-            table = [{"THV_Diameters": d["diameter"], "Annular_Area_Under_Or_Over_Sizing": f"{d['oversizing']}%"} for d in filtered_table]
-        else:
-            table = []
-
+    def sizing_basis(self):
+        """
+        Return what the oversizing is computed against: ("area", annulus area) or, for bicuspid valves
+        with an ICD smaller than the annulus diameter, ("icd", minimum ICD), plus the table description.
+        """
+        if self.anatomy_type == "bicuspid":
+            valid_icds = [v for v in [self.icd4mm, self.icd6mm, self.icd8mm] if v > 0]
+            if valid_icds and min(valid_icds) < self.annulus_diameter:
+                return "icd", min(valid_icds), ICD_DESCRIPTION
+        return "area", self.annulus_area, ""
+
+    @staticmethod
+    def oversizing(kind, reference, index):
+        references = MYVAL_AREAS if kind == "area" else MYVAL_SIZES
+        return round((references[index] - reference) / reference * 100, 2)
+
+    @classmethod
+    def select_myval_index(cls, kind, reference, midpoint, candidate):
+        """
+        Pick the MyVal size whose oversizing is closest to the midpoint (ties: smaller absolute
+        oversizing, then smaller size). candidate is the breakpoint lookup result; its neighbours are
+        checked with the rounded oversizing so results match a full scan exactly. Undersizing below
+        -2.5% falls back to the smallest size that is not undersized.
+        """
+        window = range(max(0, candidate - 1), min(len(MYVAL_SIZES), candidate + 2))
+        best = min(window, key=lambda i: (abs(cls.oversizing(kind, reference, i) - midpoint),
+                                          abs(cls.oversizing(kind, reference, i)), MYVAL_SIZES[i]))
+        if cls.oversizing(kind, reference, best) < -2.5:
+            best = next((i for i in range(best, len(MYVAL_SIZES)) if cls.oversizing(kind, reference, i) >= 0), best)
+        return best
+
+    @classmethod
+    def myval_table(cls, kind, reference, index, description):
+        table = [{"THV_Diameters": MYVAL_SIZES[i], "Annular_Area_Under_Or_Over_Sizing": f"{cls.oversizing(kind, reference, i)}%"}
+                 for i in range(max(0, index - 2), min(len(MYVAL_SIZES), index + 3))]
         return {
             "table": table,
-            "closest_myval_size": closest["diameter"] if closest else "N/A",
-            "actual_oversize": closest["oversizing"] if closest else None,
-            "warning": warning,
-            "description": closest["description"] if closest else "N/A"
+            "closest_myval_size": MYVAL_SIZES[index],
+            "actual_oversize": cls.oversizing(kind, reference, index),
+            "warning": None,
+            "description": description
         }
 
+    def calculate_annulus_table_and_myval_size(self, oversize_value):
+        midpoint = oversize_midpoint(oversize_value)
+        kind, reference, description = self.sizing_basis()
+        candidate = bisect_right(SIZING_BREAKPOINTS[midpoint][kind], reference)
+        index = self.select_myval_index(kind, reference, midpoint, candidate)
+        return self.myval_table(kind, reference, index, description)
+
     def calculate_myval_height(self, myval_size):
-        heights = {
-            20: 17.35, 21.5: 18.35, 23: 17.85, 24.5: 18.75, 26: 18.85,
-            27.5: 19.25, 29: 20.35, 30.5: 20.9, 32: 21.14, 33.5: 21.5, 35: 21.85
-        }
         size = float(str(myval_size).split()[0])
-        return str(heights.get(size, "N/A"))
+        return str(MYVAL_HEIGHTS.get(size, "N/A"))
 
-    def calculate_all(self):
-        oversize_value, severity_range = self.calculate_oversize_value()
-        result = self.calculate_annulus_table_and_myval_size(oversize_value)
-        height = self.calculate_myval_height(result["closest_myval_size"])
-        print(result["description"])
+    def myval_result(self, oversize_value, severity_range, result):
         return {
             "annulus_diameter": self.annulus_diameter,
             "oversize_value": oversize_value,
             "CalciumSeverity": severity_range,
             "myval_size": result["closest_myval_size"],
             "actual_oversize": result["actual_oversize"],
-            "myval_height": height,
+            "myval_height": self.calculate_myval_height(result["closest_myval_size"]),
             "aortic_valve_anatomy": self.anatomy_type,
             "bicuspid_type": self.bicuspid_type,
             "annulus_table": result["table"],
@@ -189,7 +175,44 @@ class AorticStenosisValues:
             "description": result["description"],
         }
 
-# # Example usage
-# if __name__ == "__main__":
-#     aortic = AorticStenosisValues(500, "Tricuspid", 600, 0, 0, 0)
-#     print(aortic.calculate_all())
+    def calculate_all(self):
+        oversize_value, severity_range = self.calculate_oversize_value()
+        result = self.calculate_annulus_table_and_myval_size(oversize_value)
+        print(result["description"])
+        return self.myval_result(oversize_value, severity_range, result)
+
+    @classmethod
+    def calculate_all_batch(cls, reports):
+        """
+        calculate_all for many reports at once. Reports are grouped by oversizing band and the
+        breakpoint lookup runs once per group with np.searchsorted.
+        :param reports: List of report dictionaries.
+        :return: One calculate_all result per report, in order, or {"error": message} for reports
+                 that cannot be sized (e.g. annulus area outside the MyVal range).
+        """
+        results = [None] * len(reports)
+        groups = {}
+        for position, report in enumerate(reports):
+            try:
+                patient = cls(report)
+            except Exception as e:
+                results[position] = {"error": str(e)}
+                continue
+            oversize_value, severity_range = patient.calculate_oversize_value()
+            kind, reference, description = patient.sizing_basis()
+            groups.setdefault((oversize_midpoint(oversize_value), kind), []).append(
+                (position, patient, oversize_value, severity_range, reference, description))
+
+        for (midpoint, kind), members in groups.items():
+            references = np.array([member[4] for member in members])
+            candidates = np.searchsorted(SIZING_BREAKPOINTS[midpoint][kind], references, side="right")
+            for (position, patient, oversize_value, severity_range, reference, description), candidate in zip(members, candidates):
+                index = cls.select_myval_index(kind, reference, midpoint, int(candidate))
+                result = cls.myval_table(kind, reference, index, description)
+                results[position] = patient.myval_result(oversize_value, severity_range, result)
+        return results
+
+
+if __name__ == "__main__":
+    aortic = AorticStenosisValues({"annulusArea": 500, "aorticValveAnatomyType": "Tricuspid", "calciumScore": 600})
+    print(aortic.calculate_all())
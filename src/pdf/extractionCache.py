@@ -0,0 +1,32 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class ExtractionCache:
+    def __init__(self, max_entries=None):
+        """
+        Small thread safe LRU cache of finished extractions, keyed by extraction id.
+        It keeps what is needed to build the highlighted report later on demand.
+        :param max_entries: Number of extractions to keep, defaults to EXTRACTION_CACHE_SIZE or 256.
+        """
+        self.max_entries = max_entries or int(os.getenv("EXTRACTION_CACHE_SIZE", "256"))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, extraction_id, pdf_url, value_locations):
+        with self._lock:
+            self._entries[extraction_id] = {"pdf_url": pdf_url, "value_locations": value_locations}
+            self._entries.move_to_end(extraction_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, extraction_id):
+        """
+        Return the cached extraction or None when it was never stored or has been evicted.
+        """
+        with self._lock:
+            entry = self._entries.get(extraction_id)
+            if entry is not None:
+                self._entries.move_to_end(extraction_id)
+            return entry
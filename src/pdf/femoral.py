@@ -1,9 +1,9 @@
 import pdfplumber
 import re
 from pdf2image import convert_from_path, convert_from_bytes
-import requests
 from io import BytesIO
 import logging
+from .pdfFetcher import get_pdf_fetcher
 
 class femoralExtractor:
     def __init__(self, pdf_path=None, pdf_url=None):
@@ -30,14 +30,11 @@ class femoralExtractor:
     # ---------------------------
     def fetch_pdf_content(self):
         if self.pdf_url:
-            try:
-                response = requests.get(self.pdf_url)
-                if response.status_code == 200:
-                    return BytesIO(response.content)
-                else:
-                    raise ValueError("Failed to fetch PDF from URL")
-            except Exception as e:
-                raise
+            fetcher = get_pdf_fetcher()
+            if fetcher.cache is None:
+                return fetcher.fetch(self.pdf_url)
+            self.pdf_path = fetcher.fetch_path(self.pdf_url)
+            return self.pdf_path
 
         elif self.pdf_path:
             return self.pdf_path
@@ -49,11 +46,11 @@ class femoralExtractor:
     #  EXTRACT TEXT
     # ---------------------------
     def extract_text(self, pdf_content):
-        pdf_bytes = pdf_content.read() if self.pdf_url else None
+        pdf_bytes = pdf_content.read() if hasattr(pdf_content, "read") else None
         page_text = ""
 
         try:
-            with pdfplumber.open(BytesIO(pdf_bytes)) if self.pdf_url else pdfplumber.open(self.pdf_path) as pdf:
+            with pdfplumber.open(BytesIO(pdf_bytes)) if pdf_bytes is not None else pdfplumber.open(self.pdf_path) as pdf:
                 for i, page in enumerate(pdf.pages[2:], start=3):
                     extracted = page.extract_text() or ""
                     page_text += extracted + "\n"
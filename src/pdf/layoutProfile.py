@@ -0,0 +1,139 @@
+import json
+import os
+import tempfile
+import threading
+
+# Configured layouts: vendor -> section -> zero based pages most likely to hold the section.
+# The vendor is the Creator / Producer of the PDF (see LayoutProfiles.vendor). Extra vendors can be
+# configured in the JSON file at LAYOUT_PROFILES_PATH, which also keeps the learned pages.
+LAYOUT_PROFILES = {}
+LAYOUT_PROFILES_PATH = os.getenv("LAYOUT_PROFILES_PATH")
+
+
+def write_json(path, data):
+    """
+    Replace the JSON file at path atomically. The temporary file is unique to the writer, so
+    processes sharing the file never write into each other's copy.
+    """
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class LayoutProfiles:
+    def __init__(self, profiles=None, path=LAYOUT_PROFILES_PATH):
+        """
+        Per vendor hints of which pages hold which report sections (calcium panel, ICD table,
+        femoral overview ...). Section searches visit the likely pages first instead of scanning
+        the document from its start, and every page a section is found on is learned, so reports
+        with a known layout are usually resolved on the first page visited.
+        :param profiles: Configured vendor -> section -> pages, defaults to LAYOUT_PROFILES.
+        :param path: Optional JSON file to load profiles from and to keep learned pages in.
+        """
+        self.path = path
+        self.profiles = {vendor: {section: list(pages) for section, pages in sections.items()}
+                         for vendor, sections in (profiles if profiles is not None else LAYOUT_PROFILES).items()}
+        self.learned = {}  # (vendor, section) -> {page: times found}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read layout profiles from {self.path}: {e}")
+            return {}
+
+    def load(self):
+        data = self.read()
+        for vendor, sections in data.get("profiles", {}).items():
+            self.profiles.setdefault(vendor, {}).update(sections)
+        self.merge_learned(data)
+
+    def merge_learned(self, data):
+        """
+        Add the learned pages of a saved file, keeping the higher count of pages known to both.
+        """
+        for entry in data.get("learned", []):
+            pages = self.learned.setdefault((entry["vendor"], entry["section"]), {})
+            for page, count in entry["pages"].items():
+                pages[int(page)] = max(count, pages.get(int(page), 0))
+
+    def save(self):
+        """
+        Write the profiles and learned pages, merged with what other processes saved meanwhile.
+        """
+        if os.path.exists(self.path):
+            self.merge_learned(self.read())
+        data = {
+            "profiles": self.profiles,
+            "learned": [{"vendor": vendor, "section": section, "pages": pages}
+                        for (vendor, section), pages in self.learned.items()]
+        }
+        try:
+            write_json(self.path, data)
+        except OSError as e:
+            print(f"Could not save layout profiles to {self.path}: {e}")
+
+    @staticmethod
+    def vendor(doc):
+        """
+        Vendor key of a PyMuPDF document: the software that produced it.
+        """
+        metadata = doc.metadata or {}
+        return "/".join(metadata.get(key) or "" for key in ("creator", "producer")).strip("/") or "unknown"
+
+    def page_order(self, doc, section, first_page=0):
+        """
+        Return the pages to search for a section: the configured and learned pages of the document's
+        vendor first (most often found first), then every other page from first_page on, in order.
+        """
+        vendor = self.vendor(doc)
+        with self._lock:
+            learned = self.learned.get((vendor, section), {})
+            likely = list(self.profiles.get(vendor, {}).get(section, []))
+            likely += sorted(learned, key=lambda page: (-learned[page], page))
+        page_count = len(doc)
+        order = []
+        for page in likely:
+            if first_page <= page < page_count and page not in order:
+                order.append(page)
+        order += [page for page in range(first_page, page_count) if page not in order]
+        return order
+
+    def record(self, doc, section, page_num):
+        """
+        Learn that the section was found on page_num of the document. The file is only written
+        when a new page is learned, the counts of known pages are saved along with it.
+        """
+        key = (self.vendor(doc), section)
+        with self._lock:
+            pages = self.learned.setdefault(key, {})
+            new_page = page_num not in pages
+            pages[page_num] = pages.get(page_num, 0) + 1
+            if self.path and new_page:
+                self.save()
+
+
+_layout_profiles = None
+_layout_profiles_lock = threading.Lock()
+
+
+def get_layout_profiles():
+    """
+    Return the process wide LayoutProfiles.
+    """
+    global _layout_profiles
+    with _layout_profiles_lock:
+        if _layout_profiles is None:
+            _layout_profiles = LayoutProfiles()
+        return _layout_profiles
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "/cardiovision/data/pdf_cache")
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+PDF_CACHE_FRESH_SECONDS = float(os.getenv("PDF_CACHE_FRESH_SECONDS", "86400"))
+
+
+class PDFDiskCache:
+    def __init__(self, cache_dir=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES, fresh_seconds=PDF_CACHE_FRESH_SECONDS,
+                 min_age_seconds=300):
+        """
+        On-disk cache of downloaded reports, keyed by URL. Every entry is '<sha256 of url>.pdf' plus a
+        '.json' file with the ETag / Last-Modified of the download. Entries are served without any
+        network call for fresh_seconds after they were last validated; after that they are
+        revalidated with a conditional GET. The least recently used entries are evicted once the
+        cache holds more than max_bytes. The files can be shared by several processes.
+        :param cache_dir: Folder of the cache, on the data volume by default.
+        :param max_bytes: Total size of the cached reports.
+        :param fresh_seconds: How long an entry is used without revalidation.
+        :param min_age_seconds: Entries used more recently than this are never evicted, their path
+                                may just have been handed out.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self.min_age_seconds = min_age_seconds
+        os.makedirs(cache_dir, exist_ok=True)
+        if not os.access(cache_dir, os.W_OK):
+            raise PermissionError(f"{cache_dir} is not writable")
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def key(self, url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def path(self, url):
+        return os.path.join(self.cache_dir, self.key(url) + ".pdf")
+
+    def url_lock(self, url):
+        """
+        Lock of one URL, so concurrent stages of an extraction download the report only once.
+        """
+        with self._lock:
+            return self._locks.setdefault(self.key(url), threading.Lock())
+
+    def metadata(self, url):
+        try:
+            with open(os.path.join(self.cache_dir, self.key(url) + ".json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_metadata(self, url, metadata):
+        meta_path = os.path.join(self.cache_dir, self.key(url) + ".json")
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(metadata, f)
+        os.replace(temp_path, meta_path)
+
+    def lookup(self, url):
+        """
+        Return (path, metadata) of a cached report, or (None, None). The entry is marked as used.
+        """
+        path, metadata = self.path(url), self.metadata(url)
+        if metadata is None or not os.path.exists(path):
+            return None, None
+        os.utime(path)
+        return path, metadata
+
+    def is_fresh(self, metadata):
+        return time.time() - metadata.get("validated_at", 0) < self.fresh_seconds
+
+    def validators(self, metadata):
+        """
+        Conditional request headers of a cached entry.
+        """
+        headers = {}
+        if metadata.get("etag"):
+            headers["If-None-Match"] = metadata["etag"]
+        if metadata.get("last_modified"):
+            headers["If-Modified-Since"] = metadata["last_modified"]
+        return headers
+
+    def revalidated(self, url, metadata):
+        """
+        Record that the server answered 304 Not Modified.
+        """
+        self.write_metadata(url, dict(metadata, validated_at=time.time()))
+
+    def temp_file(self):
+        """
+        Named temporary file inside the cache folder, so store() can move it in atomically.
+        """
+        return tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False)
+
+    def store(self, url, temp_path, etag=None, last_modified=None):
+        """
+        Move a downloaded report into the cache and return its cached path.
+        """
+        path = self.path(url)
+        os.replace(temp_path, path)
+        self.write_metadata(url, {"url": url, "etag": etag, "last_modified": last_modified,
+                                  "size": os.path.getsize(path), "validated_at": time.time()})
+        self.evict()
+        return path
+
+    def evict(self):
+        """
+        Remove the least recently used reports until the cache fits in max_bytes.
+        """
+        entries = []
+        with os.scandir(self.cache_dir) as scan:
+            for entry in scan:
+                if entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for used_at, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if now - used_at < self.min_age_seconds:
+                continue
+            for file_path in (path, path[:-len(".pdf")] + ".json"):
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+def create_pdf_cache():
+    """
+    Return the PDFDiskCache on the data volume, or None when caching is disabled (PDF_CACHE_MAX_BYTES=0)
+    or the cache folder cannot be created, e.g. outside the container.
+    """
+    if PDF_CACHE_MAX_BYTES <= 0:
+        return None
+    try:
+        return PDFDiskCache()
+    except OSError as e:
+        print(f"PDF cache disabled, cannot use {PDF_CACHE_DIR}: {e}")
+        return None
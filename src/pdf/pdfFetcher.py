@@ -0,0 +1,245 @@
+import asyncio
+import os
+import tempfile
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .pdfCache import create_pdf_cache
+
+CONNECT_TIMEOUT = float(os.getenv("PDF_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("PDF_READ_TIMEOUT", "30"))
+MAX_PDF_BYTES = int(os.getenv("PDF_MAX_BYTES", str(100 * 1024 * 1024)))
+SPOOL_MAX_BYTES = int(os.getenv("PDF_SPOOL_MAX_BYTES", str(16 * 1024 * 1024)))
+FETCH_RETRIES = int(os.getenv("PDF_FETCH_RETRIES", "3"))
+CHUNK_SIZE = 256 * 1024
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+class PDFFetcher:
+    def __init__(self, retries=FETCH_RETRIES, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), max_bytes=MAX_PDF_BYTES,
+                 spool_max_bytes=SPOOL_MAX_BYTES, pool_size=32, cache=None):
+        """
+        Shared HTTP client for downloading reports. It keeps connections alive in a pool and
+        applies connect/read timeouts. Failed requests and 429/5xx answers are retried with
+        exponential backoff, and downloads are capped at max_bytes. Bodies are streamed in chunks.
+        A connection that drops mid-download resumes with a Range request when the server allows it.
+        :param retries: Retries per request (connection errors and 429/5xx responses).
+        :param timeout: (connect, read) timeout in seconds.
+        :param max_bytes: Largest report accepted.
+        :param spool_max_bytes: Reports up to this size stay in memory in fetch(), larger ones spill to disk.
+        :param pool_size: Keep-alive connections per host.
+        :param cache: Optional PDFDiskCache used by fetch_path().
+        """
+        self.retries = retries
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.spool_max_bytes = spool_max_bytes
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=retries, backoff_factor=0.5, status_forcelist=RETRY_STATUSES,
+                              allowed_methods=["GET", "HEAD"], raise_on_status=False)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def check_size(self, url, size):
+        if size > self.max_bytes:
+            raise ValueError(f"PDF at {url} is larger than the {self.max_bytes} bytes limit")
+
+    def download(self, url, file_obj, headers=None):
+        """
+        Stream url into file_obj.
+        :return: The final response (its body is already consumed), for its status code and headers.
+        """
+        received = 0
+        resumes = 0
+        while True:
+            request_headers = dict(headers or {})
+            if received:
+                request_headers["Range"] = f"bytes={received}-"
+            response = self.session.get(url, stream=True, timeout=self.timeout, headers=request_headers)
+            with response:
+                if response.status_code not in (200, 206) or (received and response.status_code != 206):
+                    if received:
+                        raise ValueError(f"Failed to resume PDF download from URL: {url}, Status Code: {response.status_code}")
+                    return response
+                length = response.headers.get("Content-Length")
+                self.check_size(url, received + int(length) if length is not None else received)
+                try:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        received += len(chunk)
+                        self.check_size(url, received)
+                        file_obj.write(chunk)
+                    return response
+                except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError):
+                    # The connection dropped mid-body, continue from the last byte when ranges are supported
+                    resumes += 1
+                    if not received or resumes > self.retries or response.headers.get("Accept-Ranges") != "bytes":
+                        raise
+
+    def fetch(self, url):
+        """
+        Download a report into a spooled temporary file: in memory up to spool_max_bytes,
+        on disk above. Returns the file positioned at its start.
+        """
+        file_obj = tempfile.SpooledTemporaryFile(max_size=self.spool_max_bytes)
+        response = self.download(url, file_obj)
+        if response.status_code not in (200, 206):
+            file_obj.close()
+            raise ValueError(f"Failed to fetch PDF from URL: {url}, Status Code: {response.status_code}")
+        file_obj.seek(0)
+        return file_obj
+
+    def fetch_to_file(self, url, suffix=".pdf"):
+        """
+        Download a report straight into a named temporary file and return its path, for
+        readers that need a path. The caller owns the file.
+        """
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        try:
+            with temp_file:
+                response = self.download(url, temp_file)
+            if response.status_code not in (200, 206):
+                raise ValueError(f"Failed to fetch PDF from URL: {url}, Status Code: {response.status_code}")
+        except Exception:
+            os.remove(temp_file.name)
+            raise
+        return temp_file.name
+
+    def fetch_path(self, url):
+        """
+        Return a local path of the report. With a cache this is the cached copy, downloaded when
+        missing and revalidated with a conditional GET once it is no longer fresh; it is shared and
+        must not be modified or removed. Without a cache it is a new temporary file (fetch_to_file).
+        """
+        if self.cache is None:
+            return self.fetch_to_file(url)
+
+        with self.cache.url_lock(url):
+            path, metadata = self.cache.lookup(url)
+            if path is not None and self.cache.is_fresh(metadata):
+                return path
+
+            temp_file = self.cache.temp_file()
+            try:
+                with temp_file:
+                    response = self.download(url, temp_file, headers=self.cache.validators(metadata) if path else None)
+                if path is not None and response.status_code == 304:
+                    os.remove(temp_file.name)
+                    self.cache.revalidated(url, metadata)
+                    return path
+                if response.status_code not in (200, 206):
+                    raise ValueError(f"Failed to fetch PDF from URL: {url}, Status Code: {response.status_code}")
+            except Exception:
+                if os.path.exists(temp_file.name):
+                    os.remove(temp_file.name)
+                raise
+            return self.cache.store(url, temp_file.name, etag=response.headers.get("ETag"),
+                                    last_modified=response.headers.get("Last-Modified"))
+
+    async def download_async(self, http, url, file_obj, headers=None):
+        """
+        asyncio counterpart of download with an httpx.AsyncClient: same size cap, retries of failed
+        requests and 429/5xx answers with exponential backoff, and Range resume of a dropped body.
+        :return: The final response (its body is already consumed).
+        """
+        import httpx
+        timeout = httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+        received = 0
+        attempts = 0
+        while True:
+            request_headers = dict(headers or {})
+            if received:
+                request_headers["Range"] = f"bytes={received}-"
+            accept_ranges = None
+            try:
+                async with http.stream("GET", url, headers=request_headers, timeout=timeout) as response:
+                    accept_ranges = response.headers.get("Accept-Ranges")
+                    if response.status_code in RETRY_STATUSES and attempts < self.retries:
+                        attempts += 1
+                        await asyncio.sleep(0.5 * 2 ** attempts)
+                        continue
+                    if response.status_code not in (200, 206) or (received and response.status_code != 206):
+                        if received:
+                            raise ValueError(f"Failed to resume PDF download from URL: {url}, Status Code: {response.status_code}")
+                        return response
+                    length = response.headers.get("Content-Length")
+                    self.check_size(url, received + int(length) if length is not None else received)
+                    # Without a chunk size the bytes are handed over as they arrive, none are held back when the body drops
+                    async for chunk in response.aiter_bytes():
+                        received += len(chunk)
+                        self.check_size(url, received)
+                        file_obj.write(chunk)
+                    return response
+            except httpx.TransportError:
+                # Before the body: retry the request. Mid-body: continue from the last byte when ranges are supported
+                attempts += 1
+                if attempts > self.retries or (received and accept_ranges != "bytes"):
+                    raise
+                if not received:
+                    await asyncio.sleep(0.5 * 2 ** attempts)
+
+    async def fetch_to_file_async(self, http, url, suffix=".pdf"):
+        """
+        asyncio counterpart of fetch_to_file, the partial file is removed when the download fails.
+        """
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        done = False
+        try:
+            with temp_file:
+                response = await self.download_async(http, url, temp_file)
+            if response.status_code not in (200, 206):
+                raise ValueError(f"Failed to fetch PDF from URL: {url}, Status Code: {response.status_code}")
+            done = True
+            return temp_file.name
+        finally:
+            if not done and os.path.exists(temp_file.name):
+                os.remove(temp_file.name)
+
+    async def fetch_path_async(self, http, url):
+        """
+        asyncio counterpart of fetch_path. Concurrent requests for a URL that is not cached yet may
+        each download it, the last one to finish replaces the cached copy atomically.
+        """
+        if self.cache is None:
+            return await self.fetch_to_file_async(http, url)
+
+        path, metadata = self.cache.lookup(url)
+        if path is not None and self.cache.is_fresh(metadata):
+            return path
+
+        temp_file = self.cache.temp_file()
+        try:
+            with temp_file:
+                response = await self.download_async(http, url, temp_file,
+                                                     headers=self.cache.validators(metadata) if path else None)
+            if path is not None and response.status_code == 304:
+                self.cache.revalidated(url, metadata)
+                return path
+            if response.status_code not in (200, 206):
+                raise ValueError(f"Failed to fetch PDF from URL: {url}, Status Code: {response.status_code}")
+            return self.cache.store(url, temp_file.name, etag=response.headers.get("ETag"),
+                                    last_modified=response.headers.get("Last-Modified"))
+        finally:
+            # Moved into the cache by store() when the download succeeded
+            if os.path.exists(temp_file.name):
+                os.remove(temp_file.name)
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_pdf_fetcher():
+    """
+    Return the process wide PDFFetcher, so every fetch shares the same connection pool and PDF cache.
+    """
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = PDFFetcher(cache=create_pdf_cache())
+        return _fetcher
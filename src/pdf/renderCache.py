@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import OrderedDict
+import cv2
+import fitz
+import numpy as np
+
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def pixmap_to_bgr(pix):
+    image = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width, pix.n)
+    return cv2.cvtColor(image, cv2.COLOR_RGBA2BGR if pix.n == 4 else cv2.COLOR_RGB2BGR)
+
+
+class RenderCache:
+    def __init__(self, max_bytes=RENDER_CACHE_MAX_BYTES):
+        """
+        Thread safe cache of rendered PDF pages as BGR arrays, keyed by (document, page, dpi, clip).
+        The document key is its file (path, size, inode), so all stages of an extraction share the
+        renders of the same downloaded or cached report. A clip of a page whose full render is cached
+        is sliced from it instead of rendering again. Pages are rendered without annotations.
+        The least recently used renders are evicted once they use more than max_bytes.
+        :param max_bytes: Memory budget of the cached pixels, 0 disables the cache.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def document_key(pdf_path):
+        stat = os.stat(pdf_path)
+        return os.path.realpath(pdf_path), stat.st_size, stat.st_ino
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        if image.nbytes > self.max_bytes:
+            return
+        image.flags.writeable = False  # shared between callers
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.nbytes
+            self._entries[key] = image
+            self.size += image.nbytes
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def render(self, pdf_path, page_num, dpi, clip=None, doc=None):
+        """
+        Return the page rendered at dpi, or only its clip, as a read only BGR array.
+        :param clip: (x0, y0, x1, y1) in pixels of the page rendered at dpi.
+        :param doc: Already open document of pdf_path, opened here when a render is needed otherwise.
+        """
+        document_key = self.document_key(pdf_path)
+        clip = tuple(int(c) for c in clip) if clip is not None else None
+        full_page = self.get((document_key, page_num, dpi, None))
+        if full_page is not None:
+            self.hits += 1
+            return full_page if clip is None else full_page[clip[1]:clip[3], clip[0]:clip[2]]
+        key = (document_key, page_num, dpi, clip)
+        image = self.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        own_doc = doc is None
+        if own_doc:
+            doc = fitz.open(pdf_path)
+        try:
+            rect = fitz.Rect(*[c * 72 / dpi for c in clip]) if clip is not None else None
+            image = pixmap_to_bgr(doc[page_num].get_pixmap(dpi=dpi, clip=rect, annots=False))
+        finally:
+            if own_doc:
+                doc.close()
+        self.put(key, image)
+        return image
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    """
+    Return the process wide RenderCache.
+    """
+    global _render_cache
+    with _render_cache_lock:
+        if _render_cache is None:
+            _render_cache = RenderCache()
+        return _render_cache
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+import cv2
+import fitz
+from .layoutProfile import write_json
+from .renderCache import get_render_cache
+
+# Optional JSON file keeping the learned plans across restarts
+TEMPLATE_PLANS_PATH = os.getenv("TEMPLATE_PLANS_PATH")
+TEMPLATE_PLANS_MAX = int(os.getenv("TEMPLATE_PLANS_MAX", "512"))
+
+
+def fingerprint(doc, pages=2):
+    """
+    Hash of the structural features of the first pages of a report: page sizes, fonts and the
+    position of the headings (spans in a font larger than the body text, without digits, so patient
+    values do not change the hash). Reports from the same template share the fingerprint, whatever
+    their page count.
+    """
+    features = []
+    for page in doc.pages(0, min(pages, len(doc))):
+        spans = [span for block in page.get_text("dict")["blocks"] for line in block.get("lines", [])
+                 for span in line["spans"] if span["text"].strip()]
+        sizes = sorted(span["size"] for span in spans)
+        body_size = sizes[len(sizes) // 2] if sizes else 0
+        features.append([round(page.rect.width), round(page.rect.height)])
+        features.append(sorted({span["font"] for span in spans}))
+        features.append([[round(span["bbox"][0] / 5), round(span["bbox"][1] / 5), span["text"].strip()]
+                         for span in spans
+                         if span["size"] > body_size + 0.5 and not any(c.isdigit() for c in span["text"])])
+    return hashlib.sha256(json.dumps(features).encode("utf-8")).hexdigest()
+
+
+def render_clip(pdf_path, page_num, crop_box, dpi, image_path):
+    """
+    Render only the crop region of a page, in pixels of the page rendered at dpi, to image_path.
+    The clip is sliced from the full page render when the RenderCache already holds it.
+    """
+    cv2.imwrite(image_path, get_render_cache().render(pdf_path, page_num, dpi, clip=crop_box))
+    return image_path
+
+
+class TemplatePlans:
+    def __init__(self, path=TEMPLATE_PLANS_PATH, max_fingerprints=1024, max_plans=TEMPLATE_PLANS_MAX):
+        """
+        Cached extraction plans of the corelab report templates. The first report of a template
+        is processed as usual (anchor search, full page render, HSV highlight detection) and the
+        result is learned as the plan of its section: page, anchor rect, crop box and DPI.
+        Later reports with the same fingerprint render the crop box directly, after checking the
+        anchor text is still at the planned place.
+        :param path: Optional JSON file to load and keep the plans in.
+        :param max_fingerprints: Reports whose fingerprint is remembered by (path, size, inode).
+        :param max_plans: Plans kept, in memory and in the file; the least recently used are dropped.
+        """
+        self.path = path
+        self.max_fingerprints = max_fingerprints
+        self.max_plans = max_plans
+        self.plans = OrderedDict()  # (fingerprint, section) -> plan, least recently used first
+        self.used_at = {}  # (fingerprint, section) -> time of the last match or learn
+        self.sections = Counter()  # section -> plans, so sections never learned skip the fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._fingerprints = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read template plans from {self.path}: {e}")
+            return []
+
+    def put(self, key, plan, used_at):
+        """
+        Add or replace a plan, caller holds the lock. evict() then restores the order and the cap.
+        """
+        if key not in self.plans:
+            self.sections[key[1]] += 1
+        self.plans[key] = plan
+        self.used_at[key] = max(used_at, self.used_at.get(key, 0))
+
+    def evict(self):
+        """
+        Order the plans by last use and drop the least recently used beyond max_plans, caller holds the lock.
+        """
+        self.plans = OrderedDict(sorted(self.plans.items(), key=lambda item: self.used_at[item[0]]))
+        while len(self.plans) > self.max_plans:
+            key, _ = self.plans.popitem(last=False)
+            del self.used_at[key]
+            self.sections[key[1]] -= 1
+            if not self.sections[key[1]]:
+                del self.sections[key[1]]
+
+    def merge(self, entries):
+        """
+        Add saved plans, the plans known here are kept and only their last use is updated.
+        """
+        for entry in entries:
+            key = (entry["fingerprint"], entry["section"])
+            if key in self.plans:
+                self.used_at[key] = max(self.used_at[key], entry.get("used_at", 0))
+            else:
+                self.put(key, entry["plan"], entry.get("used_at", 0))
+        self.evict()
+
+    def load(self):
+        self.merge(self.read())
+
+    def save(self):
+        """
+        Write the plans, least recently used first, merged with the ones other processes saved
+        meanwhile. Plans dropped beyond max_plans by any process stay dropped.
+        """
+        if os.path.exists(self.path):
+            self.merge(self.read())
+        entries = [{"fingerprint": key, "section": section, "plan": plan, "used_at": self.used_at[(key, section)]}
+                   for (key, section), plan in self.plans.items()]
+        try:
+            write_json(self.path, entries)
+        except OSError as e:
+            print(f"Could not save template plans to {self.path}: {e}")
+
+    def fingerprint(self, pdf_path):
+        """
+        Fingerprint of a report file, computed once per file.
+        """
+        stat = os.stat(pdf_path)
+        file_key = (pdf_path, stat.st_size, stat.st_ino)
+        with self._lock:
+            if file_key in self._fingerprints:
+                self._fingerprints.move_to_end(file_key)
+                return self._fingerprints[file_key]
+        doc = fitz.open(pdf_path)
+        try:
+            key = fingerprint(doc)
+        finally:
+            doc.close()
+        with self._lock:
+            self._fingerprints[file_key] = key
+            while len(self._fingerprints) > self.max_fingerprints:
+                self._fingerprints.popitem(last=False)
+        return key
+
+    def match(self, pdf_path, section, regex_list):
+        """
+        Return the plan of the section when the report matches a known template and one of the
+        compiled regexes still finds the anchor at the planned rect, None otherwise.
+        """
+        with self._lock:
+            has_plans = section in self.sections
+        if not has_plans:
+            return None
+        key = (self.fingerprint(pdf_path), section)
+        with self._lock:
+            plan = self.plans.get(key)
+        if plan is not None:
+            doc = fitz.open(pdf_path)
+            try:
+                anchor = fitz.Rect(plan["anchor"]) + (-2, -2, 2, 2)
+                text = doc[plan["page"]].get_text("text", clip=anchor) if plan["page"] < len(doc) else ""
+            finally:
+                doc.close()
+            if not any(regex.search(text) for regex in regex_list):
+                plan = None
+        with self._lock:
+            if plan is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if key in self.plans:
+                    self.plans.move_to_end(key)
+                    self.used_at[key] = time.time()
+        return plan
+
+    def learn(self, pdf_path, section, page_num, anchor, crop_box, dpi):
+        """
+        Remember how a section was found and cropped in this report's template. The file is only
+        written when the plan is new or changed.
+        :param anchor: Rect of the matched anchor text in PDF points.
+        :param crop_box: Crop region in pixels of the page rendered at dpi.
+        """
+        plan = {"page": page_num, "anchor": [float(c) for c in anchor], "crop_box": [int(c) for c in crop_box], "dpi": dpi}
+        key = (self.fingerprint(pdf_path), section)
+        with self._lock:
+            changed = self.plans.get(key) != plan
+            self.put(key, plan, time.time())
+            self.evict()
+            if self.path and changed:
+                self.save()
+
+    def stats(self):
+        return {"templates": len({key for key, _ in self.plans}), "plans": len(self.plans),
+                "max_plans": self.max_plans, "hits": self.hits, "misses": self.misses}
+
+
+_template_plans = None
+_template_plans_lock = threading.Lock()
+
+
+def get_template_plans():
+    """
+    Return the process wide TemplatePlans.
+    """
+    global _template_plans
+    with _template_plans_lock:
+        if _template_plans is None:
+            _template_plans = TemplatePlans()
+        return _template_plans
@@ -1,5 +1,4 @@
 import time
-import tempfile
 import os
 import numpy as np
 import pandas as pd
@@ -8,10 +7,12 @@ import re
 from pdf2image import convert_from_path, convert_from_bytes
 from PIL import ImageEnhance, ImageFilter
 import fitz
-import requests
 from io import BytesIO
 from ..upload.s3 import S3Uploader
 from ..image.calciumValue import desired_image
+from .wordIndex import PageWordIndex
+from .pdfFetcher import get_pdf_fetcher
+from .layoutProfile import get_layout_profiles
 import uuid
 
 class PDFExtractor:
@@ -20,6 +21,8 @@ class PDFExtractor:
         self.pdf_url = pdf_url
         self.unique_id = unique_id
         self.extracted_text = ""
+        self.pdf_bytes = None
+        self.value_locations = {}  # key -> [{"page": n, "rects": [[x0, y0, x1, y1], ...]}]
         self.values = {
             "url": None,
             "STJ Diameter": None,
@@ -37,6 +40,7 @@ class PDFExtractor:
             "SOV Non Diameter": None,
             "Aortic Valve Anatomy Type": None,
             "Calcium Score": None,
+            "Calcium Score Source": None,  # "text" when read from the PDF text layer, "ocr" when read from the image
         }
         self.patterns = {
             "STJ Diameter": r"STJ\s*Ø(?:\s*\d+(?:\.\d+)?%)?:\s*([\d.]+)\s*mm",
@@ -61,11 +65,12 @@ class PDFExtractor:
         Fetch the PDF content from a URL or local file.
         """
         if self.pdf_url:
-            response = requests.get(self.pdf_url)
-            if response.status_code == 200:
-                return BytesIO(response.content)
-            else:
-                raise ValueError(f"Failed to fetch PDF from URL: {self.pdf_url}")
+            fetcher = get_pdf_fetcher()
+            if fetcher.cache is None:
+                return fetcher.fetch(self.pdf_url)
+            # A cached report is read by path, PyMuPDF then loads its pages from disk on demand
+            self.pdf_path = fetcher.fetch_path(self.pdf_url)
+            return self.pdf_path
         elif self.pdf_path:
             return self.pdf_path
         else:
@@ -75,11 +80,12 @@ class PDFExtractor:
         """
         Extract text from the PDF using pdfplumber for faster processing.
         """
-        pdf_bytes = pdf_content.read() if self.pdf_url else None
+        pdf_bytes = pdf_content.read() if hasattr(pdf_content, "read") else None
+        self.pdf_bytes = pdf_bytes
         page_text = ""
 
         # Use pdfplumber to extract text directly from the PDF
-        with pdfplumber.open(BytesIO(pdf_bytes)) if self.pdf_url else pdfplumber.open(self.pdf_path) as pdf:
+        with pdfplumber.open(BytesIO(pdf_bytes)) if pdf_bytes is not None else pdfplumber.open(self.pdf_path) as pdf:
             for page in pdf.pages[:2]:  # Process the first 2 pages for optimization
                 page_text += page.extract_text() + "\n" or ""
                 print("before normalizing_____________",page_text)
@@ -88,22 +94,68 @@ class PDFExtractor:
         self.extracted_text = page_text  # Store the extracted text
         return page_text
 
-    def extract_calcium(self) :
+    def extract_calcium_from_text(self, page_start=2, window=600):
+        """
+        Read the calcium score from the PDF text layer just after the 'Aortic valve calcification'
+        heading, on the same pages the image based search scans.
+        :return: The score as a string, or None when the value is only rendered as an image.
+        """
+        anchor_pattern = re.compile(r'(?i)aortic valve calcification')
+        doc = self.open_document()
+        profiles = get_layout_profiles()
+        try:
+            for page_num in profiles.page_order(doc, "calcium", first_page=page_start):
+                text = doc[page_num].get_text("text").replace("\u00A0", " ")
+                anchor = anchor_pattern.search(text)
+                if anchor is None:
+                    continue
+                profiles.record(doc, "calcium", page_num)
+                section = text[anchor.end():anchor.end() + window]
+                for pattern in self.patterns["Calcium Score"]:
+                    match = re.search(pattern, section, re.IGNORECASE)
+                    if match:
+                        score = match.group(1).replace(",", "").strip(".")
+                        if score:
+                            return score
+                # Only the first calcification section is used, like the image based search
+                return None
+        finally:
+            doc.close()
+        return None
+
+    def extract_calcium(self, upload_image=True) :
+        """
+        Tiered calcium score extraction: the PDF text layer first, OCR on the cropped image only
+        when the number is not present as text. The tier that answered is kept in 'Calcium Score Source'.
+        """
+        calcium_score = self.extract_calcium_from_text()
+        if calcium_score is not None:
+            self.values["Calcium Score Source"] = "text"
+            if not upload_image:
+                return calcium_score
+
         regex_patterns = [r'(?i)aortic valve calcification']
         
         processor = desired_image(
             pdf_url=self.pdf_url,
+            pdf_path=self.pdf_path,
             regex_patterns=regex_patterns,
-            highlighted_pdf_path=f"{self.unique_id}_highlighted_pdf_calcium.pdf",
             output_image_path=f"{self.unique_id}_output_image_calcium.png",
-            temp_image_path=f"{self.unique_id}_temp_page_image_calcium.png"
+            temp_image_path=f"{self.unique_id}_temp_page_image_calcium.png",
+            run_ocr=calcium_score is None
         )
-        self.values['aorticValveCalcificationImage']=S3Uploader(s3_folder='TAVIVision/calcificaltion_image',file_path=f"{self.unique_id}_output_image_calcium.png", content_type = 'image/png').file_url
+        if upload_image:
+            self.values['aorticValveCalcificationImage']=S3Uploader(s3_folder='TAVIVision/calcificaltion_image',file_path=f"{self.unique_id}_output_image_calcium.png", content_type = 'image/png').file_url
         if os.path.exists(f"{self.unique_id}_output_image_calcium.png"):
             os.remove(f"{self.unique_id}_output_image_calcium.png")
         print("Cropped Image URL:", processor.cropped_output)
+        if calcium_score is not None:
+            return calcium_score
+
         print("Extracted Text:", processor.extracted_text)
         print("Calcium Score:", processor.calcium_score)
+        if processor.calcium_score is not None:
+            self.values["Calcium Score Source"] = "ocr"
         return processor.calcium_score
 
     
@@ -137,13 +189,16 @@ class PDFExtractor:
             return self.clean_extracted_text(first_line)
         return None
 
-    def extract_values(self, text):
+    def extract_values(self, text, calcium=True, upload_images=True):
         """
         Extract key-value pairs from the extracted text using patterns.
+        :param calcium: Run the (image based) calcium score extraction.
+        :param upload_images: Upload the calcium crop to S3.
         """
         for key, pattern in self.patterns.items():
             if key == "Calcium Score":
-               self.values[key]=self.extract_calcium()
+                if calcium:
+                    self.values[key]=self.extract_calcium(upload_image=upload_images)
             else : 
                 match = re.findall(pattern, text, re.IGNORECASE)
                 if match:
@@ -156,16 +211,49 @@ class PDFExtractor:
                         self.values[key] = match[0]
 
 
-    def highlight_values_in_pdf(self, output_pdf_path):
-
-        if self.pdf_url:
+    def open_document(self):
+        """
+        Open the already fetched PDF with PyMuPDF without downloading it again.
+        """
+        if self.pdf_bytes is None and self.pdf_path is None and self.pdf_url:
             pdf_content = self.fetch_pdf_content()
-            temp_pdf_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-            temp_pdf_file.write(pdf_content.read())
-            temp_pdf_file.close()
-            pdf_path = temp_pdf_file.name
-        else:
-            pdf_path = self.pdf_path
+            if hasattr(pdf_content, "read"):
+                self.pdf_bytes = pdf_content.read()
+        if self.pdf_bytes is not None:
+            return fitz.open(stream=self.pdf_bytes, filetype="pdf")
+        return fitz.open(self.pdf_path)
+
+    def locate_values(self, page_count=3):
+        """
+        Record the page and bounding boxes of every extracted value so the report can be
+        highlighted later without searching the pages again.
+        """
+        self.value_locations = {}
+        doc = self.open_document()
+        page_indexes = [PageWordIndex(doc[page_num], page_num) for page_num in range(min(page_count, len(doc)))]
+        doc.close()
+
+        for key, value in self.values.items():
+            pattern = self.patterns.get(key)
+            if key == "Calcium Score" or value is None or pattern is None:
+                continue
+            value_to_find = f"{value} mm" if "Diameter" in key or "Height" in key else str(value)
+
+            for page_index in page_indexes:
+                for match in page_index.finditer(pattern):
+                    # Only keep the matches that contain the extracted value
+                    if value_to_find in match.group():
+                        self.value_locations.setdefault(key, []).append({
+                            "page": page_index.page_num,
+                            "rects": page_index.rects(*match.span())
+                        })
+        return self.value_locations
+
+    def highlight_document(self):
+        """
+        Open the PDF and add a highlight annotation for every located value.
+        :return: The annotated PyMuPDF document, the caller is responsible for closing it.
+        """
         # Define a color map for each key
         color_map = {
             "Annulus Area": (0.73, 0.93, 0.96),                     # lighter 8eecf5
@@ -185,55 +273,55 @@ class PDFExtractor:
         }
 
         # Open the original PDF
-        doc = fitz.open(pdf_path)
-
-        # Iterate through each page
-        for page_num in range(3):
-            page = doc[page_num]
-            page_text = page.get_text("text")  # Extract the full text from the page
-            # print(page_text)
-            # For each key in pattern dictionary, search for the corresponding value or pattern
-            for key, value in self.values.items():
-                if key != "Calcium Score":
-                    if value is not None:
-                        # Prepare the value to find (adding ' mm' for Diameter and Height)
-                        value_to_find = f"{value} mm" if "Diameter" in key or "Height" in key else str(value)
-                        
-                        # Search for the value text in the page
-                        text_instances = page.search_for(value_to_find)
-                        
-                        # Check if the pattern exists for this key
-                        pattern = self.patterns.get(key)
-                        if pattern:
-                            # Search for pattern matches in the page text
-                            pattern_instances = list(re.finditer(pattern, page_text))
-
-                            # Iterate through all pattern matches and check if the value is part of the same line
-                            for match in pattern_instances:
-                                matched_text = match.group()
-
-                                # If the matched text contains the value (both pattern and value match), highlight the line
-                                if value_to_find in matched_text:
-                                    pattern_instances_coords = page.search_for(matched_text)
-
-                                    # Highlight the coordinates where both value and pattern match
-                                    for inst in pattern_instances_coords:
-                                        # Use the color from the color map
-                                        highlight_color = color_map.get(key, (1, 1, 1))  # Default to white if key not in map
-                                        highlight = page.add_highlight_annot(inst)
-                                        highlight.set_colors(stroke=highlight_color)
-                                        highlight.update()
+        doc = self.open_document()
+
+        # Add the annotations straight from the coordinates recorded during extraction
+        for key, locations in self.value_locations.items():
+            highlight_color = color_map.get(key, (1, 1, 1))  # Default to white if key not in map
+            for location in locations:
+                page = doc[location["page"]]
+                for rect in location["rects"]:
+                    highlight = page.add_highlight_annot(fitz.Rect(rect))
+                    highlight.set_colors(stroke=highlight_color)
+                    highlight.update()
+        return doc
+
+    def highlighted_pdf_bytes(self):
+        """
+        Serialise the highlighted report straight to memory, skipping garbage collection and
+        compression so only the new annotations cost anything.
+        """
+        doc = self.highlight_document()
+        pdf_bytes = doc.tobytes(garbage=0, deflate=False)
+        doc.close()
+        return pdf_bytes
+
+    def highlight_values_in_pdf(self, output_pdf_path):
+        doc = self.highlight_document()
         print(output_pdf_path)
-        # Save the output PDF with highlights
-        doc.save(output_pdf_path)
+        # Save the output PDF with highlights, appending only the annotations when writing over a local source
+        if self.pdf_bytes is None and not self.pdf_url and os.path.abspath(output_pdf_path) == os.path.abspath(self.pdf_path):
+            doc.saveIncr()
+        else:
+            doc.save(output_pdf_path, garbage=0, deflate=False)
         doc.close()
 
-    def run_extraction(self, output_pdf_path="highlighted_output.pdf"):
+    def upload_highlighted_pdf(self, output_pdf_path="highlighted_output.pdf"):
+        """
+        Build the highlighted report in memory and stream it to S3. Can be called lazily,
+        any time after the extraction, only when the highlighted report is actually needed.
+        """
+        self.values["url"] = S3Uploader(s3_folder='TAVIVision/highlighted_pdf_report/', file_path=output_pdf_path,
+                                        content_type='application/pdf', file_bytes=self.highlighted_pdf_bytes()).file_url
+        return self.values["url"]
+
+    def run_extraction(self, output_pdf_path="highlighted_output.pdf", highlight=True, calcium=True, upload_images=True):
         pdf_content = self.fetch_pdf_content()
         page_text = self.extract_text(pdf_content)
-        self.extract_values(page_text)
-        self.highlight_values_in_pdf(output_pdf_path)
-        self.values["url"] = S3Uploader(s3_folder='TAVIVision/highlighted_pdf_report/',file_path = output_pdf_path, content_type='application/pdf').file_url
+        self.extract_values(page_text, calcium=calcium, upload_images=upload_images)
+        self.locate_values()
+        if highlight:
+            self.upload_highlighted_pdf(output_pdf_path)
         return self.values
     
 
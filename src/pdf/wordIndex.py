@@ -0,0 +1,47 @@
+import re
+
+
+class PageWordIndex:
+    def __init__(self, page, page_num):
+        """
+        Builds a searchable text view of a page from PyMuPDF words and remembers which
+        word every character came from, so regex matches map straight back to coordinates.
+        :param page: PyMuPDF page object.
+        :param page_num: Zero based page number of the page.
+        """
+        self.page_num = page_num
+        self.words = page.get_text("words")
+        self.char_words = []  # word index of every character in self.text, -1 for separators
+        parts = []
+        previous_line = None
+
+        for index, word in enumerate(self.words):
+            line = (word[5], word[6])  # (block_no, line_no)
+            if parts:
+                parts.append(" " if line == previous_line else "\n")
+                self.char_words.append(-1)
+            parts.append(word[4])
+            self.char_words.extend([index] * len(word[4]))
+            previous_line = line
+
+        self.text = "".join(parts)
+
+    def finditer(self, pattern, flags=0):
+        """
+        Run a regex over the indexed page text.
+        """
+        return re.finditer(pattern, self.text, flags)
+
+    def rects(self, start, end):
+        """
+        Return the bounding boxes covering text[start:end], one [x0, y0, x1, y1] per text line.
+        """
+        line_rects = {}
+        for index in sorted({i for i in self.char_words[start:end] if i >= 0}):
+            x0, y0, x1, y1, _, block_no, line_no, _ = self.words[index]
+            rect = line_rects.get((block_no, line_no))
+            if rect is None:
+                line_rects[(block_no, line_no)] = [x0, y0, x1, y1]
+            else:
+                line_rects[(block_no, line_no)] = [min(rect[0], x0), min(rect[1], y0), max(rect[2], x1), max(rect[3], y1)]
+        return list(line_rects.values())
@@ -0,0 +1,138 @@
+import copy
+import os
+import threading
+from collections import OrderedDict
+from src.criteriaRules import compiled_rules
+from src.logics import ConditionEvaluator, BatchConditionEvaluator
+from src.myvalsizing import AorticStenosisValues
+
+
+class LRUMemo:
+    def __init__(self, max_entries):
+        """
+        Thread safe least recently used mapping.
+        :param max_entries: Number of entries to keep.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except (KeyError, TypeError):  # TypeError: unhashable raw values in the key
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            try:
+                self._entries[key] = value
+            except TypeError:
+                return
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class ReportScoringCache:
+    def __init__(self, max_entries=None):
+        """
+        Memoises fetch_report scoring. The front end scores the same report again after every field
+        edit, so results are kept per report and per rule:
+          - whole reports, keyed by the float normalised fields the rules and the sizing read
+            ("23.2", 23.2 and "23.20" are the same report),
+          - single rules, keyed by the values of the fields they depend on, so editing vtcL only
+            re-evaluates the vtcL rule and every other rule is served from the cache.
+        :param max_entries: Reports to keep, defaults to REPORT_CACHE_SIZE or 1024. The rule cache
+                            keeps one entry per rule for every cached report.
+        """
+        self.max_entries = max_entries or int(os.getenv("REPORT_CACHE_SIZE", "1024"))
+        self.evaluations = LRUMemo(self.max_entries)
+        self.rule_results = LRUMemo(self.max_entries * len(compiled_rules.rules))
+        self.myval_sizes = LRUMemo(self.max_entries)
+
+    @staticmethod
+    def rule_key(rule, evaluator):
+        if rule.categorical:
+            return rule.criteria, evaluator.input_data.get(rule.criteria)
+        return (rule.criteria,) + tuple(evaluator.values.get(field) for field in rule.dependencies)
+
+    def evaluate_all(self, evaluator):
+        """
+        Cached ConditionEvaluator.evaluate_all. Errors (e.g. ZeroDivisionError) are raised and not cached.
+        """
+        report_key = tuple(evaluator.values.get(field) for field in compiled_rules.fields) + tuple(
+            evaluator.input_data.get(rule.criteria) for rule in compiled_rules.rules if rule.categorical)
+        evaluations = self.evaluations.get(report_key)
+        if evaluations is not None:
+            return evaluations
+
+        evaluations = {}
+        for rule in compiled_rules.rules:
+            key = self.rule_key(rule, evaluator)
+            result = self.rule_results.get(key)
+            if result is None:
+                result = rule.evaluate(evaluator.values, evaluator.input_data)
+                self.rule_results.put(key, result)
+            evaluations[rule.criteria] = result
+        self.evaluations.put(report_key, evaluations)
+        return evaluations
+
+    def results_table(self, report):
+        """
+        Same rows as ConditionEvaluator(report).generate_results_table(); "Value" stays the raw input.
+        """
+        evaluator = ConditionEvaluator(report)
+        return evaluator.generate_results_table(self.evaluate_all(evaluator))
+
+    def myval_size(self, report):
+        """
+        Cached AorticStenosisValues(report).calculate_all(). Invalid reports raise as before.
+        """
+        aortic = AorticStenosisValues(report)
+        key = (aortic.annulus_area, aortic.anatomy, aortic.calcium_score, aortic.icd4mm, aortic.icd6mm, aortic.icd8mm)
+        result = self.myval_sizes.get(key)
+        if result is None:
+            result = aortic.calculate_all()
+            self.myval_sizes.put(key, result)
+        return copy.deepcopy(result)
+
+    def stats(self):
+        return {name: {"hits": memo.hits, "misses": memo.misses}
+                for name, memo in [("reports", self.evaluations), ("rules", self.rule_results), ("myval", self.myval_sizes)]}
+
+
+def score_report_batch(reports):
+    """
+    Score many reports at once with the vectorised evaluators, one entry per report in the same order:
+    {"status": "success", "results": ..., "myvalsize": ...} or {"status": "error", "error": ...}.
+    Errors are isolated per report, e.g. an annulus area MyVal does not cover only fails that report.
+    """
+    valid_reports = [report for report in reports if isinstance(report, dict)]
+    evaluator = BatchConditionEvaluator(valid_reports)
+    tables = iter(evaluator.generate_results_tables())
+    division_by_zero = iter(evaluator.division_by_zero.tolist())
+    myval_sizes = iter(AorticStenosisValues.calculate_all_batch(valid_reports))
+
+    results = []
+    for report in reports:
+        if not isinstance(report, dict):
+            results.append({"status": "error", "error": "Report must be a JSON object."})
+            continue
+        results_table = next(tables)
+        aortic = next(myval_sizes)
+        if next(division_by_zero):
+            results.append({"status": "error", "error": "float division by zero"})
+        elif "error" in aortic:
+            results.append({"status": "error", "error": aortic["error"]})
+        else:
+            results.append({"status": "success", "results": results_table, "myvalsize": aortic})
+    return results
+
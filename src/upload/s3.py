@@ -1,5 +1,7 @@
 import boto3
 import os
+import threading
+from io import BytesIO
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError
 from dotenv import load_dotenv
 
@@ -25,24 +27,37 @@ s3_client = boto3.client(
     region_name=AWS_REGION
 )
 
+# Uploads recorded instead of run by call_deferring_uploads, per thread
+_deferred = threading.local()
+
+
 class S3Uploader:
-    def __init__(self, s3_folder,file_path,  content_type='application/octet-stream'):
+    def __init__(self, s3_folder,file_path,  content_type='application/octet-stream', file_bytes=None):
         """
         Initializes the S3Uploader with the necessary credentials and uploads the file.
+        When file_bytes is given it is uploaded from memory and file_path only names the object.
         """
-        self.file_url = self.upload_file(file_path, s3_folder, content_type)
+        self.file_url = self.upload_file(file_path, s3_folder, content_type, file_bytes)
 
-    def upload_file(self, file_path, s3_folder, content_type):
-        """Uploads a file to AWS S3 and returns the file URL."""
+    def upload_file(self, file_path, s3_folder, content_type, file_bytes=None):
+        """Uploads a file (or an in-memory buffer) to AWS S3 and returns the file URL."""
         object_name = os.path.join(s3_folder, os.path.basename(file_path))
+        if getattr(_deferred, "uploads", None) is not None:
+            return self.defer_upload(file_path, s3_folder, content_type, file_bytes, object_name)
         try:
-            s3_client.upload_file(
-                file_path, S3_BUCKET_NAME, object_name,
-                ExtraArgs={'ContentType': content_type}
-            )
+            if file_bytes is not None:
+                s3_client.upload_fileobj(
+                    BytesIO(file_bytes), S3_BUCKET_NAME, object_name,
+                    ExtraArgs={'ContentType': content_type}
+                )
+            else:
+                s3_client.upload_file(
+                    file_path, S3_BUCKET_NAME, object_name,
+                    ExtraArgs={'ContentType': content_type}
+                )
             file_url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{object_name}"
             print(f"File uploaded successfully to S3: {file_url}")
-            if os.path.exists(file_path):
+            if file_bytes is None and os.path.exists(file_path):
                 print(file_path)
                 os.remove(file_path)
             return file_url
@@ -59,6 +74,64 @@ class S3Uploader:
             print(f"Error uploading file to S3: {e}")
             return None
 
+    @staticmethod
+    def defer_upload(file_path, s3_folder, content_type, file_bytes, object_name):
+        """
+        Record the upload for call_deferring_uploads and return the URL the object will have.
+        The file is read (and removed, as after an upload) now, callers may delete it on return.
+        """
+        if file_bytes is None:
+            try:
+                with open(file_path, "rb") as f:
+                    file_bytes = f.read()
+            except FileNotFoundError:
+                print("The file was not found.")
+                return None
+            os.remove(file_path)
+        file_url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{object_name}"
+        _deferred.uploads.append({"s3_folder": s3_folder, "file_path": file_path, "content_type": content_type,
+                                  "file_bytes": file_bytes, "file_url": file_url})
+        return file_url
+
+
+def call_deferring_uploads(function, *args):
+    """
+    Run function(*args) with its S3 uploads recorded instead of sent, e.g. in a CPU process pool
+    whose workers should not wait on the network. Run the uploads with run_deferred_upload.
+    :return: (result, uploads); the result already holds the URLs the uploads will have.
+    """
+    _deferred.uploads = []
+    try:
+        return function(*args), _deferred.uploads
+    finally:
+        _deferred.uploads = None
+
+
+def run_deferred_upload(upload):
+    """
+    Send one upload recorded by call_deferring_uploads.
+    :return: The file URL, None when the upload failed.
+    """
+    return S3Uploader(upload["s3_folder"], upload["file_path"], upload["content_type"],
+                      file_bytes=upload["file_bytes"]).file_url
+
+
+def replace_urls(value, urls):
+    """
+    Return value (nested dicts / lists) with the strings found in urls replaced, e.g. the URLs of
+    failed deferred uploads by None.
+    """
+    if isinstance(value, dict):
+        return {key: replace_urls(item, urls) for key, item in value.items()}
+    if isinstance(value, list):
+        return [replace_urls(item, urls) for item in value]
+    if isinstance(value, tuple):
+        return tuple(replace_urls(item, urls) for item in value)
+    if isinstance(value, str):
+        return urls.get(value, value)
+    return value
+
+
 # Example usage
 # a = S3Uploader(s3_folder= 'TAVIVision/calcificaltion_image',file_path="/mnt/nvme_disk2/User_data/nb57077k/cardiovision/phase1/output_highlighted_t.pdf", content_type='image/png')
 # print(a.file_url)
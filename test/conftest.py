@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Scripts run by hand against a live server or a sample corpus, not tests
+collect_ignore = ["stress_test.py"]
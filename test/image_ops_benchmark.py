@@ -0,0 +1,122 @@
+"""
+Micro-benchmark of the highlight and edge bounding boxes against the contour based code they
+replaced, on synthetic report pages rendered at 200 dpi (highlighted anchors, text, boxes and plots).
+The highlight box is found by CropEngine.highlight_bbox, which renders and masks only a window
+around the anchor, instead of masking the whole highlighted page. Prints the mean time per call of
+both versions, the number of pages where the boxes differ and, for the highlight, how many boxes
+are not on the anchor.
+
+    PYTHONPATH=. python test/image_ops_benchmark.py --pages 50
+"""
+import argparse
+import time
+
+import cv2
+import fitz
+import numpy as np
+
+from src.image.cropEngine import CropEngine
+from src.image.imageOps import largest_edge_bbox
+
+
+def contour_highlight_bbox(image):
+    # detect_highlight_and_crop before imageOps
+    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv_image, np.array([35, 50, 50]), np.array([85, 255, 255]))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    return cv2.boundingRect(max(contours, key=cv2.contourArea))
+
+
+def contour_edge_bbox(image):
+    # ImageProcessor.crop_center_contour before imageOps
+    edges = cv2.Canny(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), 50, 150)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    largest_contour, max_area = None, float("-inf")
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w * h > max_area:
+            max_area, largest_contour = w * h, contour
+    return cv2.boundingRect(largest_contour)
+
+
+def synthetic_page(rng, dpi=200):
+    """
+    A highlighted report page: its document, rendered image and anchor rects, and the crop below the anchor.
+    """
+    doc = fitz.open()
+    page = doc.new_page()
+    for _ in range(40):
+        page.insert_text((rng.uniform(30, 400), rng.uniform(30, 800)), f"Value {rng.uniform(0, 100):.1f} mm",
+                         fontsize=rng.uniform(8, 12))
+    for _ in range(3):
+        x, y = rng.uniform(40, 350), rng.uniform(300, 700)
+        page.draw_rect(fitz.Rect(x, y, x + rng.uniform(60, 200), y + rng.uniform(40, 120)),
+                       color=(0, 0, 0), fill=tuple(rng.uniform(0, 1, 3)))
+    anchor_y = rng.uniform(80, 250)
+    page.insert_text((60, anchor_y), "ICD @4mm", fontsize=11)
+    rects = page.search_for("ICD @4mm")
+    for rect in rects:
+        highlight = page.add_highlight_annot(rect)
+        highlight.set_colors(stroke=(0, 1, 0))
+        highlight.update()
+    pix = page.get_pixmap(dpi=dpi)
+    image = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width, pix.n)[:, :, ::-1].copy()
+    x, y, w, h = contour_highlight_bbox(image)
+    return (doc, image, rects), image[y + h:y + h + 800, max(0, x - 400):x + w + 400].copy()
+
+
+def page_highlight_bbox(page):
+    doc, image, rects = page
+    return contour_highlight_bbox(image)
+
+
+def window_highlight_bbox(page, dpi=200):
+    doc, image, rects = page
+    return CropEngine(None, dpi=dpi).highlight_bbox(doc[0], image.shape, rects)
+
+
+def on_anchor(page, bbox, dpi=200):
+    """
+    Whether a highlight bbox is the anchor's highlight, not another green region of the page.
+    """
+    doc, image, rects = page
+    scale = dpi / 72
+    x, y, w, h = bbox
+    centre_x, centre_y = (rects[0].x0 + rects[0].x1) / 2 * scale, (rects[0].y0 + rects[0].y1) / 2 * scale
+    return x <= centre_x <= x + w and y <= centre_y <= y + h
+
+
+def timed(function, images, repeat):
+    results = [function(image) for image in images]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for image in images:
+            function(image)
+    return results, (time.perf_counter() - start) * 1000 / (repeat * len(images))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pages, crops = zip(*(synthetic_page(rng) for _ in range(args.pages)))
+
+    for name, images, before, after in [("highlight_bbox", pages, page_highlight_bbox, window_highlight_bbox),
+                                        ("largest_edge_bbox", crops, contour_edge_bbox, largest_edge_bbox)]:
+        expected, before_ms = timed(before, images, args.repeat)
+        found, after_ms = timed(after, images, args.repeat)
+        mismatches = sum(tuple(a) != tuple(b) for a, b in zip(expected, found))
+        result = {"function": name, "images": len(images), "contours_ms": round(before_ms, 3),
+                  "new_ms": round(after_ms, 3), "speedup": round(before_ms / after_ms, 2), "mismatches": mismatches}
+        if images is pages:
+            # The whole page mask can pick a green filled box instead of the anchor highlight
+            result["contours_off_anchor"] = sum(not on_anchor(page, bbox) for page, bbox in zip(pages, expected))
+            result["new_off_anchor"] = sum(not on_anchor(page, bbox) for page, bbox in zip(pages, found))
+        print(result)
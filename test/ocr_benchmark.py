@@ -0,0 +1,144 @@
+"""
+Accuracy / latency benchmark of the OCR backends on a corpus of cropped report images.
+
+The corpus folder holds the crops (as written by the ICD / calcium croppers) and a labels.json
+mapping each file name to the expected value, e.g. {"report1_icd4mm.png": "24.3"}.
+
+    PYTHONPATH=. python test/ocr_benchmark.py /path/to/corpus --target icd --backends easyocr template
+
+--synthetic N first writes N synthetic crops (values drawn like the reports, rendered at 200 dpi)
+into corpus_dir. --reference BACKEND also reports how often every backend reads the same value as
+the reference, the equivalence check of the ONNX / int8 backends against 'easyocr':
+
+    PYTHONPATH=. python test/ocr_benchmark.py /tmp/corpus --synthetic 200 \
+        --backends easyocr easyocr-onnx easyocr-onnx-int8 --reference easyocr
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+import fitz
+import numpy as np
+
+from src.image.calciumValue import desired_image
+from src.image.ocrBackend import OCR_BACKENDS, get_ocr_backend
+from src.image.valueFromImage import YellowShadeOCR
+
+
+def read_icd(backend, image_path, work_dir):
+    return YellowShadeOCR(backend=backend).run(image_path)
+
+
+def read_calcium(backend, image_path, work_dir):
+    # Same preprocessing as production; numeral only backends are refused for this target
+    text = desired_image.read_text(image_path, get_ocr_backend(backend, words=True))
+    return desired_image.parse_calcium_score(text)
+
+
+TARGETS = {"icd": read_icd, "calcium": read_calcium}
+
+
+def synthetic_corpus(corpus_dir, target, count, seed=0):
+    """
+    Write count synthetic crops of the target and their labels.json: ICD values on a yellow fill,
+    calcium totals as 'Total: <score>' lines among other table rows.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(corpus_dir, exist_ok=True)
+    labels = {}
+    for index in range(count):
+        doc = fitz.open()
+        page = doc.new_page(width=264, height=288)  # 734 x 800 pixels at 200 dpi, like the ICD crops
+        fontsize = rng.uniform(9, 14)
+        if target == "icd":
+            value = f"{rng.uniform(15, 35):.1f}"
+            x, y = rng.uniform(20, 150), rng.uniform(30, 200)
+            page.draw_rect(fitz.Rect(x - 4, y - fontsize, x + fontsize * 2.6, y + 4), color=None,
+                           fill=(1, rng.uniform(0.8, 1), rng.uniform(0, 0.3)))
+            page.insert_text((x, y), value, fontsize=fontsize)
+        else:
+            value = str(int(rng.integers(0, 4000)))
+            for row, label in enumerate(["LM", "LAD", "Total"]):
+                row_value = value if label == "Total" else str(int(rng.integers(0, 999)))
+                page.insert_text((30, 60 + row * fontsize * 2), f"{label}: {row_value}", fontsize=fontsize)
+        file_name = f"synthetic_{target}_{index}.png"
+        page.get_pixmap(dpi=200).save(os.path.join(corpus_dir, file_name))
+        doc.close()
+        labels[file_name] = value
+    with open(os.path.join(corpus_dir, "labels.json"), "w") as f:
+        json.dump(labels, f)
+
+
+def same_value(found, expected):
+    try:
+        return abs(float(found) - float(expected)) < 1e-6
+    except (TypeError, ValueError):
+        return str(found) == str(expected)
+
+
+def benchmark(corpus_dir, target, backend):
+    with open(os.path.join(corpus_dir, "labels.json")) as f:
+        labels = json.load(f)
+
+    read_value = TARGETS[target]
+    work_dir = tempfile.mkdtemp()
+    latencies, correct, readings = [], 0, {}
+    try:
+        # Warm up so model loading is not counted as latency
+        read_value(backend, os.path.join(corpus_dir, next(iter(labels))), work_dir)
+        for file_name, expected in labels.items():
+            start = time.perf_counter()
+            found = read_value(backend, os.path.join(corpus_dir, file_name), work_dir)
+            latencies.append(time.perf_counter() - start)
+            correct += same_value(found, expected)
+            readings[file_name] = found
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "backend": backend,
+        "target": target,
+        "samples": len(labels),
+        "accuracy": round(correct / len(labels), 4),
+        "mean_ms": round(float(latencies.mean()), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        # Peak resident memory of the process so far (Linux: KiB), backends run earlier are included
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }, readings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus_dir")
+    parser.add_argument("--target", choices=list(TARGETS), default="icd")
+    parser.add_argument("--backends", nargs="+", default=["easyocr", "template"])
+    parser.add_argument("--synthetic", type=int, default=0, help="Write this many synthetic crops to corpus_dir first")
+    parser.add_argument("--reference", help="Backend whose readings the others are compared with")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        synthetic_corpus(args.corpus_dir, args.target, args.synthetic)
+    backends = args.backends
+    if args.target == "calcium":
+        for backend in backends:
+            if backend in OCR_BACKENDS and not OCR_BACKENDS[backend].reads_words:
+                print(f"Skipping '{backend}': it only reads numerals, the calcium 'Total' label cannot be found.")
+        backends = [backend for backend in backends if backend not in OCR_BACKENDS or OCR_BACKENDS[backend].reads_words]
+    if args.reference and args.reference in backends:
+        backends = [args.reference] + [backend for backend in backends if backend != args.reference]
+
+    reference_readings = None
+    for backend in backends:
+        result, readings = benchmark(args.corpus_dir, args.target, backend)
+        if args.reference:
+            if backend == args.reference:
+                reference_readings = readings
+            elif reference_readings is not None:
+                result["agreement"] = round(sum(same_value(readings[name], found) for name, found
+                                                in reference_readings.items()) / len(readings), 4)
+        print(result)
@@ -0,0 +1,110 @@
+import threading
+import time
+import pytest
+from src.admissionControl import AdmissionController, AdmissionRejected
+
+
+def start_acquire(controller, task):
+    """
+    Call controller.acquire(task) in a thread, its permit or exception is stored in the returned
+    outcome dict once the thread is joined, so the test asserts in the main thread.
+    """
+    outcome = {}
+
+    def acquire():
+        try:
+            outcome["permit"] = controller.acquire(task)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    return thread, outcome
+
+
+def test_heavy_task_is_not_starved_by_light_traffic():
+    controller = AdmissionController(capacity=4, reserve=1, max_queue=2, queue_timeout=2)
+    stop = threading.Event()
+    errors = []
+
+    def score_reports():
+        while not stop.is_set():
+            try:
+                permit = controller.acquire("fetch_report")
+            except AdmissionRejected:
+                continue
+            except Exception as e:
+                errors.append(e)
+                return
+            time.sleep(0.01)
+            permit.release()
+
+    threads = [threading.Thread(target=score_reports) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    try:
+        time.sleep(0.05)
+        permit = controller.acquire("extract_pdf")
+        assert controller.heavy_in_use == 3
+        # The reserve stays usable for report scoring while the extraction runs
+        light = controller.acquire("fetch_report")
+        light.release()
+        permit.release()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert errors == []
+    assert controller.in_use == 0
+
+
+def test_light_task_is_not_starved_by_heavy_tasks():
+    controller = AdmissionController(capacity=4, reserve=1, max_queue=2, queue_timeout=0.2)
+    running = controller.acquire("extract_pdf")
+    waiting, outcome = start_acquire(controller, "extract_pdf")
+    time.sleep(0.05)
+    assert controller.stats()["queued"]["heavy"] == 1
+
+    started = time.time()
+    light = controller.acquire("fetch_report")
+    assert time.time() - started < 0.1
+    light.release()
+    waiting.join()
+    assert isinstance(outcome.get("error"), AdmissionRejected) and outcome["error"].status == 503
+    running.release()
+    assert controller.in_use == 0
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    controller = AdmissionController(capacity=4, reserve=1, max_queue=0, queue_timeout=1)
+    permit = controller.acquire("extract_pdf")
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire("highlight_pdf")
+    assert rejected.value.status == 429
+    assert rejected.value.retry_after >= 1
+    permit.release()
+
+
+def test_held_back_light_task_runs_once_heavy_waiter_gives_up():
+    controller = AdmissionController(capacity=4, reserve=1, max_queue=2, queue_timeout=0.2)
+    light = controller.acquire("fetch_report")
+    heavy = controller.acquire("highlight_pdf")
+    waiting, outcome = start_acquire(controller, "extract_pdf")
+    time.sleep(0.05)
+    # A heavy task is queued: light tasks are held to the reserve, which is in use
+    second_light = controller.acquire("fetch_report")
+    waiting.join()
+    assert isinstance(outcome.get("error"), AdmissionRejected) and outcome["error"].status == 503
+    second_light.release()
+    light.release()
+    heavy.release()
+    assert controller.in_use == 0
+
+
+def test_queues_and_capacity_must_leave_a_server_thread():
+    with pytest.raises(ValueError, match="server threads"):
+        AdmissionController(capacity=4, max_queue=2, threads=8)
+    controller = AdmissionController(capacity=4, max_queue=1, threads=8)
+    assert controller.max_queue == 1
+    # Waiting holds no thread under asyncio, nothing to validate
+    AdmissionController(capacity=4, max_queue=2)
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import pytest
+from starlette.responses import StreamingResponse
+import asgi_endpoint
+from src.admissionControl import AdmissionController
+from src.pdf.pdfCache import PDFDiskCache
+from src.pdf.pdfFetcher import PDFFetcher
+from src.upload.s3 import S3Uploader
+
+
+def invoke(payload, send):
+    body = json.dumps(payload).encode("utf-8")
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+             "method": "POST", "scheme": "http", "path": "/invocations", "raw_path": b"/invocations",
+             "query_string": b"", "root_path": "", "headers": [(b"content-type", b"application/json")],
+             "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 8000)}
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    return asyncio.run(asgi_endpoint.app(scope, receive, send))
+
+
+def test_permit_released_when_client_disconnects_before_stream(monkeypatch):
+    controller = AdmissionController(capacity=4, reserve=1, max_queue=2, queue_timeout=1)
+    monkeypatch.setattr(asgi_endpoint, "admission", controller)
+
+    async def events():
+        yield '{"event": "extracted_values"}\n'
+
+    async def extract_pdf(request, data):
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    monkeypatch.setitem(asgi_endpoint.TASKS, "extract_pdf", extract_pdf)
+
+    async def send(message):
+        raise OSError("client disconnected")
+
+    try:
+        invoke({"task": "extract_pdf", "pdf_url": "http://example.com/report.pdf"}, send)
+    except Exception:
+        pass  # ClientDisconnect
+    assert controller.in_use == 0
+    assert controller.stats()["running"] == {}
+
+
+def test_permit_released_after_streamed_response():
+    controller = AdmissionController(capacity=4, reserve=1, max_queue=2, queue_timeout=1)
+    response = StreamingResponse(iter(["a\n", "b\n"]), media_type="application/x-ndjson")
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        permit = await controller.acquire_async("extract_pdf")
+        await asgi_endpoint.AdmittedResponse(response, permit)({"type": "http", "asgi": {"spec_version": "2.4"}},
+                                                               None, send)
+
+    asyncio.run(run())
+    assert [message.get("body") for message in sent[1:]] == [b"a\n", b"b\n", b""]
+    assert controller.in_use == 0
+
+
+class DroppingStream(httpx.AsyncByteStream):
+    def __init__(self, data):
+        self.data = data
+
+    async def __aiter__(self):
+        yield self.data
+        raise httpx.ReadError("connection dropped")
+
+
+def download(monkeypatch, fetcher, handler):
+    monkeypatch.setattr(asgi_endpoint, "get_pdf_fetcher", lambda: fetcher)
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            return await asgi_endpoint.download_pdf(http, "http://example.com/report.pdf")
+
+    return asyncio.run(run())
+
+
+async def no_sleep(seconds):
+    pass
+
+
+def test_download_is_capped_and_leaves_no_partial_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    def handler(request):
+        return httpx.Response(200, content=b"%PDF" + b"0" * 100)
+
+    with pytest.raises(ValueError, match="larger than"):
+        download(monkeypatch, PDFFetcher(max_bytes=50), handler)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_retries_server_errors_and_resumes(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request.headers.get("Range"))
+        if len(requests_seen) == 1:
+            return httpx.Response(503)
+        if len(requests_seen) == 2:
+            return httpx.Response(200, headers={"Accept-Ranges": "bytes"}, stream=DroppingStream(b"%PDF-1"))
+        return httpx.Response(206, content=b".7 rest")
+
+    path, temporary = download(monkeypatch, PDFFetcher(retries=3), handler)
+    assert temporary
+    with open(path, "rb") as f:
+        assert f.read() == b"%PDF-1.7 rest"
+    assert requests_seen == [None, None, "bytes=6-"]
+
+
+def test_download_stores_in_cache_and_cleans_up_failures(monkeypatch, tmp_path):
+    cache = PDFDiskCache(cache_dir=str(tmp_path), fresh_seconds=0)
+
+    def ok(request):
+        return httpx.Response(200, content=b"%PDF-1.7", headers={"ETag": '"v1"'})
+
+    path, temporary = download(monkeypatch, PDFFetcher(cache=cache), ok)
+    assert not temporary and path == cache.path("http://example.com/report.pdf")
+
+    def failing(request):
+        return httpx.Response(404)
+
+    with pytest.raises(ValueError, match="404"):
+        download(monkeypatch, PDFFetcher(cache=cache), failing)
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(path), os.path.basename(path)[:-4] + ".json"])
+
+
+def test_stage_uploads_run_outside_the_pool(monkeypatch):
+    def stage():
+        return {"icd4mmImg": S3Uploader("TAVIVision/icd", "crop.png", file_bytes=b"png").file_url,
+                "femoral_url": S3Uploader("TAVIVision/femoral", "femoral.png", file_bytes=b"png").file_url}
+
+    uploaded = []
+
+    def run_deferred_upload(upload):
+        uploaded.append(upload["file_path"])
+        return None if upload["file_path"] == "femoral.png" else upload["file_url"]
+
+    monkeypatch.setattr(asgi_endpoint, "run_deferred_upload", run_deferred_upload)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        values = asyncio.run(asgi_endpoint.run_in_pool(pool, stage))
+    assert sorted(uploaded) == ["crop.png", "femoral.png"]
+    assert values["icd4mmImg"].endswith("TAVIVision/icd/crop.png")
+    assert values["femoral_url"] is None
@@ -0,0 +1,41 @@
+import cv2
+import fitz
+import numpy as np
+from src.image.cropEngine import CropEngine, CropSpec
+from src.image.imageOps import GREEN_HSV
+
+
+def stacked_report(path):
+    """
+    Report page with three ICD anchors stacked closer than the crop height, so every crop
+    covers the anchors below it.
+    """
+    doc = fitz.open()
+    doc.new_page()
+    page = doc.new_page(width=612, height=792)
+    for row, level in enumerate((4, 6, 8)):
+        y = 100 + row * 90
+        page.insert_text((72, y), f"ICD @ {level}mm", fontsize=11)
+        page.draw_rect(fitz.Rect(72, y + 10, 300, y + 70), color=(0, 0, 0), fill=(0.8, 0.8, 0.8))
+    doc.save(path)
+    doc.close()
+
+
+def specs(tmp_path, prefix, levels):
+    return [CropSpec(f"icd{level}mm", [rf"ICD @ {level}mm"], str(tmp_path / f"{prefix}_icd{level}mm.png"),
+                     section=f"test_icd{level}mm") for level in levels]
+
+
+def test_batched_crops_do_not_show_sibling_highlights(tmp_path):
+    pdf_path = str(tmp_path / "report.pdf")
+    stacked_report(pdf_path)
+    batch = CropEngine(pdf_path).run(specs(tmp_path, "batch", (4, 6, 8)))
+    for level in (4, 6, 8):
+        single_spec = specs(tmp_path, "single", (level,))[0]
+        single = CropEngine(pdf_path).run([single_spec])
+        assert batch[f"icd{level}mm"]["crop_box"] == single[f"icd{level}mm"]["crop_box"]
+        batch_image = cv2.imread(batch[f"icd{level}mm"]["path"])
+        single_image = cv2.imread(single[f"icd{level}mm"]["path"])
+        assert np.array_equal(batch_image, single_image)
+        green = cv2.inRange(cv2.cvtColor(batch_image, cv2.COLOR_BGR2HSV), *GREEN_HSV)
+        assert cv2.countNonZero(green) == 0
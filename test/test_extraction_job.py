@@ -0,0 +1,45 @@
+from src import extractionJob
+from src.extractionJob import ICD_TASKS, STJ_TASK, ExtractionJob, process_icd_batch
+
+
+class StubEngine:
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+
+    def run(self, specs):
+        return {spec.name: None for spec in specs}
+
+
+def test_failing_icd_task_keeps_the_other_values(monkeypatch, tmp_path):
+    monkeypatch.setattr(extractionJob, "CropEngine", StubEngine)
+
+    def process_icd_task(unique_id, images, gg, crop, image_suffix, s3_folder):
+        if image_suffix == "icd6mm":
+            raise OSError("upload failed")
+        return {image_suffix: "24.1"}
+
+    monkeypatch.setattr(extractionJob, "process_icd_task", process_icd_task)
+    tasks = ICD_TASKS + [STJ_TASK]
+    results = process_icd_batch(None, "job", False, tasks, pdf_path=str(tmp_path / "report.pdf"))
+    assert list(results) == [task[0] for task in tasks]
+    assert results["icd6mm"] == (None, "upload failed")
+    assert results["icd4mm"] == ({"icd4mm": "24.1"}, None)
+
+    job = ExtractionJob("http://example.com/report.pdf", "job", pdf_path=str(tmp_path / "report.pdf"))
+    events = job.stage_events("icd", "icd_values", results, 0.5)
+    assert [(event["event"], event["stage"]) for event in events] == [
+        ("icd_values", "icd4mm"), ("task_error", "icd6mm"), ("icd_values", "icd8mm"),
+        ("icd_values", "stj_annulus_heights")]
+    assert job.icd_values == {"icd4mm": "24.1", "icd8mm": "24.1", "stj_annulus_heights": "24.1"}
+    assert job.response()["errors"] == {"icd6mm": "upload failed"}
+    assert job.summary_event()["errors"] == {"icd6mm": "upload failed"}
+
+
+def test_engine_failure_fails_every_task(monkeypatch, tmp_path):
+    class FailingEngine(StubEngine):
+        def run(self, specs):
+            raise RuntimeError("cannot open document")
+
+    monkeypatch.setattr(extractionJob, "CropEngine", FailingEngine)
+    results = process_icd_batch(None, "job", False, ICD_TASKS, pdf_path=str(tmp_path / "report.pdf"))
+    assert results == {task[0]: (None, "cannot open document") for task in ICD_TASKS}
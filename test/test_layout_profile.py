@@ -0,0 +1,36 @@
+import json
+import os
+from src.pdf import layoutProfile
+from src.pdf.layoutProfile import LayoutProfiles
+
+
+class StubDoc:
+    metadata = {"creator": "Vendor", "producer": "Writer"}
+
+    def __len__(self):
+        return 5
+
+
+def test_file_written_only_for_new_pages(monkeypatch, tmp_path):
+    path = str(tmp_path / "profiles.json")
+    writes = []
+    write_json = layoutProfile.write_json
+    monkeypatch.setattr(layoutProfile, "write_json", lambda *args: writes.append(args) or write_json(*args))
+    profiles = LayoutProfiles(profiles={}, path=path)
+    for _ in range(5):
+        profiles.record(StubDoc(), "calcium", 3)
+    assert len(writes) == 1
+    profiles.record(StubDoc(), "calcium", 2)
+    assert len(writes) == 2
+    assert os.listdir(tmp_path) == ["profiles.json"]
+    with open(path) as f:
+        assert json.load(f)["learned"] == [{"vendor": "Vendor/Writer", "section": "calcium", "pages": {"3": 5, "2": 1}}]
+
+
+def test_processes_sharing_the_file_keep_each_others_pages(tmp_path):
+    path = str(tmp_path / "profiles.json")
+    first, second = LayoutProfiles(profiles={}, path=path), LayoutProfiles(profiles={}, path=path)
+    first.record(StubDoc(), "calcium", 3)
+    second.record(StubDoc(), "icd4mm", 1)
+    assert LayoutProfiles(profiles={}, path=path).page_order(StubDoc(), "calcium") == [3, 0, 1, 2, 4]
+    assert LayoutProfiles(profiles={}, path=path).page_order(StubDoc(), "icd4mm") == [1, 0, 2, 3, 4]
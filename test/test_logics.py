@@ -0,0 +1,51 @@
+import random
+from src.logics import BatchConditionEvaluator, ConditionEvaluator
+from src.reportCache import score_report_batch
+
+REPORT = {
+    "annulusDiameter": "23.2", "aorticValveAnatomy": "bicuspid", "stjDiameter": "25.6", "sovLeftDiameter": "27.2",
+    "sovRightDiameter": "29.0", "sovNonDiameter": "29.5", "rcaHeight": "15.0", "lcaHeight": "11.1",
+    "lvotDiameter": "24.1", "aorticValveAnatomyType": "Bicuspid Type 0", "calciumScore": "371",
+    "ascAortaDiameter": "29.2", "icd4mm": "", "icd6mm": "26.3", "icd8mm": "26.0", "sovDiameter": 25.0,
+    "annulusArea": "423", "vtcL": 5, "vtcR": 6, "ciaLefDiameter": "7", "ciaRightDiameter": "6",
+    "eiaLeftDiameter": "5", "eiaRightDiameter": "8", "faLeftDiameter": "6", "faRightDiameter": "6.5",
+}
+
+
+def random_reports(count, seed=0):
+    rng = random.Random(seed)
+
+    def random_value(low, high):
+        return rng.choice([None, '', 0, str(round(rng.uniform(low, high), 1)), round(rng.uniform(low, high), 1)])
+
+    return [dict(REPORT, **{
+        field: random_value(0, 1500 if field == "calciumScore" else 45) for field in BatchConditionEvaluator.NUMERIC_FIELDS
+    }, aorticValveAnatomyType=rng.choice([None, "Bicuspid Type 1", "Tricuspid"])) for _ in range(count)]
+
+
+def test_batch_matches_scalar_evaluation():
+    reports = [REPORT] + random_reports(2000)
+    batch = BatchConditionEvaluator(reports)
+    batch_tables = batch.generate_results_tables()
+    for report, batch_table, division_by_zero in zip(reports, batch_tables, batch.division_by_zero.tolist()):
+        try:
+            scalar_table = ConditionEvaluator(report).generate_results_table()
+        except ZeroDivisionError:
+            assert division_by_zero, report
+            continue
+        assert not division_by_zero, report
+        assert batch_table == scalar_table, report
+
+
+def test_list_valued_fields_fail_only_their_report():
+    reports = [REPORT, dict(REPORT, stjDiameter=[1, 2]), dict(REPORT, vtcL=[1, [2]]), dict(REPORT, annulusArea=[1, 2])]
+    results = score_report_batch(reports)
+    assert [result["status"] for result in results] == ["success", "success", "success", "error"]
+    for report, result in zip(reports[:3], results):
+        # The scalar evaluator reads a list as 0.0
+        assert result["results"] == ConditionEvaluator(report).generate_results_table()
+
+
+def test_columns_of_equal_length_lists_are_not_stacked():
+    batch = BatchConditionEvaluator([dict(REPORT, stjDiameter=[1, 2]), dict(REPORT, stjDiameter=[3, 4])])
+    assert batch.values["stjDiameter"].tolist() == [0.0, 0.0]
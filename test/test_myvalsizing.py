@@ -0,0 +1,125 @@
+import math
+import random
+import pytest
+from src.myvalsizing import AorticStenosisValues
+
+
+def original_annulus_table_and_myval_size(patient, oversize_value):
+    """
+    The sizing table as calculate_annulus_table_and_myval_size computed it before the breakpoint
+    lookup (full scan of every MyVal size), kept verbatim as the reference.
+    """
+    myval_sizes = [20, 21.5, 23, 24.5, 26, 27.5, 29, 30.5, 32, 33.5, 35]
+    myval_areas = [
+        314.159, 363.05, 415.476, 471.435, 530.929, 593.957, 660.52,
+        730.617, 804.248, 881.413, 962.113
+    ]
+
+    oversizing_data = []
+    for size, area in zip(myval_sizes, myval_areas):
+        description = ""
+        if patient.anatomy_type == "bicuspid":
+            valid_icds = [v for v in [patient.icd4mm, patient.icd6mm, patient.icd8mm] if v > 0]
+            if not valid_icds:
+                oversizing = (area - patient.annulus_area) / patient.annulus_area * 100
+                oversizing_data.append({"size": size, "area": area, "oversizing": round(oversizing, 2),
+                                        "diameter": size, "description": description})
+                continue
+
+            min_icd = min(valid_icds)
+            if min_icd < patient.annulus_diameter:
+                oversizing = (size - min_icd) / min_icd * 100
+                description = "ICD value is smaller than the annulus diameter so MyVal size is calculated based on the ICD value"
+                oversizing_data.append({"size": size, "area": area, "oversizing": round(oversizing, 2),
+                                        "diameter": size, "description": description})
+            else:
+                oversizing = (area - patient.annulus_area) / patient.annulus_area * 100
+                oversizing_data.append({"size": size, "area": area, "oversizing": round(oversizing, 2),
+                                        "diameter": size, "description": description})
+        else:  # tricuspid
+            oversizing = (area - patient.annulus_area) / patient.annulus_area * 100
+            oversizing_data.append({"size": size, "area": area, "oversizing": round(oversizing, 2),
+                                    "diameter": size, "description": description})
+
+    min_oversize, max_oversize = [float(x) for x in oversize_value.replace("%", "").split("-")]
+    midpoint = (min_oversize + max_oversize) / 2
+
+    finite_data = [d for d in oversizing_data if math.isfinite(d["oversizing"])]
+
+    def pick_closest(data):
+        best = None
+        for curr in data:
+            if not best:
+                best = curr
+                continue
+            d_curr = abs(curr["oversizing"] - midpoint)
+            d_best = abs(best["oversizing"] - midpoint)
+            if d_curr != d_best:
+                best = curr if d_curr < d_best else best
+            elif abs(curr["oversizing"]) != abs(best["oversizing"]):
+                best = curr if abs(curr["oversizing"]) < abs(best["oversizing"]) else best
+            else:
+                best = curr if curr["size"] < best["size"] else best
+        return best
+
+    closest = pick_closest(finite_data) if finite_data else None
+    if closest and closest["oversizing"] < -2.5:
+        positive_only = [d for d in finite_data if d["oversizing"] >= 0]
+        if positive_only:
+            closest = pick_closest(positive_only)
+
+    warning = None if finite_data else "Note: No valid MyVal size available."
+
+    if closest:
+        index = finite_data.index(closest)
+        filtered_table = finite_data[max(0, index - 2):index + 3]
+        table = [{"THV_Diameters": d["diameter"], "Annular_Area_Under_Or_Over_Sizing": f"{d['oversizing']}%"}
+                 for d in filtered_table]
+    else:
+        table = []
+
+    return {
+        "table": table,
+        "closest_myval_size": closest["diameter"] if closest else "N/A",
+        "actual_oversize": closest["oversizing"] if closest else None,
+        "warning": warning,
+        "description": closest["description"] if closest else "N/A"
+    }
+
+
+def random_reports(count, seed=0):
+    rng = random.Random(seed)
+    return [{
+        "annulusArea": round(rng.uniform(260, 850), rng.choice([0, 1, 2])),
+        "aorticValveAnatomyType": rng.choice(["Tricuspid", "Bicuspid Type 1", "bicuspid type 0"]),
+        "calciumScore": rng.choice([rng.randint(0, 3000), 450, 451, 1000, 1001]),
+        "icd4mm": rng.choice(["", 0, round(rng.uniform(15, 35), 1)]),
+        "icd6mm": round(rng.uniform(15, 35), 1),
+        "icd8mm": rng.choice([None, round(rng.uniform(15, 35), 1)]),
+    } for _ in range(count)]
+
+
+@pytest.fixture(scope="module")
+def reports():
+    return random_reports(5000)
+
+
+def test_calculate_all_matches_the_original_full_scan(reports, capsys):
+    for report in reports:
+        try:
+            patient = AorticStenosisValues(report)
+        except ValueError:
+            continue
+        oversize_value, severity_range = patient.calculate_oversize_value()
+        expected = patient.myval_result(oversize_value, severity_range,
+                                        original_annulus_table_and_myval_size(patient, oversize_value))
+        assert patient.calculate_all() == expected, report
+
+
+def test_calculate_all_batch_matches_calculate_all(reports, capsys):
+    for report, batch_result in zip(reports, AorticStenosisValues.calculate_all_batch(reports)):
+        try:
+            expected = AorticStenosisValues(report).calculate_all()
+        except ValueError as e:
+            expected = {"error": str(e)}
+        assert batch_result == expected, report
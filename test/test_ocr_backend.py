@@ -0,0 +1,35 @@
+import json
+
+from ocr_benchmark import same_value, synthetic_corpus
+from src.image.ocrBackend import TemplateDigitBackend
+from src.image.valueFromImage import YellowShadeOCR
+
+
+def test_template_backend_reads_synthetic_icd_crops(tmp_path):
+    synthetic_corpus(str(tmp_path), "icd", 30, seed=1)
+    with open(tmp_path / "labels.json") as f:
+        labels = json.load(f)
+    reader = YellowShadeOCR(backend="template")
+    correct = sum(same_value(reader.run(str(tmp_path / file_name)), expected) for file_name, expected in labels.items())
+    assert correct / len(labels) >= 0.9
+
+
+def test_template_backend_ignores_the_masked_surround(tmp_path):
+    # The yellow-masked box of a label is framed by black, that frame must not be read as a '1'
+    synthetic_corpus(str(tmp_path), "icd", 5, seed=2)
+    with open(tmp_path / "labels.json") as f:
+        labels = json.load(f)
+    reader = YellowShadeOCR(backend="template")
+    for file_name, expected in labels.items():
+        image = reader.backend.load_image(str(tmp_path / file_name))
+        mask, yellow_only = reader.yellow_mask(image)
+        results = reader.backend.recognize(yellow_only, reader.yellow_text_boxes(mask))
+        assert [text for _, text, _ in results] == [expected]
+
+
+def test_template_backend_skips_frames_and_rules():
+    image = TemplateDigitBackend.render_glyph("7")
+    framed = 255 - image.copy()
+    framed[:, :3] = framed[:3, :] = framed[:, -3:] = framed[-3:, :] = 0
+    framed[-9:-7, 6:-6] = 0  # underline
+    assert [text for _, text, _ in TemplateDigitBackend().readtext(framed)] == ["7"]
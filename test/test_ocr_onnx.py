@@ -0,0 +1,103 @@
+import sys
+import types
+import numpy as np
+import pytest
+from src.image.ocrBackend import OnnxEasyOCRBackend, OnnxInt8EasyOCRBackend, OnnxModule
+from src.image.ocrExport import model_path
+
+
+class StubInput:
+    def __init__(self, name):
+        self.name = name
+
+
+class StubSession:
+    """
+    Stands in for onnxruntime.InferenceSession: records how a graph was loaded and returns fixed outputs.
+    """
+    def __init__(self, path, options, providers=None):
+        self.path = path
+        self.options = options
+        self.providers = providers
+        self.feeds = []
+
+    def get_inputs(self):
+        return [StubInput("image")] + ([StubInput("text")] if "recognizer" in self.path else [])
+
+    def run(self, output_names, feed):
+        self.feeds.append(feed)
+        return [np.zeros((1, 2, 3), dtype=np.float32)]
+
+
+@pytest.fixture
+def stub_runtime(monkeypatch):
+    onnxruntime = types.SimpleNamespace(SessionOptions=types.SimpleNamespace, InferenceSession=StubSession)
+    easyocr = types.SimpleNamespace(Reader=lambda languages, gpu: types.SimpleNamespace(detector=None, recognizer=None))
+    monkeypatch.setitem(sys.modules, "onnxruntime", onnxruntime)
+    monkeypatch.setitem(sys.modules, "easyocr", easyocr)
+
+
+def write_models(model_dir, quantized):
+    for model in ("detector", "recognizer"):
+        with open(model_path(str(model_dir), model, quantized), "wb") as f:
+            f.write(b"onnx")
+
+
+@pytest.mark.parametrize("backend_class, quantized", [(OnnxEasyOCRBackend, False), (OnnxInt8EasyOCRBackend, True)])
+def test_reader_runs_exported_graphs(stub_runtime, tmp_path, backend_class, quantized):
+    write_models(tmp_path, quantized)
+    reader = backend_class(model_dir=str(tmp_path)).reader()
+    assert isinstance(reader.detector, OnnxModule) and isinstance(reader.recognizer, OnnxModule)
+    assert reader.detector.session.path == model_path(str(tmp_path), "detector", quantized)
+    assert reader.recognizer.session.path == model_path(str(tmp_path), "recognizer", quantized)
+    assert reader.detector.session.providers == ["CPUExecutionProvider"]
+    assert reader.detector.session.options.inter_op_num_threads == 1
+    assert reader.recognizer.input_names == ["image", "text"]
+
+
+def test_missing_models_point_to_export(stub_runtime, tmp_path):
+    write_models(tmp_path, quantized=False)
+    with pytest.raises(FileNotFoundError, match="ocrExport"):
+        OnnxInt8EasyOCRBackend(model_dir=str(tmp_path)).reader()
+
+
+def test_module_feeds_text_only_to_recognizer(stub_runtime):
+    torch = pytest.importorskip("torch")
+    recognizer = OnnxModule("recognizer.onnx", threads=1)
+    output = recognizer(torch.zeros(1, 1, 64, 256), torch.zeros(1, 1, dtype=torch.long))
+    assert set(recognizer.session.feeds[0]) == {"image", "text"}
+    assert isinstance(output, torch.Tensor)
+    detector = OnnxModule("detector.onnx", threads=1)
+    detector(torch.zeros(1, 3, 64, 64))
+    assert set(detector.session.feeds[0]) == {"image"}
+
+
+def test_export_round_trip(monkeypatch, tmp_path):
+    """
+    Export randomly initialised EasyOCR models and run the graphs, fp32 and 8-bit, on new input sizes.
+    """
+    torch = pytest.importorskip("torch")
+    easyocr = pytest.importorskip("easyocr")
+    pytest.importorskip("onnxruntime.quantization")
+    from easyocr.craft import CRAFT
+    from easyocr.model.vgg_model import Model
+    from src.image.ocrExport import export_models
+
+    torch.manual_seed(0)
+    detector = CRAFT(pretrained=False).eval()
+    recognizer = Model(input_channel=1, output_channel=256, hidden_size=256, num_class=97).eval()
+    with torch.no_grad():
+        image, crops, text = torch.rand(1, 3, 320, 480), torch.rand(2, 1, 64, 300), torch.zeros(2, 1, dtype=torch.long)
+        score, feature = detector(image)
+        logits = recognizer(crops, text)
+    monkeypatch.setattr(easyocr, "Reader", lambda *args, **kwargs: types.SimpleNamespace(detector=detector,
+                                                                                         recognizer=recognizer))
+    export_models(str(tmp_path))
+
+    for quantized, tolerance in ((False, 1e-5), (True, 0.05)):
+        onnx_score, onnx_feature = OnnxModule(model_path(str(tmp_path), "detector", quantized), threads=1)(image)
+        onnx_logits = OnnxModule(model_path(str(tmp_path), "recognizer", quantized), threads=1)(crops, text)
+        assert onnx_score.shape == score.shape and onnx_logits.shape == logits.shape
+        assert float((onnx_score - score).abs().max()) < tolerance
+        assert float((onnx_feature - feature).abs().max()) < tolerance
+        assert float((onnx_logits - logits).abs().max()) < tolerance
@@ -0,0 +1,122 @@
+import os
+import time
+import pytest
+import requests
+from src.pdf.pdfCache import PDFDiskCache
+from src.pdf.pdfFetcher import PDFFetcher
+
+URL = "http://example.com/report.pdf"
+
+
+class StubResponse:
+    def __init__(self, status_code, chunks=(), headers=None, drop_after=None):
+        """
+        :param drop_after: Raise a dropped connection error after this many chunks.
+        """
+        self.status_code = status_code
+        self.chunks = list(chunks)
+        self.headers = headers or {}
+        self.drop_after = drop_after
+
+    def iter_content(self, chunk_size):
+        for index, chunk in enumerate(self.chunks):
+            if index == self.drop_after:
+                raise requests.exceptions.ChunkedEncodingError("connection dropped")
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class StubSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, stream=True, timeout=None, headers=None):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+def fetcher_with(responses, **kwargs):
+    fetcher = PDFFetcher(**kwargs)
+    fetcher.session = StubSession(responses)
+    return fetcher
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_stale_entry_is_reused_on_304(tmp_path):
+    cache = PDFDiskCache(cache_dir=str(tmp_path), fresh_seconds=0)
+    fetcher = fetcher_with([StubResponse(200, [b"%PDF-1.7"], {"ETag": '"v1"'}), StubResponse(304)], cache=cache)
+
+    path = fetcher.fetch_path(URL)
+    assert fetcher.fetch_path(URL) == path
+    assert read(path) == b"%PDF-1.7"
+    assert fetcher.session.requests == [{}, {"If-None-Match": '"v1"'}]
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_fresh_entry_is_served_without_a_request(tmp_path):
+    cache = PDFDiskCache(cache_dir=str(tmp_path))
+    fetcher = fetcher_with([StubResponse(200, [b"%PDF-1.7"])], cache=cache)
+    assert fetcher.fetch_path(URL) == fetcher.fetch_path(URL)
+    assert len(fetcher.session.requests) == 1
+
+
+def test_changed_report_replaces_the_cached_copy(tmp_path):
+    cache = PDFDiskCache(cache_dir=str(tmp_path), fresh_seconds=0)
+    fetcher = fetcher_with([StubResponse(200, [b"old"], {"ETag": '"v1"'}),
+                            StubResponse(200, [b"new"], {"ETag": '"v2"'})], cache=cache)
+    fetcher.fetch_path(URL)
+    assert read(fetcher.fetch_path(URL)) == b"new"
+    assert cache.metadata(URL)["etag"] == '"v2"'
+
+
+def test_least_recently_used_reports_are_evicted_by_size(tmp_path):
+    cache = PDFDiskCache(cache_dir=str(tmp_path), max_bytes=25, min_age_seconds=0)
+    urls = [f"http://example.com/{name}.pdf" for name in ("a", "b", "c")]
+    fetcher = fetcher_with([StubResponse(200, [b"0" * 10]) for _ in urls], cache=cache)
+    now = time.time()
+    for age, url in zip((30, 20), urls):
+        os.utime(fetcher.fetch_path(url), (now - age, now - age))
+    cache.lookup(urls[0])  # "a" used again, "b" is now the least recently used
+
+    fetcher.fetch_path(urls[2])
+    assert os.path.exists(cache.path(urls[0])) and os.path.exists(cache.path(urls[2]))
+    assert not os.path.exists(cache.path(urls[1]))
+    assert cache.metadata(urls[1]) is None
+
+
+def test_download_above_max_bytes_is_aborted(tmp_path):
+    cache = PDFDiskCache(cache_dir=str(tmp_path))
+    fetcher = fetcher_with([StubResponse(200, [b"0" * 40, b"0" * 40])], cache=cache, max_bytes=50)
+    with pytest.raises(ValueError, match="larger than"):
+        fetcher.fetch_path(URL)
+    assert os.listdir(tmp_path) == []
+
+
+def test_declared_length_above_max_bytes_is_refused():
+    fetcher = fetcher_with([StubResponse(200, [b"0"], {"Content-Length": "1000"})], max_bytes=50)
+    with pytest.raises(ValueError, match="larger than"):
+        fetcher.fetch(URL)
+
+
+def test_dropped_connection_resumes_with_a_range_request():
+    fetcher = fetcher_with([StubResponse(200, [b"%PDF-1", b"lost"], {"Accept-Ranges": "bytes"}, drop_after=1),
+                            StubResponse(206, [b".7 rest"])])
+    with fetcher.fetch(URL) as f:
+        assert f.read() == b"%PDF-1.7 rest"
+    assert fetcher.session.requests == [{}, {"Range": "bytes=6-"}]
+
+
+def test_dropped_connection_without_range_support_fails():
+    fetcher = fetcher_with([StubResponse(200, [b"%PDF-1", b"lost"], drop_after=1)])
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        fetcher.fetch(URL)
@@ -0,0 +1,88 @@
+from src.criteriaRules import CompiledRule, compiled_rules
+from src.logics import ConditionEvaluator
+from src.myvalsizing import AorticStenosisValues
+from src.reportCache import LRUMemo, ReportScoringCache
+
+REPORT = {
+    "annulusDiameter": "23.2", "annulusArea": "423", "stjDiameter": "25.6", "sovLeftDiameter": "27.2",
+    "sovRightDiameter": "29.0", "sovNonDiameter": "29.5", "sovDiameter": 25.0, "sovHeight": "12",
+    "rcaHeight": "15.0", "lcaHeight": "11.1", "lvotDiameter": "24.1", "ascAortaDiameter": "29.2",
+    "aorticValveAnatomyType": "Bicuspid Type 0", "calciumScore": "371", "icd4mm": "", "icd6mm": "26.3",
+    "icd8mm": "26.0", "vtcL": 5, "vtcR": 6, "ciaLeftDiameter": "7", "ciaRightDiameter": "6",
+    "eiaLeftDiameter": "5", "eiaRightDiameter": "8", "faLeftDiameter": "6", "faRightDiameter": "6.5",
+}
+
+
+def test_cached_results_match_uncached_scoring():
+    cache = ReportScoringCache()
+    report = REPORT
+    for edit in [{}, {"vtcL": "5.0"}, {"vtcL": 3.5}, {"annulusDiameter": "24"}, {"calciumScore": 1200}]:
+        report = dict(report, **edit)
+        assert cache.results_table(report) == ConditionEvaluator(report).generate_results_table()
+        assert cache.myval_size(report) == AorticStenosisValues(report).calculate_all()
+
+
+def test_repeated_report_is_a_cache_hit():
+    cache = ReportScoringCache()
+    cache.results_table(REPORT)
+    cache.myval_size(REPORT)
+    cache.results_table(REPORT)
+    cache.myval_size(REPORT)
+    assert cache.stats()["reports"] == {"hits": 1, "misses": 1}
+    assert cache.stats()["myval"] == {"hits": 1, "misses": 1}
+
+
+def test_float_equal_values_share_an_entry():
+    cache = ReportScoringCache()
+    cache.results_table(dict(REPORT, annulusDiameter="23.2"))
+    cache.results_table(dict(REPORT, annulusDiameter=23.2))
+    cache.results_table(dict(REPORT, annulusDiameter="23.20"))
+    assert cache.stats()["reports"] == {"hits": 2, "misses": 1}
+
+
+def test_cached_myval_size_is_not_shared_with_callers():
+    cache = ReportScoringCache()
+    cache.myval_size(REPORT)["changed"] = True
+    assert "changed" not in cache.myval_size(REPORT)
+
+
+def test_lru_memo_evicts_the_least_recently_used_entry():
+    memo = LRUMemo(2)
+    memo.put("a", 1)
+    memo.put("b", 2)
+    assert memo.get("a") == 1  # "b" is now the least recently used
+    memo.put("c", 3)
+    assert memo.get("b") is None
+    assert memo.get("a") == 1 and memo.get("c") == 3
+
+
+def test_report_cache_evicts_beyond_max_entries():
+    cache = ReportScoringCache(max_entries=1)
+    cache.results_table(REPORT)
+    cache.results_table(dict(REPORT, vtcL=3.5))
+    cache.results_table(REPORT)
+    assert cache.stats()["reports"] == {"hits": 0, "misses": 3}
+
+
+def test_lru_memo_skips_unhashable_keys():
+    memo = LRUMemo(2)
+    memo.put(("vtcL", [1, 2]), 1)
+    assert memo.get(("vtcL", [1, 2])) is None
+
+
+def test_editing_vtcl_only_reevaluates_its_rules(monkeypatch):
+    cache = ReportScoringCache()
+    cache.results_table(REPORT)
+    edited = dict(REPORT, vtcL=3.5)
+    expected = ConditionEvaluator(edited).generate_results_table()
+
+    evaluated = []
+    original = CompiledRule.evaluate
+
+    def counting_evaluate(rule, values, raw_values):
+        evaluated.append(rule.criteria)
+        return original(rule, values, raw_values)
+
+    monkeypatch.setattr(CompiledRule, "evaluate", counting_evaluate)
+    assert cache.results_table(edited) == expected
+    assert evaluated == compiled_rules.dependents(["vtcL"]) == ["vtcL"]
@@ -0,0 +1,95 @@
+import os
+import re
+import fitz
+import pytest
+from src.pdf import templatePlan
+from src.pdf.templatePlan import TemplatePlans
+
+
+def report(path, text="Aortic Valve Calcification"):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 100), text, fontsize=14)
+    doc.save(path)
+    doc.close()
+
+
+def test_plans_written_only_when_changed(monkeypatch, tmp_path):
+    pdf_path, path = str(tmp_path / "report.pdf"), str(tmp_path / "plans.json")
+    report(pdf_path)
+    writes = []
+    write_json = templatePlan.write_json
+    monkeypatch.setattr(templatePlan, "write_json", lambda *args: writes.append(args) or write_json(*args))
+    plans = TemplatePlans(path=path)
+    for _ in range(3):
+        plans.learn(pdf_path, "calcium", 0, (72, 86, 250, 104), (0, 290, 800, 1090), dpi=200)
+    assert len(writes) == 1
+    plans.learn(pdf_path, "calcium", 0, (72, 86, 250, 104), (0, 290, 900, 1090), dpi=200)
+    assert len(writes) == 2
+    assert sorted(os.listdir(tmp_path)) == ["plans.json", "report.pdf"]
+
+
+def test_processes_sharing_the_file_keep_each_others_plans(tmp_path):
+    first_pdf, second_pdf, path = str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf"), str(tmp_path / "plans.json")
+    report(first_pdf)
+    report(second_pdf, text="ICD @ 4mm")
+    first, second = TemplatePlans(path=path), TemplatePlans(path=path)
+    first.learn(first_pdf, "calcium", 0, (72, 86, 250, 104), (0, 290, 800, 1090), dpi=200)
+    second.learn(second_pdf, "icd4mm", 0, (72, 86, 150, 104), (0, 290, 800, 1090), dpi=200)
+    assert TemplatePlans(path=path).stats()["plans"] == 2
+
+
+def learn(plans, pdf_path, section):
+    plans.learn(pdf_path, section, 0, (72, 86, 250, 104), (0, 290, 800, 1090), dpi=200)
+
+
+def test_least_recently_used_plans_are_dropped_and_stay_dropped(tmp_path):
+    path = str(tmp_path / "plans.json")
+    pdf_paths = []
+    for index in range(3):
+        # A heading per template, so the three reports get different fingerprints
+        pdf_paths.append(str(tmp_path / f"{index}.pdf"))
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 60), f"Corelab {'ABC'[index]}", fontsize=18)
+        page.insert_text((72, 100), "Template Aortic Valve Calcification", fontsize=11)
+        page.insert_text((72, 120), "Total", fontsize=11)
+        doc.save(pdf_paths[-1])
+        doc.close()
+    plans = TemplatePlans(path=path, max_plans=2)
+    learn(plans, pdf_paths[0], "calcium")
+    learn(plans, pdf_paths[1], "calcium")
+    regex = [re.compile("Template")]
+    assert plans.match(pdf_paths[0], "calcium", regex) is not None  # 1 is now the least recently used
+    learn(plans, pdf_paths[2], "calcium")
+
+    assert plans.match(pdf_paths[1], "calcium", regex) is None
+    assert plans.match(pdf_paths[0], "calcium", regex) is not None
+    assert plans.stats()["plans"] == 2
+    # The file is capped too, and the evicted plan does not come back from it
+    reloaded = TemplatePlans(path=path, max_plans=2)
+    assert reloaded.match(pdf_paths[1], "calcium", regex) is None
+    assert reloaded.stats()["plans"] == 2
+
+
+def test_page_count_does_not_split_a_template(tmp_path):
+    # Reports of one template with more or fewer result pages after the ones fingerprinted
+    short_pdf, long_pdf = str(tmp_path / "short.pdf"), str(tmp_path / "long.pdf")
+    report(short_pdf)
+    doc = fitz.open(short_pdf)
+    for _ in range(2):
+        doc.new_page().insert_text((72, 100), "Results", fontsize=11)
+    doc.save(short_pdf, incremental=True, encryption=0)
+    doc.new_page()
+    doc.save(long_pdf)
+    doc.close()
+    plans = TemplatePlans()
+    assert plans.fingerprint(short_pdf) == plans.fingerprint(long_pdf)
+
+
+def test_unknown_section_skips_the_fingerprint(monkeypatch, tmp_path):
+    pdf_path = str(tmp_path / "report.pdf")
+    report(pdf_path)
+    plans = TemplatePlans()
+    learn(plans, pdf_path, "calcium")
+    monkeypatch.setattr(plans, "fingerprint", lambda path: pytest.fail("fingerprinted"))
+    assert plans.match(pdf_path, "icd4mm", [re.compile("ICD")]) is None